@@ -0,0 +1,69 @@
+"""
+Compares the iterrows + .loc enrichment tweets_add_locations used to run against add_author_locations.
+
+    python -m benchmarks.bench_add_locations
+
+The legacy loop is timed on a sample and extrapolated, running it on 1M rows takes hours.
+"""
+import time
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from project.utilities.transformers import add_author_locations
+
+
+def tweets_frame(n_rows: int, n_authors: int, seed: int = 0) -> pd.DataFrame:
+    rnd = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "author_id": rnd.integers(10**8, 10**8 + n_authors, n_rows).astype(str),
+        "lat": rnd.uniform(-90, 90, n_rows),
+        "long": rnd.uniform(-180, 180, n_rows),
+        "tweet": "Synthetic tweet about an earthquake"
+    })
+
+
+def user_locations(n_authors: int, hit_ratio: float = 0.6, seed: int = 0) -> Dict:
+    rnd = np.random.default_rng(seed)
+    return {
+        str(10**8 + i): {"lat": float(rnd.uniform(-90, 90)), "lon": float(rnd.uniform(-180, 180)),
+                         "city": f"city {i % 5000}", "country": f"country {i % 200}"}
+        for i in range(n_authors) if rnd.random() < hit_ratio
+    }
+
+
+def legacy_add_locations(df_tweets: pd.DataFrame, user_location: Dict) -> pd.DataFrame:
+    """
+    The original per-row loop with the author_id/lon keys fixed, kept as the baseline.
+    """
+    for index, row in df_tweets.iterrows():
+        try:
+            df_tweets.loc[index, "lat"] = user_location[row["author_id"]]["lat"]
+            df_tweets.loc[index, "long"] = user_location[row["author_id"]]["lon"]
+            df_tweets.loc[index, "city"] = user_location[row["author_id"]]["city"]
+            df_tweets.loc[index, "country"] = user_location[row["author_id"]]["country"]
+        except KeyError:
+            pass
+    return df_tweets
+
+
+def run(n_rows: int = 1_000_000, n_authors: int = 200_000, legacy_sample: int = 5_000):
+    lookup = user_locations(n_authors)
+    df_tweets = tweets_frame(n_rows, n_authors)
+
+    started = time.perf_counter()
+    legacy_add_locations(df_tweets.head(legacy_sample).copy(), lookup)
+    legacy = (time.perf_counter() - started) * n_rows / legacy_sample
+
+    started = time.perf_counter()
+    add_author_locations(df_tweets, lookup)
+    merged = time.perf_counter() - started
+
+    print(f"{n_rows:,} tweets, {len(lookup):,} resolved authors")
+    print(f"  legacy iterrows (extrapolated from {legacy_sample:,} rows): {legacy:,.1f}s")
+    print(f"  add_author_locations: {merged:.2f}s  {n_rows / merged:,.0f} rows/s  x{legacy / merged:,.0f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,71 @@
+"""
+Compares the per-tweet parsing loop that append_to_csv used to run against parse_responses on synthetic pages.
+
+    python -m benchmarks.bench_parser
+"""
+import time
+from typing import Dict, List
+
+import dateutil.parser
+import pandas as pd
+
+from benchmarks.synthetic import tweet_pages
+from project.twitter.parser import DF_HEADERS, parse_responses
+
+
+def legacy_append_to_csv(df_headers: List, json_response: Dict) -> (int, pd.DataFrame):
+    """
+    The original per-tweet loop, kept as the baseline.
+    """
+    tweets = []
+    for tweet in json_response.get("data"):
+        author_id = tweet.get("author_id")
+        created_at = dateutil.parser.parse(tweet.get("created_at"))
+        if "geo" in tweet.keys():
+            geo = tweet.get("geo").get("place_id")
+            try:
+                lat = tweet.get("geo").get("coordinates").get("coordinates")[0]
+                long = tweet.get("geo").get("coordinates").get("coordinates")[1]
+            except AttributeError:
+                continue
+            place_name = place_full_name = place_country = place_country_code = None
+            includes = json_response.get("includes")
+            if "places" in includes.keys():
+                for place in includes.get("places"):
+                    if place["id"] == geo:
+                        place_name = place.get("name")
+                        place_full_name = place.get("full_name")
+                        place_country = place.get("country")
+                        place_country_code = place.get("country_code")
+        else:
+            continue
+        metrics = tweet.get("public_metrics")
+        tweets.append([author_id, created_at, geo, lat, long, place_name, place_full_name, place_country,
+                       place_country_code, tweet.get("id"), tweet.get("lang"), metrics.get("like_count"),
+                       metrics.get("quote_count"), metrics.get("reply_count"), metrics.get("retweet_count"),
+                       tweet.get("source"), tweet.get("text")])
+    return len(tweets), pd.DataFrame(tweets, columns=df_headers)
+
+
+def _time(func, *args) -> float:
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def run(n_pages: int = 20, page_size: int = 500, n_places: int = 1000):
+    pages = tweet_pages(n_pages, page_size, n_places=n_places)
+    n_tweets = n_pages * page_size
+
+    legacy = _time(lambda: pd.concat([legacy_append_to_csv(DF_HEADERS, page)[1] for page in pages]))
+    per_page = _time(lambda: pd.concat([parse_responses(DF_HEADERS, [page])[1] for page in pages]))
+    batch = _time(parse_responses, DF_HEADERS, pages)
+
+    print(f"{n_tweets} tweets, {n_places} places per page")
+    for name, seconds in [("legacy loop", legacy), ("parse_responses per page", per_page),
+                          ("parse_responses batch", batch)]:
+        print(f"{name:>26}: {seconds:.3f}s  {n_tweets / seconds:>12,.0f} tweets/s  x{legacy / seconds:.1f}")
+
+
+if __name__ == "__main__":
+    run()
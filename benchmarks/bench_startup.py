@@ -0,0 +1,52 @@
+"""
+Measures how long the CLI takes to start, which every short cron invocation pays, and the slowest imports.
+
+    python -m benchmarks.bench_startup
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MAIN = os.path.join("project", "main.py")
+
+
+def startup_seconds(args, runs: int = 10) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, MAIN] + args, capture_output=True, check=True,
+                       env={**os.environ, "PYTHONPATH": "."})
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def slowest_imports(args, top: int = 10):
+    result = subprocess.run([sys.executable, "-X", "importtime", MAIN] + args, capture_output=True, text=True,
+                            env={**os.environ, "PYTHONPATH": "."})
+    imports = []
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                imports.append((int(cumulative), name.rstrip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def run(runs: int = 10):
+    started = time.perf_counter()
+    for _ in range(runs):
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+    interpreter = (time.perf_counter() - started) / runs
+
+    print(f"{'python -c pass':>28}: {interpreter * 1000:7.1f}ms")
+    for args in [["--help"], ["search", "--help"]]:
+        print(f"{'main.py ' + ' '.join(args):>28}: {startup_seconds(args, runs) * 1000:7.1f}ms")
+    print("Slowest imports of main.py --help (cumulative us):")
+    for cumulative, name in slowest_imports(["--help"]):
+        print(f"  {cumulative:>8} {name}")
+
+
+if __name__ == "__main__":
+    run()
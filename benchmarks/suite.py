@@ -0,0 +1,318 @@
+"""
+Runs the parse, enrich and write stages of the pipeline on synthetic data at several scales, and saves the rows/s
+and peak memory of every run to a JSON file so they can be compared between commits.
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --stages parse,clean_locations --scales 1000,10000
+    python -m benchmarks.suite --compare benchmarks/results/abc123.json
+
+Peak memory is the peak of the allocations traced by tracemalloc during one extra run of the stage, which includes
+the numpy and pandas buffers but not the Arrow memory pool. Frame memory is the deep memory usage of the DataFrames
+that run returned. The timed runs are made without tracing.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterator, List
+
+import pandas as pd
+
+from benchmarks.bench_add_locations import tweets_frame, user_locations
+from benchmarks.synthetic import tweet_page, tweet_pages, user_locations_frame, world_cities_frame
+
+RESULTS_DIR = "benchmarks/results"
+DEFAULT_SCALES = [1_000, 10_000, 100_000]
+WORLD_CITIES_ROWS = 45_000
+
+
+@dataclass
+class StageResult:
+    stage: str
+    rows: int
+    seconds: float
+    rows_per_sec: float
+    peak_memory: int
+    frame_memory: int = 0
+
+
+@contextmanager
+def _parse(rows: int, workdir: str) -> Iterator[Callable]:
+    from project.twitter.parser import DF_HEADERS
+    from project.twitter.runner import append_to_csv
+
+    pages = tweet_pages(max(rows // 100, 1), 100, n_places=1000)
+    yield lambda: [append_to_csv(DF_HEADERS, page) for page in pages]
+
+
+@contextmanager
+def _world_cities_csv(rows: int, workdir: str) -> Iterator[Callable]:
+    from project.utilities.world_cities import WorldCities
+
+    path = os.path.join(workdir, f"world_cities_{rows}.csv")
+    world_cities_frame(rows).to_csv(path, index=False)
+    yield lambda: WorldCities(path)
+
+
+@contextmanager
+def _world_cities_cache(rows: int, workdir: str) -> Iterator[Callable]:
+    from project.utilities.world_cities import WorldCities
+
+    path = os.path.join(workdir, f"world_cities_{rows}.csv")
+    cache_dir = os.path.join(workdir, ".cache")
+    world_cities_frame(rows).to_csv(path, index=False)
+    WorldCities(path, cache_dir)
+    yield lambda: WorldCities(path, cache_dir)
+
+
+@contextmanager
+def _clean_locations(rows: int, workdir: str) -> Iterator[Callable]:
+    from project.utilities import transformers
+
+    df_cities = world_cities_frame(WORLD_CITIES_ROWS)
+    path = os.path.join(workdir, "world_cities.csv")
+    df_cities.to_csv(path, index=False)
+    df_users = user_locations_frame(rows, df_cities)
+    transformers.clean_locations(df_users.head(1), path)
+
+    def run():
+        # Start from an empty location cache, every batch of 100 users is cleaned as get_author_locations does
+        transformers.get_location_cache().clear()
+        for batch_start in range(0, len(df_users), 100):
+            transformers.clean_locations(df_users.iloc[batch_start:batch_start + 100], path)
+
+    yield run
+
+
+@contextmanager
+def _add_author_locations(rows: int, workdir: str) -> Iterator[Callable]:
+    from project.utilities.transformers import add_author_locations
+
+    n_authors = max(rows // 5, 1)
+    lookup = user_locations(n_authors)
+    df_tweets = tweets_frame(rows, n_authors)
+    yield lambda: add_author_locations(df_tweets, lookup)
+
+
+def _write(output_format_value: str) -> Callable:
+    @contextmanager
+    def stage(rows: int, workdir: str) -> Iterator[Callable]:
+        from project.twitter import sinks
+        from project.twitter.output_format import OutputFormat
+        from project.twitter.parser import DF_HEADERS, parse_responses
+
+        _, df = parse_responses(DF_HEADERS, tweet_pages(max(rows // 100, 1), 100, geo_ratio=1.0))
+        data_dir = sinks.DATA_DIR
+        sinks.DATA_DIR = workdir
+
+        def run():
+            with sinks.make_sink(OutputFormat(output_format_value), "tweets", "20220313", DF_HEADERS) as sink:
+                for page_start in range(0, len(df), 100):
+                    sink.write(df.iloc[page_start:page_start + 100])
+
+        try:
+            yield run
+        finally:
+            sinks.DATA_DIR = data_dir
+
+    return stage
+
+
+def _read(output_format_value: str) -> Callable:
+    @contextmanager
+    def stage(rows: int, workdir: str) -> Iterator[Callable]:
+        from project.twitter import sinks
+        from project.twitter.output_format import OutputFormat
+        from project.twitter.parser import DF_HEADERS, parse_responses
+        from project.twitter.storage import read_tweets
+
+        output_format = OutputFormat(output_format_value)
+        data_dir = sinks.DATA_DIR
+        sinks.DATA_DIR = workdir
+        try:
+            n_pages = max(rows // 100, 1)
+            with sinks.make_sink(output_format, "tweets", "20220313", DF_HEADERS) as sink:
+                for first in range(0, n_pages, 100):
+                    pages = [tweet_page(100, geo_ratio=1.0, seed=first + page)
+                             for page in range(min(100, n_pages - first))]
+                    sink.write(parse_responses(DF_HEADERS, pages)[1])
+        finally:
+            sinks.DATA_DIR = data_dir
+        path = sink.filename if output_format.value == OutputFormat.CSV.value else os.path.dirname(sink.filename)
+        yield lambda: read_tweets(path, output_format)
+
+    return stage
+
+
+@contextmanager
+def _tweets_add_locations(rows: int, workdir: str) -> Iterator[Callable]:
+    from project.twitter import runner
+    from project.twitter.config.configuration import get_config
+    from project.twitter.mock_server import MockTwitterServer
+    from project.twitter.parser import DF_HEADERS, parse_responses
+
+    df_cities = world_cities_frame(WORLD_CITIES_ROWS)
+    world_cities_file = os.path.join(workdir, "world_cities.csv")
+    df_cities.to_csv(world_cities_file, index=False)
+    tweet_data_file = os.path.join(workdir, "tweets.csv")
+    _, df = parse_responses(DF_HEADERS, tweet_pages(max(rows // 100, 1), 100, geo_ratio=1.0))
+    df.to_csv(tweet_data_file)
+
+    config = get_config()
+    world_cities, users_url = runner.WORLD_CITIES_FILE, config.users_url
+    with MockTwitterServer(rate_limit=10 ** 9) as server:
+        runner.WORLD_CITIES_FILE, config.users_url = world_cities_file, server.users_url
+        try:
+            yield lambda: runner.tweets_add_locations(tweet_data_file, author_cache_db=None, concurrency=4)
+        finally:
+            runner.WORLD_CITIES_FILE, config.users_url = world_cities, users_url
+
+
+STAGES = {
+    "parse": _parse,
+    "world_cities_csv": _world_cities_csv,
+    "world_cities_cache": _world_cities_cache,
+    "clean_locations": _clean_locations,
+    "add_author_locations": _add_author_locations,
+    "write_csv": _write("csv"),
+    "write_parquet": _write("parquet"),
+    "read_csv": _read("csv"),
+    "read_parquet": _read("parquet"),
+    "tweets_add_locations": _tweets_add_locations
+}
+
+
+def _frame_memory(result) -> int:
+    """
+    The memory held by the DataFrames a stage returned, including the Python strings in object columns.
+    """
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(deep=True).sum())
+    if isinstance(result, (list, tuple)):
+        return sum(_frame_memory(item) for item in result)
+    return 0
+
+
+def measure(stage: str, rows: int, repeat: int = 3) -> StageResult:
+    """
+    Time the best of ``repeat`` runs of a stage at a scale, then trace the peak memory of one more run and measure
+    the DataFrames it returned.
+    """
+    with tempfile.TemporaryDirectory() as workdir, STAGES[stage](rows, workdir) as run:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+
+        tracemalloc.start()
+        try:
+            result = run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    seconds = min(timings)
+    return StageResult(stage, rows, seconds, rows / seconds if seconds else float("inf"), peak,
+                       _frame_memory(result))
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(stages: List[str] = None, scales: List[int] = None, repeat: int = 3, output: str = None) -> Dict:
+    """
+    Run the stages at every scale, print a table of the results and save them as JSON.
+
+    Parameters
+    ----------
+    stages
+        The names of the stages in STAGES to run, all of them when None.
+    scales
+        The numbers of rows to run every stage with.
+    repeat
+        The number of timed runs of every stage and scale, the fastest is kept.
+    output
+        The JSON file to save the results to, defaults to ``benchmarks/results/<commit>.json``.
+    """
+    commit = _commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "pandas": pd.__version__,
+        "results": []
+    }
+    print(f"{'stage':>22} {'rows':>10} {'seconds':>10} {'rows/s':>14} {'peak MB':>10} {'frame MB':>10}")
+    for stage in stages or list(STAGES):
+        for rows in scales or DEFAULT_SCALES:
+            try:
+                result = measure(stage, rows, repeat)
+            except ImportError as e:
+                print(f"{stage:>22} skipped: {e}")
+                break
+            report["results"].append(asdict(result))
+            print(f"{stage:>22} {rows:>10,} {result.seconds:>10.3f} {result.rows_per_sec:>14,.0f} "
+                  f"{result.peak_memory / 2 ** 20:>10.1f} {result.frame_memory / 2 ** 20:>10.1f}")
+
+    output = output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {output}")
+    return report
+
+
+def compare(report: Dict, baseline_file: str):
+    """
+    Print the rows/s and peak memory of a report relative to a baseline report, for the stages and scales in both.
+    """
+    with open(baseline_file, "r") as f:
+        baseline = json.load(f)
+    before = {(result["stage"], result["rows"]): result for result in baseline["results"]}
+
+    print(f"Compared to {baseline['commit']} ({baseline_file})")
+    print(f"{'stage':>22} {'rows':>10} {'rows/s':>10} {'peak memory':>12}")
+    for result in report["results"]:
+        previous = before.get((result["stage"], result["rows"]))
+        if previous is None:
+            continue
+        speed = result["rows_per_sec"] / previous["rows_per_sec"]
+        memory = result["peak_memory"] / previous["peak_memory"] if previous["peak_memory"] else float("nan")
+        print(f"{result['stage']:>22} {result['rows']:>10,} {speed:>9.2f}x {memory:>11.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic data")
+    parser.add_argument('--stages', type=str, help=f"Comma separated stages, from: {', '.join(STAGES)}")
+    parser.add_argument('--scales', type=str, help="Comma separated numbers of rows, defaults to 1000,10000,100000")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per stage and scale, the best is kept")
+    parser.add_argument('--output', type=str, help="JSON file to save the results to")
+    parser.add_argument('--compare', type=str, help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+    # Unresolved locations are logged as warnings, which would bury the results
+    logging.basicConfig(level=logging.ERROR)
+
+    results = run(
+        stages=args.stages.split(",") if args.stages else None,
+        scales=[int(scale) for scale in args.scales.split(",")] if args.scales else None,
+        repeat=args.repeat,
+        output=args.output
+    )
+    if args.compare:
+        compare(results, args.compare)
@@ -0,0 +1,59 @@
+from tests.twitter.pages import tweet_page, tweet_pages  # noqa: F401
+
+
+def world_cities_frame(n_cities: int = 45_000, n_countries: int = 240, seed: int = 0) -> "pd.DataFrame":
+    """
+    Build a synthetic world cities reference table with the columns of the simplemaps world cities file.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rnd = np.random.default_rng(seed)
+    countries = [f"Country {chr(65 + i % 26)}{i}" for i in range(n_countries)]
+    country = rnd.integers(0, n_countries, n_cities)
+    names = [f"City{i}" for i in range(n_cities)]
+    return pd.DataFrame({
+        "city": names,
+        "city_ascii": names,
+        "lat": rnd.uniform(-60, 70, n_cities).round(4),
+        "lng": rnd.uniform(-180, 180, n_cities).round(4),
+        "country": [countries[c] for c in country],
+        "iso2": "XX",
+        "iso3": "XXX",
+        "admin_name": "Admin",
+        "capital": "",
+        "population": rnd.integers(1_000, 20_000_000, n_cities),
+        "id": np.arange(n_cities) + 1_000_000_000
+    })
+
+
+def user_locations_frame(n_users: int, world_cities: "pd.DataFrame", n_distinct: int = 5_000,
+                         seed: int = 0) -> "pd.DataFrame":
+    """
+    Build a users endpoint ``author_id, location`` frame. Locations are drawn from ``n_distinct`` strings with a Zipf
+    distribution, so a few strings dominate as they do in real profiles, and mix "city, country", bare country and
+    unresolvable formats with missing values.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rnd = np.random.default_rng(seed)
+    cities = world_cities.sample(min(n_distinct, len(world_cities)), random_state=seed)
+    distinct = []
+    for i, (city, country) in enumerate(zip(cities["city"], cities["country"])):
+        form = i % 10
+        if form < 6:
+            distinct.append(f"{city}, {country}")
+        elif form < 8:
+            distinct.append(f"{country} - {city}")
+        elif form < 9:
+            distinct.append(country)
+        else:
+            distinct.append(f"somewhere near {city}")
+    distinct.append(None)
+
+    picks = (rnd.zipf(1.3, n_users) - 1) % len(distinct)
+    return pd.DataFrame({
+        "author_id": (np.arange(n_users) + 10**8).astype(str),
+        "location": [distinct[pick] for pick in picks]
+    })
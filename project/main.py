@@ -1,7 +1,12 @@
 import argparse
 import logging
 
-from project.twitter.runner import search_tweets, tweets_add_locations
+from project.twitter.author_cache import DEFAULT_AUTHOR_CACHE_DB, DEFAULT_TTL_DAYS
+from project.twitter.output_format import OutputFormat
+from project.utilities.metrics import PROFILE_MODES, metrics, profiled
+
+# pandas, requests and the runner are imported by the subcommand that needs them, so --help and argument errors
+# return straight away
 
 if __name__ == "__main__":
     logging_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -14,29 +19,179 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Python Twitter v2 API to CSV")
 
+    instrumentation = argparse.ArgumentParser(add_help=False)
+    instrumentation.add_argument('--metrics-file', type=str, required=False,
+                                 help="File to write the stage timings and counters to, Prometheus text for .prom "
+                                      "files and JSON otherwise")
+    instrumentation.add_argument('--profile', type=str, required=False, choices=PROFILE_MODES,
+                                 help="Profile the run with cProfile (cpu) or tracemalloc (memory)")
+    instrumentation.add_argument('--profile-output', type=str, required=False,
+                                 help="File to save the cProfile stats to")
+
     sub_parser = parser.add_subparsers(dest='command')
-    search = sub_parser.add_parser('search', help="Hit the Twitter search API")
-    add_locations = sub_parser.add_parser('add-locations', help="Hit the Twitter users API")
+    search = sub_parser.add_parser('search', help="Hit the Twitter search API", parents=[instrumentation])
+    add_locations = sub_parser.add_parser('add-locations', help="Hit the Twitter users API",
+                                          parents=[instrumentation])
+    add_places = sub_parser.add_parser('add-places', help="Fill places from the nearest city, without the API",
+                                       parents=[instrumentation])
+    batch = sub_parser.add_parser('batch', help="Run the search queries of a YAML file", parents=[instrumentation])
+    reparse = sub_parser.add_parser('reparse', help="Parse the raw archive of a search again, without the API",
+                                    parents=[instrumentation])
 
     search.add_argument('--query', type=str, required=True, help="The search query for the Twitter v2 API")
     search.add_argument('--max-results', type=int, required=False, default=100, help="Set max results per page")
     search.add_argument('--max-count', type=int, required=False, default=1000, help="Max tweets per time period")
     search.add_argument('--filename', type=str, required=True, help="File name to write results to (no extension)")
     search.add_argument('--days', type=int, required=False, default=7, help="Max days to get data for")
+    search.add_argument('--concurrency', type=int, required=False, default=1,
+                        help="Number of days to fetch in parallel")
+    search.add_argument('--format', type=str, required=False, default=OutputFormat.CSV.value,
+                        choices=[f.value for f in OutputFormat], help="Output file format")
+    search.add_argument('--resume', action='store_true',
+                        help="Continue every day from where the last run with the same query and filename stopped")
+    search.add_argument('--checkpoint-pages', type=int, required=False, default=5,
+                        help="Pages written between two saves of the progress of a day, for --resume")
+    search.add_argument('--incremental', action='store_true',
+                        help="Only get tweets newer than the last run with the same query and filename")
+    search.add_argument('--no-dedupe', action='store_true',
+                        help="Keep the tweets already written by an overlapping day or an earlier run")
+    search.add_argument('--archive', action='store_true',
+                        help="Also save the raw API responses to project/data/raw/<filename>/, to reparse them later")
+    search.add_argument('--adaptive', action='store_true',
+                        help="Spread --max-count over the day from the tweets per hour of earlier runs, instead of "
+                             "taking the newest tweets of the day")
+
+    batch.add_argument('--queries-file', type=str, required=False,
+                       help="YAML file of the queries, defaults to config/queries.yaml next to configuration.yaml")
+    batch.add_argument('--concurrency', type=int, required=False, default=1,
+                       help="Number of days to fetch in parallel, over all queries")
+    batch.add_argument('--schedule', type=str, required=False, default="fair", choices=["fair", "priority"],
+                       help="Take one day of every query in turn (fair) or the highest priority queries first")
+    batch.add_argument('--format', type=str, required=False, default=OutputFormat.CSV.value,
+                       choices=[f.value for f in OutputFormat], help="Output file format")
+    batch.add_argument('--resume', action='store_true',
+                       help="Continue every day of every query from where the last run stopped")
+    batch.add_argument('--checkpoint-pages', type=int, required=False, default=5,
+                       help="Pages written between two saves of the progress of a day, for --resume")
+    batch.add_argument('--incremental', action='store_true',
+                       help="Only get tweets newer than the last run of every query")
+    batch.add_argument('--no-dedupe', action='store_true',
+                       help="Keep the tweets already written by an overlapping day or an earlier run")
+    batch.add_argument('--archive', action='store_true',
+                       help="Also save the raw API responses to project/data/raw/<filename>/, to reparse them later")
+    batch.add_argument('--adaptive', action='store_true',
+                       help="Spread --max-count over the day from the tweets per hour of earlier runs, instead of "
+                            "taking the newest tweets of the day")
+
+    reparse.add_argument('--filename', type=str, required=True, help="File name the archive was written for")
+    reparse.add_argument('--format', type=str, required=False, default=OutputFormat.CSV.value,
+                         choices=[f.value for f in OutputFormat], help="Output file format")
+    reparse.add_argument('--force', action='store_true',
+                         help="Overwrite the days that hold more rows than their archive, e.g. added without "
+                              "--archive")
 
     add_locations.add_argument('--filename', type=str, required=True, help="File name to update (no extension)")
+    add_locations.add_argument('--format', type=str, required=False, default=OutputFormat.CSV.value,
+                               choices=[f.value for f in OutputFormat], help="File format of the file to update")
+    add_locations.add_argument('--date', type=str, required=False,
+                               help="Parquet partition to update as YYYYMMDD, defaults to all partitions")
+    add_locations.add_argument('--cache-ttl-days', type=float, required=False, default=DEFAULT_TTL_DAYS,
+                               help="Days an author location is cached before the users API is called again")
+    add_locations.add_argument('--no-cache', action='store_true',
+                               help="Always call the users API instead of using the author location cache")
+    add_locations.add_argument('--concurrency', type=int, required=False, default=1,
+                               help="Number of users API requests to keep in flight")
+    add_locations.add_argument('--clean-workers', type=int, required=False, default=1,
+                               help="Number of processes cleaning the user locations")
+    add_locations.add_argument('--location-cache-size', type=int, required=False,
+                               help="Number of distinct location strings to memoize, 0 disables the cache, "
+                                    "defaults to 100000")
+
+    add_places.add_argument('--filename', type=str, required=True, help="File name to update (no extension)")
+    add_places.add_argument('--format', type=str, required=False, default=OutputFormat.CSV.value,
+                            choices=[f.value for f in OutputFormat], help="File format of the file to update")
+    add_places.add_argument('--date', type=str, required=False,
+                            help="Parquet partition to update as YYYYMMDD, defaults to all partitions")
+    add_places.add_argument('--max-km', type=float, required=False,
+                            help="Max distance in km from a tweet to the city its place is filled from, defaults to 50")
 
     args = parser.parse_args()
 
-    if args.command == 'search':
-        logger.info(f"Search Args: {args}")
-        search_tweets(
-            keyword=args.query,
-            max_results=args.max_results,
-            max_count=args.max_count,
-            csv_filename=args.filename,
-            days=args.days
-        )
-    elif args.command == 'add_locations':
-        logger.info(f"Users Args: {args}")
-        tweets_add_locations(tweet_data_file="")
+    with profiled(args.profile, args.profile_output):
+        if args.command == 'search':
+            from project.twitter.runner import search_tweets
+            from project.twitter.seen_ids import DEFAULT_SEEN_IDS_DIR
+
+            logger.info(f"Search Args: {args}")
+            search_tweets(
+                keyword=args.query,
+                max_results=args.max_results,
+                max_count=args.max_count,
+                csv_filename=args.filename,
+                days=args.days,
+                concurrency=args.concurrency,
+                output_format=OutputFormat(args.format),
+                resume=args.resume,
+                checkpoint_pages=args.checkpoint_pages,
+                incremental=args.incremental,
+                seen_ids_dir=None if args.no_dedupe else DEFAULT_SEEN_IDS_DIR,
+                archive=args.archive,
+                adaptive=args.adaptive
+            )
+        elif args.command == 'batch':
+            from project.twitter.batch import Schedule, load_queries, run_batch
+            from project.twitter.seen_ids import DEFAULT_SEEN_IDS_DIR
+
+            logger.info(f"Batch Args: {args}")
+            run_batch(
+                specs=load_queries(args.queries_file),
+                concurrency=args.concurrency,
+                schedule=Schedule(args.schedule),
+                output_format=OutputFormat(args.format),
+                resume=args.resume,
+                checkpoint_pages=args.checkpoint_pages,
+                incremental=args.incremental,
+                seen_ids_dir=None if args.no_dedupe else DEFAULT_SEEN_IDS_DIR,
+                archive=args.archive,
+                adaptive=args.adaptive
+            )
+        elif args.command == 'reparse':
+            from project.twitter.archive import reparse_archive
+
+            logger.info(f"Reparse Args: {args}")
+            reparse_archive(args.filename, OutputFormat(args.format), force=args.force)
+        elif args.command == 'add-locations':
+            from project.twitter.runner import tweets_add_locations
+            from project.twitter.storage import tweets_path
+            from project.utilities.transformers import DEFAULT_LOCATION_CACHE_SIZE
+
+            logger.info(f"Users Args: {args}")
+            output_format = OutputFormat(args.format)
+            tweets_add_locations(
+                tweet_data_file=tweets_path(output_format, args.filename),
+                output_format=output_format,
+                date=args.date,
+                author_cache_db=None if args.no_cache else DEFAULT_AUTHOR_CACHE_DB,
+                cache_ttl_days=args.cache_ttl_days,
+                concurrency=args.concurrency,
+                clean_workers=args.clean_workers,
+                location_cache_size=(DEFAULT_LOCATION_CACHE_SIZE if args.location_cache_size is None
+                                     else args.location_cache_size)
+            )
+        elif args.command == 'add-places':
+            from project.twitter.runner import tweets_add_places
+            from project.twitter.storage import tweets_path
+            from project.utilities.transformers import DEFAULT_PLACE_MAX_KM
+
+            logger.info(f"Places Args: {args}")
+            output_format = OutputFormat(args.format)
+            tweets_add_places(
+                tweet_data_file=tweets_path(output_format, args.filename),
+                output_format=output_format,
+                date=args.date,
+                max_km=DEFAULT_PLACE_MAX_KM if args.max_km is None else args.max_km
+            )
+
+    metrics.log_summary()
+    if args.metrics_file:
+        metrics.write(args.metrics_file)
@@ -1,11 +1,21 @@
 import logging
 import os
-from typing import Dict
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from twitter.config.configuration import Configuration
+from project.twitter.archive import RawArchive
+from project.twitter.config.configuration import Configuration
+from project.twitter.decoding import decode_json
 from project.twitter.endpoint_type import EndpointType
+from project.twitter.rate_limiter import RateLimiter
+from project.twitter.recorder import Recorder
+from project.utilities.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -63,9 +73,211 @@ def append_config_params(params: Dict, endpoint: EndpointType, config: Configura
     return {**config_params, **params}
 
 
+class TwitterApiError(Exception):
+    """
+    Raised when the Twitter v2 API returns a non-retryable error, or a retryable one after all retries are used up.
+    """
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(status_code, text)
+        self.status_code = status_code
+        self.text = text
+
+
+@dataclass
+class EndpointStats:
+    """
+    Running counters for the calls made to one endpoint.
+    """
+    requests: int = 0
+    retries: int = 0
+    errors: int = 0
+    bytes: int = 0
+    latency: float = 0.0
+
+    @property
+    def mean_latency(self) -> float:
+        return self.latency / self.requests if self.requests else 0.0
+
+
+class TwitterClient:
+    """
+    Reusable client for the Twitter v2 API.
+
+    Holds a pooled keep-alive ``requests.Session`` so pages reuse connections, retries transient failures with
+    jittered exponential backoff, waits for the rate limit reset on 429 and keeps per-endpoint counters.
+    Every endpoint gets its own RateLimiter shared by all threads using the client.
+
+    The successful responses are saved to the ``recorder``, which defaults to the one of the ``TWITTER_RECORD_DIR``
+    environment variable, so they can be replayed offline.
+    """
+
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(
+            self,
+            headers: Dict = None,
+            max_retries: int = 5,
+            backoff_base: float = 1.0,
+            backoff_max: float = 60.0,
+            pool_size: int = 10,
+            timeout: float = 30.0,
+            session: requests.Session = None,
+            sleep: Callable[[float], None] = time.sleep,
+            recorder: Recorder = None
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self._sleep = sleep
+        self.recorder = recorder if recorder is not None else Recorder.from_env()
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        session.headers.update(create_headers() if headers is None else headers)
+        self.session = session
+
+        self._lock = threading.Lock()
+        self._rate_limiters = {}
+        self._stats = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    @property
+    def stats(self) -> Dict[str, EndpointStats]:
+        return dict(self._stats)
+
+    def rate_limiter(self, url: str) -> RateLimiter:
+        """
+        Get the RateLimiter for the given endpoint, creating it on first use.
+        """
+        with self._lock:
+            if url not in self._rate_limiters:
+                self._rate_limiters[url] = RateLimiter()
+                self._stats[url] = EndpointStats()
+            return self._rate_limiters[url]
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get(
+            self,
+            url: str,
+            params: Dict,
+            next_token: str = None,
+            decode: Callable[[bytes], Dict] = decode_json,
+            archive: RawArchive = None
+    ) -> Dict:
+        """
+        Execute a HTTP GET Request to the Twitter v2 API, retrying transient errors, and return the JSON response.
+
+        Parameters
+        ----------
+        url
+            The Twitter v2 API Endpoint.
+        params
+            The params dictionary to use for the API endpoint.
+        next_token
+            The token for the next response page.
+        decode
+            Decodes the response body, e.g. decode_search_page to only decode the fields of a search page that are
+            parsed.
+        archive
+            The raw archive to append the response body to.
+
+        Returns
+        -------
+        Dict
+            The JSON response
+        """
+        params = {**params, "next_token": next_token}
+        rate_limiter = self.rate_limiter(url)
+        stats = self._stats[url]
+
+        attempt = 0
+        while True:
+            rate_limiter.acquire()
+            response = None
+            started = time.monotonic()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            finally:
+                rate_limiter.release(response.headers if response is not None else None)
+            elapsed = time.monotonic() - started
+            metrics.observe("http_wait", elapsed)
+            metrics.inc("http_requests")
+
+            with self._lock:
+                stats.requests += 1
+                stats.latency += elapsed
+                if response is not None:
+                    stats.bytes += len(response.content)
+            if response is not None:
+                metrics.inc("http_bytes", len(response.content))
+
+            if response is not None:
+                logger.info("Endpoint Response Code: " + str(response.status_code))
+                if response.status_code == 200:
+                    if archive is not None:
+                        archive.write(response.content)
+                    with metrics.timer("json_decode"):
+                        json_response = decode(response.content)
+                    if self.recorder is not None:
+                        # Recordings keep every field, also when the page was decoded into the parsed fields only
+                        self.recorder.record(url, params, decode_json(response.content))
+                    return json_response
+                error = TwitterApiError(response.status_code, response.text)
+                retryable = response.status_code in self.RETRY_STATUS_CODES
+            else:
+                logger.warning(f"Request to {url} failed: {error}")
+                retryable = True
+
+            if not retryable or attempt >= self.max_retries:
+                with self._lock:
+                    stats.errors += 1
+                raise error
+
+            attempt += 1
+            with self._lock:
+                stats.retries += 1
+            metrics.inc("http_retries")
+
+            if response is not None and response.status_code == 429 and rate_limiter.reset_at > time.time():
+                # The limiter has been emptied by the 429 headers, the next acquire() waits for the reset
+                logger.warning(f"Rate limited on {url}, waiting for reset (retry {attempt}/{self.max_retries})")
+                continue
+
+            delay = self._backoff(attempt)
+            logger.warning(f"Retrying {url} in {delay:.1f}s (retry {attempt}/{self.max_retries})")
+            self._sleep(delay)
+
+    def log_stats(self):
+        for url, stats in self.stats.items():
+            logger.info(f"{url}: {stats.requests} requests, {stats.retries} retries, {stats.errors} errors, "
+                        f"{stats.bytes} bytes, {stats.mean_latency:.3f}s mean latency")
+
+
+_default_client = None
+
+
 def connect_to_endpoint(url: str, headers: Dict, params: Dict, next_token: str = None) -> Dict:
     """
     Execute a HTTP Request to the Twitter v2 API and return the JSON response.
+    Uses a module level TwitterClient so consecutive calls share the same connection pool.
+
     Parameters
     ----------
     url
@@ -82,10 +294,7 @@ def connect_to_endpoint(url: str, headers: Dict, params: Dict, next_token: str =
     Dict
         The JSON response
     """
-    params["next_token"] = next_token   # params object received from create_url function
-    response = requests.request("GET", url, headers=headers, params=params)
-    logger.info("Endpoint Response Code: " + str(response.status_code))
-    if response.status_code != 200:
-        raise Exception(response.status_code, response.text)
-    return response.json()
-
+    global _default_client
+    if _default_client is None:
+        _default_client = TwitterClient(headers)
+    return _default_client.get(url, params, next_token)
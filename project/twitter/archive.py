@@ -0,0 +1,239 @@
+import glob
+import gzip
+import logging
+import os
+import threading
+from typing import Callable, Dict, Iterator, List, Set
+
+from project.twitter.checkpoint import DEFAULT_CHECKPOINT_DB, CheckpointStore
+from project.twitter.decoding import decode_search_page
+from project.twitter.output_format import OutputFormat
+from project.twitter.parser import DF_HEADERS, parse_responses
+from project.twitter.seen_ids import DEFAULT_SEEN_IDS_DIR, SeenIdIndex, drop_seen, tweet_ids
+from project.twitter.sinks import DATA_DIR, make_sink
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = "raw"
+# Pages parsed together when an archive is parsed again
+REPARSE_BATCH_PAGES = 50
+
+
+def archive_extension() -> str:
+    """
+    zstd when zstandard is installed, gzip otherwise.
+    """
+    return "zst" if zstandard is not None else "gz"
+
+
+def archive_path(name: str, date: str, extension: str = None) -> str:
+    """
+    Get the path of the raw archive of the search API responses of a day.
+    """
+    return os.path.join(DATA_DIR, ARCHIVE_DIR, name, f"{date}.ndjson.{extension or archive_extension()}")
+
+
+def archive_files(name: str) -> List[str]:
+    """
+    Get the raw archive files of an output name, one per day, in date order.
+    """
+    return sorted(glob.glob(os.path.join(DATA_DIR, ARCHIVE_DIR, name, "*.ndjson.*")))
+
+
+class RawArchive:
+    """
+    Appends the raw bytes of search API responses to a compressed newline delimited JSON file, one line per
+    response, so the pages can be parsed again without calling the API.
+
+    The file is overwritten when the archive is opened unless ``append`` is set. Appending adds a new gzip member
+    or zstd frame, which are read back as one stream.
+
+    A response written after the archive is closed is dropped, e.g. one returned to the fetch thread of a window
+    that already failed and closed its archive.
+    """
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self.pages = 0
+        self.closed = False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        mode = "ab" if append else "wb"
+        if path.endswith(".zst"):
+            if zstandard is None:
+                raise ImportError("zstandard is required to write .zst archives")
+            self._raw = open(path, mode)
+            self._file = zstandard.ZstdCompressor().stream_writer(self._raw)
+        else:
+            self._raw = None
+            self._file = gzip.open(path, mode)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, content: bytes):
+        # JSON can only hold line breaks as whitespace between tokens, they're escaped inside strings
+        line = content.replace(b"\r", b"").replace(b"\n", b"") + b"\n"
+        with self._lock:
+            if self.closed:
+                logger.debug(f"Dropping a response written after {self.path} was closed")
+                return
+            self._file.write(line)
+            self.pages += 1
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._file.close()
+            if self._raw is not None:
+                self._raw.close()
+
+
+def iter_archive(path: str, decode: Callable[[bytes], Dict] = decode_search_page) -> Iterator[Dict]:
+    """
+    Decode the responses of a raw archive file, in the order they were written.
+    """
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError("zstandard is required to read .zst archives")
+        with open(path, "rb") as raw, zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True) as f:
+            yield from _iter_lines(f, decode)
+    else:
+        with gzip.open(path, "rb") as f:
+            yield from _iter_lines(f, decode)
+
+
+def _iter_lines(f, decode: Callable[[bytes], Dict]) -> Iterator[Dict]:
+    buffer = b""
+    while True:
+        chunk = f.read(1 << 20)
+        if not chunk:
+            break
+        lines = (buffer + chunk).split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            if line:
+                yield decode(line)
+    if buffer:
+        # A page cut off by a run that stopped while writing it
+        logger.warning(f"Skipping an incomplete last page of {len(buffer)} bytes")
+
+
+def _archive_rows(paths: List[str], seen: Set[str]) -> int:
+    """
+    Count the tweets with geo data a day of the archive is parsed into, without parsing it. ``seen`` holds the ids
+    of the tweets of the days counted before, and gets the ids of this day.
+    """
+    rows = 0
+    for json_response in (page for path in paths for page in iter_archive(path)):
+        for tweet in json_response.get("data") or []:
+            if tweet["id"] in seen:
+                continue
+            seen.add(tweet["id"])
+            if ((tweet.get("geo") or {}).get("coordinates") or {}).get("coordinates"):
+                rows += 1
+    return rows
+
+
+def reparse_archive(
+        name: str,
+        output_format: OutputFormat = OutputFormat.CSV,
+        flush_rows: int = 10_000,
+        checkpoint_db: str = DEFAULT_CHECKPOINT_DB,
+        seen_ids_dir: str = DEFAULT_SEEN_IDS_DIR,
+        force: bool = False
+) -> int:
+    """
+    Parse every day in the raw archive of an output name again and overwrite the outputs of the days with it,
+    e.g. after the parser changed, without calling the API. A tweet archived more than once is written once.
+
+    A day whose checkpoint has more rows written than its archive holds, e.g. after a run without an archive added
+    to it, would lose rows, so nothing is overwritten unless ``force`` is set. The checkpoints and the seen ids of
+    the queries writing to the output are set to the rows written from the archive.
+
+    Parameters
+    ----------
+    name
+        The output name the archive was written for.
+    output_format
+        The file format to write.
+    flush_rows
+        The number of parsed rows to buffer per day before writing them.
+    checkpoint_db
+        The SQLite file of the progress of the searches.
+    seen_ids_dir
+        The directory of the ids of the tweets written per query, None to leave them as they are.
+    force
+        Overwrite the days whose outputs hold more rows than their archive.
+
+    Returns
+    -------
+    The number of rows written.
+    """
+    files = archive_files(name)
+    if not files:
+        logger.warning(f"No raw archive found for {name} in {os.path.join(DATA_DIR, ARCHIVE_DIR)}")
+        return 0
+
+    days = {}
+    for path in files:
+        days.setdefault(os.path.basename(path).split(".")[0], []).append(path)
+
+    with CheckpointStore(checkpoint_db) as checkpoints:
+        windows = {date: checkpoints.get_windows(name, output_format.value, date) for date in days}
+        if any(windows.values()):
+            seen = set()
+            archived = {date: _archive_rows(paths, seen) for date, paths in days.items()}
+            written = {date: max(state.rows_written for state in states.values())
+                       for date, states in windows.items() if states}
+            short = {date: (rows, archived[date]) for date, rows in written.items() if rows > archived[date]}
+            if short:
+                details = ", ".join(f"{date} has {written} rows, the archive {rows}"
+                                    for date, (written, rows) in short.items())
+                if not force:
+                    raise ValueError(f"Reparsing {name} would drop rows not in its archive ({details}), "
+                                     f"force it to overwrite them anyway")
+                logger.warning(f"Overwriting {name} with its archive, dropping rows not in it: {details}")
+
+        seen_ids = SeenIdIndex(None)
+        query_seen_ids = {}
+        rows = 0
+        for date, paths in days.items():
+            pages = 0
+            day_ids = []
+            with make_sink(output_format, name, date, DF_HEADERS, flush_rows) as sink:
+                batch = []
+                for json_response in (page for path in paths for page in iter_archive(path)):
+                    batch.append(drop_seen(json_response, seen_ids, date))
+                    day_ids.append(tweet_ids(batch[-1]))
+                    pages += 1
+                    if len(batch) == REPARSE_BATCH_PAGES:
+                        sink.write(parse_responses(DF_HEADERS, batch)[1])
+                        batch = []
+                if batch:
+                    sink.write(parse_responses(DF_HEADERS, batch)[1])
+            rows += sink.rows_written
+            logger.info(f"Parsed {pages} archived pages of {date} into {sink.rows_written} rows in {sink.filename}")
+
+            for query, state in windows[date].items():
+                state.rows_written = sink.rows_written
+                checkpoints.save(query, name, output_format.value, date, state)
+                if seen_ids_dir is not None:
+                    # The ids of the day are the ids of the tweets written from the archive
+                    if query not in query_seen_ids:
+                        query_seen_ids[query] = SeenIdIndex.open(query, name, output_format.value, seen_ids_dir)
+                    query_seen_ids[query].reset(date)
+                    for ids in day_ids:
+                        query_seen_ids[query].commit(date, ids)
+                    query_seen_ids[query].save(date)
+    return rows
@@ -0,0 +1,119 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AUTHOR_CACHE_DB = "project/data/author_locations.sqlite"
+DEFAULT_TTL_DAYS = 30
+
+
+class AuthorLocationCache:
+    """
+    SQLite cache of the users endpoint location of authors and the location it resolved to, keyed by author_id.
+
+    Authors the users endpoint didn't return, and locations that didn't resolve, are cached too so they aren't
+    requested again before the entry expires. Entries older than ``ttl_days`` are treated as missing.
+    """
+
+    def __init__(self, path: str = DEFAULT_AUTHOR_CACHE_DB, ttl_days: float = DEFAULT_TTL_DAYS):
+        self.path = path
+        self.ttl = ttl_days * 24 * 60 * 60
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS author_locations (
+                    author_id TEXT PRIMARY KEY,
+                    location TEXT,
+                    lat REAL,
+                    lon REAL,
+                    city TEXT,
+                    country TEXT,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get_many(self, author_ids: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Get the cached entries of the authors that haven't expired, and count the hits and misses.
+
+        Parameters
+        ----------
+        author_ids
+            The author ids to look up.
+
+        Returns
+        -------
+        A dictionary of author_id -> {"location", "lat", "lon", "city", "country"}, with None values for the
+        fields that weren't found.
+        """
+        author_ids = list(dict.fromkeys(author_ids))
+        oldest = time.time() - self.ttl
+        entries = {}
+        with self._lock:
+            # Stay well under SQLite's limit on the number of query parameters
+            for batch_start in range(0, len(author_ids), 500):
+                batch = author_ids[batch_start:batch_start + 500]
+                rows = self._conn.execute(
+                    f"""
+                    SELECT author_id, location, lat, lon, city, country FROM author_locations
+                    WHERE fetched_at >= ? AND author_id IN ({",".join("?" * len(batch))})
+                    """,
+                    [oldest] + batch
+                )
+                for author_id, location, lat, lon, city, country in rows:
+                    entries[author_id] = {"location": location, "lat": lat, "lon": lon, "city": city,
+                                          "country": country}
+            self.hits += len(entries)
+            self.misses += len(author_ids) - len(entries)
+        return entries
+
+    def put_many(self, entries: Dict[str, Dict]):
+        """
+        Save entries, replacing the cached ones of the same authors.
+
+        Parameters
+        ----------
+        entries
+            A dictionary of author_id -> {"location", "lat", "lon", "city", "country"}, missing fields are saved
+            as None.
+        """
+        fetched_at = time.time()
+        rows: List = [
+            (author_id, entry.get("location"), entry.get("lat"), entry.get("lon"), entry.get("city"),
+             entry.get("country"), fetched_at)
+            for author_id, entry in entries.items()
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT OR REPLACE INTO author_locations (author_id, location, lat, lon, city, country, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows
+            )
@@ -0,0 +1,206 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields, replace
+from enum import Enum
+from typing import Dict, List
+
+from project.twitter.api_handler import TwitterClient
+from project.twitter.checkpoint import DEFAULT_CHECKPOINT_DB, CheckpointStore
+from project.twitter.config.configuration import DEFAULT_CONFIG_FILE
+from project.twitter.output_format import OutputFormat
+from project.twitter.runner import (DEFAULT_CHECKPOINT_PAGES, WindowOptions, plan_windows, save_high_water_mark,
+                                    search_window)
+from project.twitter.seen_ids import DEFAULT_SEEN_IDS_DIR, SeenIdIndex
+from project.utilities.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERIES_FILE = os.path.join(os.path.dirname(DEFAULT_CONFIG_FILE), "queries.yaml")
+QUERIES_FILE_ENV = "TWITTER_QUERIES_FILE"
+
+
+class Schedule(Enum):
+    """
+    The order the day windows of a batch are fetched in. FAIR takes one window of every query in turn, PRIORITY
+    fetches every window of the highest priority queries first.
+    """
+    FAIR = "fair"
+    PRIORITY = "priority"
+
+
+@dataclass
+class QuerySpec:
+    """
+    A search query of a batch and the options it is run with.
+    """
+    query: str
+    filename: str
+    max_count: int = 1000
+    days: int = 7
+    max_results: int = 100
+    priority: int = 0
+
+
+@dataclass
+class _WindowTask:
+    spec: QuerySpec
+    query_index: int
+    window_index: int
+    start: object
+    end: object
+    since_id: str = None
+    seen_ids: SeenIdIndex = None
+
+
+def load_queries(path: str = None) -> List[QuerySpec]:
+    """
+    Read the queries of a batch from YAML, a ``defaults`` mapping and a ``queries`` list of mappings with the
+    QuerySpec fields.
+
+    Parameters
+    ----------
+    path
+        The YAML file, defaults to the ``TWITTER_QUERIES_FILE`` environment variable and then to the queries.yaml
+        next to configuration.yaml.
+    """
+    import yaml
+
+    path = path or os.getenv(QUERIES_FILE_ENV) or DEFAULT_QUERIES_FILE
+    with open(path, "r") as f:
+        conf = yaml.safe_load(f) or {}
+
+    names = {field.name for field in fields(QuerySpec)}
+    defaults = conf.get("defaults") or {}
+    specs = []
+    for entry in conf.get("queries") or []:
+        options = {**defaults, **entry}
+        unknown = set(options) - names
+        if unknown:
+            raise ValueError(f"Unknown options {sorted(unknown)} for query {entry.get('query')} in {path}")
+        specs.append(QuerySpec(**options))
+
+    filenames = [spec.filename for spec in specs]
+    duplicates = {filename for filename in filenames if filenames.count(filename) > 1}
+    if duplicates:
+        raise ValueError(f"Queries in {path} share the filenames {sorted(duplicates)}, every query needs its own")
+    logger.info(f"Loaded {len(specs)} queries from {path}")
+    return specs
+
+
+def order_windows(tasks: List[_WindowTask], schedule: Schedule) -> List[_WindowTask]:
+    """
+    Sort the day windows of every query in the order they are fetched in.
+    """
+    if schedule.value == Schedule.FAIR.value:
+        return sorted(tasks, key=lambda task: (task.window_index, task.query_index))
+    elif schedule.value == Schedule.PRIORITY.value:
+        return sorted(tasks, key=lambda task: (-task.spec.priority, task.query_index, task.window_index))
+    else:
+        raise NotImplementedError("The Schedule hasn't been implemented")
+
+
+@metrics.timed("batch")
+def run_batch(
+        specs: List[QuerySpec],
+        concurrency: int = 1,
+        schedule: Schedule = Schedule.FAIR,
+        flush_rows: int = 10_000,
+        output_format: OutputFormat = OutputFormat.CSV,
+        resume: bool = False,
+        checkpoint_db: str = DEFAULT_CHECKPOINT_DB,
+        checkpoint_pages: int = DEFAULT_CHECKPOINT_PAGES,
+        incremental: bool = False,
+        seen_ids_dir: str = DEFAULT_SEEN_IDS_DIR,
+        archive: bool = False,
+        adaptive: bool = False
+) -> Dict[str, int]:
+    """
+    Run every query of a batch in one process. The day windows of all the queries are fetched by one pool of
+    ``concurrency`` workers sharing one TwitterClient, so they share its connection pool and the rate limit budget
+    of the search endpoint, in the order of the schedule. Every query writes to its own files or partitions and
+    keeps its own checkpoints and high water mark.
+
+    Parameters
+    ----------
+    specs
+        The queries to run.
+    concurrency
+        The number of day windows to fetch in parallel, over all queries.
+    schedule
+        The order to fetch the windows in.
+    flush_rows
+        The number of parsed rows to buffer per day before writing them.
+    output_format
+        The file format to write.
+    resume
+        Continue every day of every query from where the last run stopped.
+    checkpoint_db
+        The SQLite file the progress of every day is saved to.
+    checkpoint_pages
+        The number of pages written between two saves of the progress of a day.
+    incremental
+        Only request the tweets newer than the high water mark of every query.
+    seen_ids_dir
+        The directory of the ids of the tweets written per query, None to keep duplicate tweets.
+    archive
+        Also write the raw response bodies of every day of every query to a compressed NDJSON archive.
+    adaptive
+        Spread the max_count of every day of every query over the day with slices planned from the tweets per hour
+        of earlier runs.
+
+    Returns
+    -------
+    The number of tweets scanned per query filename.
+    """
+    options = WindowOptions(flush_rows=flush_rows, output_format=output_format, resume=resume,
+                            checkpoint_pages=checkpoint_pages, archive=archive, adaptive=adaptive)
+
+    with CheckpointStore(checkpoint_db) as checkpoints:
+        tasks = []
+        end_lists = {}
+        for query_index, spec in enumerate(specs):
+            start_list, end_list, since_id = plan_windows(spec.query, spec.filename, spec.days, output_format,
+                                                          checkpoints, incremental)
+            end_lists[spec.filename] = end_list
+            seen_ids = (SeenIdIndex.open(spec.query, spec.filename, output_format.value, seen_ids_dir)
+                        if seen_ids_dir is not None else None)
+            tasks += [
+                # Only the window holding the high water mark needs since_id, the later ones are newer than it
+                _WindowTask(spec, query_index, i, start_list[i], end_list[i], since_id if i == 0 else None, seen_ids)
+                for i in range(len(start_list))
+            ]
+        tasks = order_windows(tasks, schedule)
+        logger.info(f"Running {len(specs)} queries in {len(tasks)} day windows, {schedule.value} schedule")
+
+        def run_window(task: _WindowTask) -> int:
+            with metrics.labels(query=task.spec.filename):
+                return search_window(task.spec.query, task.spec.filename, task.start, task.end, client, checkpoints,
+                                     replace(options, max_results=task.spec.max_results,
+                                             max_count=task.spec.max_count),
+                                     since_id=task.since_id, seen_ids=task.seen_ids)
+
+        with TwitterClient(pool_size=max(concurrency, 1)) as client, \
+                ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+            futures = [(task, executor.submit(run_window, task)) for task in tasks]
+
+            scanned = {spec.filename: 0 for spec in specs}
+            failed = {}
+            for task, future in futures:
+                try:
+                    scanned[task.spec.filename] += future.result()
+                except Exception as e:
+                    logger.error(f"Window {task.end:%Y%m%d} of {task.spec.query} failed: {e}")
+                    failed.setdefault(task.spec.filename, e)
+            client.log_stats()
+
+        for spec in specs:
+            if spec.filename in failed:
+                continue
+            save_high_water_mark(spec.query, spec.filename, output_format, checkpoints, end_lists[spec.filename])
+            logger.info(f"{spec.query}: {scanned[spec.filename]} tweets scanned")
+
+    if failed:
+        first = next(iter(failed.values()))
+        raise RuntimeError(f"{len(failed)} of {len(specs)} queries failed: {sorted(failed)}") from first
+    return scanned
@@ -0,0 +1,229 @@
+import logging
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_DB = "project/data/checkpoints.sqlite"
+
+
+@dataclass
+class WindowState:
+    """
+    The progress of one search time window.
+
+    ``next_token`` is the token of the first page that hasn't been written yet, so resuming a window continues
+    from that page. The window times and ``since_id`` are kept because a next_token is only valid for the query it
+    was issued for. ``slices`` holds the slices of an adaptively planned window still to fetch, as encoded by
+    planner.encode_slices, the next_token belongs to the first of them. ``base_rows`` is the number of rows the
+    output of the day held before the window appended to it, the window has its own max_count on top of them.
+    """
+    start_time: str
+    end_time: str
+    next_token: Optional[str] = None
+    newest_id: Optional[str] = None
+    newest_created_at: Optional[str] = None
+    rows_written: int = 0
+    tweets_scanned: int = 0
+    completed: bool = False
+    since_id: Optional[str] = None
+    slices: Optional[str] = None
+    base_rows: int = 0
+
+
+@dataclass
+class HighWaterMark:
+    """
+    The newest tweet ingested for a query, incremental runs only request tweets newer than it.
+    """
+    newest_id: str
+    newest_created_at: str
+
+
+class CheckpointStore:
+    """
+    SQLite store of the per-window progress of search runs, keyed by query, output name, output format and window
+    date. Safe to share between the threads fetching windows concurrently.
+    """
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_DB):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS windows (
+                    query TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    output_format TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    start_time TEXT NOT NULL,
+                    end_time TEXT NOT NULL,
+                    next_token TEXT,
+                    newest_id TEXT,
+                    newest_created_at TEXT,
+                    rows_written INTEGER NOT NULL,
+                    tweets_scanned INTEGER NOT NULL,
+                    completed INTEGER NOT NULL,
+                    since_id TEXT,
+                    slices TEXT,
+                    base_rows INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (query, name, output_format, date)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS high_water_marks (
+                    query TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    output_format TEXT NOT NULL,
+                    newest_id TEXT NOT NULL,
+                    newest_created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (query, name, output_format)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS densities (
+                    query TEXT NOT NULL,
+                    hour INTEGER NOT NULL,
+                    tweets_per_hour REAL NOT NULL,
+                    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (query, hour)
+                )
+            """)
+            # Checkpoint files written before incremental runs and adaptive windows existed miss these columns
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(windows)")}
+            for column in ["newest_id", "since_id", "slices"]:
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE windows ADD COLUMN {column} TEXT")
+            if "base_rows" not in columns:
+                self._conn.execute("ALTER TABLE windows ADD COLUMN base_rows INTEGER NOT NULL DEFAULT 0")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def get(self, query: str, name: str, output_format: str, date: str) -> Optional[WindowState]:
+        """
+        Get the saved progress of a window, None if the window has never been started.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT start_time, end_time, next_token, newest_id, newest_created_at, rows_written, tweets_scanned,
+                    completed, since_id, slices, base_rows
+                FROM windows WHERE query = ? AND name = ? AND output_format = ? AND date = ?
+                """,
+                (query, name, output_format, date)
+            ).fetchone()
+        if row is None:
+            return None
+        return WindowState(*row[:7], completed=bool(row[7]), since_id=row[8], slices=row[9], base_rows=row[10])
+
+    def save(self, query: str, name: str, output_format: str, date: str, state: WindowState):
+        """
+        Save the progress of a window, replacing what was saved before.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO windows (query, name, output_format, date, start_time, end_time, next_token,
+                    newest_id, newest_created_at, rows_written, tweets_scanned, completed, since_id, slices,
+                    base_rows, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """,
+                (query, name, output_format, date, state.start_time, state.end_time, state.next_token,
+                 state.newest_id, state.newest_created_at, state.rows_written, state.tweets_scanned,
+                 int(state.completed), state.since_id, state.slices, state.base_rows)
+            )
+        logger.debug(f"Checkpoint {date} for {query}: {state}")
+
+    def get_windows(self, name: str, output_format: str, date: str) -> Dict[str, WindowState]:
+        """
+        Get the saved progress of the windows of every query writing to an output day, by query.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT query, start_time, end_time, next_token, newest_id, newest_created_at, rows_written,
+                    tweets_scanned, completed, since_id, slices, base_rows
+                FROM windows WHERE name = ? AND output_format = ? AND date = ?
+                """,
+                (name, output_format, date)
+            ).fetchall()
+        return {row[0]: WindowState(*row[1:8], completed=bool(row[8]), since_id=row[9], slices=row[10],
+                                    base_rows=row[11])
+                for row in rows}
+
+    def get_high_water_mark(self, query: str, name: str, output_format: str) -> Optional[HighWaterMark]:
+        """
+        Get the newest tweet ingested for a query, None if the query has never completed a run.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT newest_id, newest_created_at FROM high_water_marks
+                WHERE query = ? AND name = ? AND output_format = ?
+                """,
+                (query, name, output_format)
+            ).fetchone()
+        return HighWaterMark(*row) if row is not None else None
+
+    def save_high_water_mark(self, query: str, name: str, output_format: str, mark: HighWaterMark):
+        """
+        Move the high water mark of a query forward. A mark older than the saved one is ignored.
+        """
+        current = self.get_high_water_mark(query, name, output_format)
+        if current is not None and int(current.newest_id) >= int(mark.newest_id):
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO high_water_marks (query, name, output_format, newest_id, newest_created_at,
+                    updated_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """,
+                (query, name, output_format, mark.newest_id, mark.newest_created_at)
+            )
+        logger.info(f"High water mark for {query}: {mark}")
+
+    def get_densities(self, query: str) -> Dict[int, float]:
+        """
+        Get the tweets with geo data per hour seen for the hours of the day (UTC) by earlier runs of a query.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT hour, tweets_per_hour FROM densities WHERE query = ?",
+                                      (query,)).fetchall()
+        return dict(rows)
+
+    def update_densities(self, query: str, densities: Dict[int, float], weight: float = 0.5):
+        """
+        Blend the tweets per hour seen by a window into the saved ones of a query, the saved ones keep
+        ``1 - weight`` of their value. Hours without a saved value take the new one.
+        """
+        if not densities:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO densities (query, hour, tweets_per_hour, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (query, hour) DO UPDATE SET
+                    tweets_per_hour = tweets_per_hour * (1 - ?) + excluded.tweets_per_hour * ?,
+                    updated_at = CURRENT_TIMESTAMP
+                """,
+                [(query, hour, value, weight, weight) for hour, value in densities.items()]
+            )
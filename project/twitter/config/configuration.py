@@ -1,14 +1,41 @@
 import logging
 import os
-import yaml
+import threading
+from urllib.parse import urlsplit
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "configuration.yaml")
+
+# Environment overrides, read when the configuration is loaded
+CONFIG_FILE_ENV = "TWITTER_CONFIG_FILE"
+# Points the endpoints at another host, e.g. the MockTwitterServer: TWITTER_API_URL=http://127.0.0.1:8000
+API_URL_ENV = "TWITTER_API_URL"
+SEARCH_URL_ENV = "TWITTER_SEARCH_URL"
+USERS_URL_ENV = "TWITTER_USERS_URL"
+
+
+def with_api_url(url: str, api_url: str) -> str:
+    """
+    Replace the scheme and host of an endpoint URL, keeping its path.
+    """
+    return api_url.rstrip("/") + urlsplit(url).path
+
 
 class Configuration:
-    def __init__(self):
-        print(os.getcwd())
-        with open("project/twitter/config/configuration.yaml", "r") as f:
+    """
+    The endpoints and params of the YAML config.
+
+    The file is ``path`` when given, else the ``TWITTER_CONFIG_FILE`` environment variable, else the
+    configuration.yaml next to this module, so it is found from any working directory. ``TWITTER_API_URL`` replaces
+    the host of both endpoints, ``TWITTER_SEARCH_URL`` and ``TWITTER_USERS_URL`` replace a whole endpoint URL.
+    """
+
+    def __init__(self, path: str = None):
+        import yaml
+
+        self.path = path or os.getenv(CONFIG_FILE_ENV) or DEFAULT_CONFIG_FILE
+        with open(self.path, "r") as f:
             conf = yaml.safe_load(f)
 
         self._conf = conf
@@ -24,6 +51,13 @@ class Configuration:
             logger.error("The search url string is missing from the config YAML")
             raise
 
+        api_url = os.getenv(API_URL_ENV)
+        if api_url:
+            self.search_url = with_api_url(self.search_url, api_url)
+            self.users_url = with_api_url(self.users_url, api_url)
+        self.search_url = os.getenv(SEARCH_URL_ENV) or self.search_url
+        self.users_url = os.getenv(USERS_URL_ENV) or self.users_url
+
         self._conf = conf
         try:
             self.search_params = conf["endpoints"]["search"]["params"]
@@ -39,4 +73,38 @@ class Configuration:
             self.users_params = {}
 
 
-config = Configuration()
+_config = None
+_config_lock = threading.Lock()
+
+
+def get_config(path: str = None) -> Configuration:
+    """
+    Get the configuration, loaded on first use and then reused by every caller.
+
+    Parameters
+    ----------
+    path
+        The YAML file to load instead of the default one, only used by the call that loads the configuration.
+    """
+    global _config
+    with _config_lock:
+        if _config is None:
+            _config = Configuration(path)
+            logger.debug(f"Loaded configuration from {_config.path}")
+        return _config
+
+
+def set_config(configuration: Configuration = None):
+    """
+    Replace the configuration returned by get_config(), None to load it again on next use.
+    """
+    global _config
+    with _config_lock:
+        _config = configuration
+
+
+def __getattr__(name: str):
+    # The module level config used to be built on import, it is now loaded the first time it is used
+    if name == "config":
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,95 @@
+import json
+import logging
+from typing import Dict, List, TypedDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+logger = logging.getLogger(__name__)
+
+
+# The fields of a search API page read by parse_responses and the runner. Decoding into these types skips every
+# other field of the tweets and of the includes.users and includes.places expansions.
+class _Coordinates(TypedDict, total=False):
+    coordinates: List[float]
+
+
+class _Geo(TypedDict, total=False):
+    place_id: str
+    coordinates: _Coordinates
+
+
+class _PublicMetrics(TypedDict, total=False):
+    like_count: int
+    quote_count: int
+    reply_count: int
+    retweet_count: int
+
+
+class _Tweet(TypedDict, total=False):
+    id: str
+    author_id: str
+    created_at: str
+    geo: _Geo
+    lang: str
+    public_metrics: _PublicMetrics
+    source: str
+    text: str
+
+
+class _Place(TypedDict, total=False):
+    id: str
+    name: str
+    full_name: str
+    country: str
+    country_code: str
+
+
+class _Includes(TypedDict, total=False):
+    places: List[_Place]
+
+
+class _Meta(TypedDict, total=False):
+    result_count: int
+    newest_id: str
+    oldest_id: str
+    next_token: str
+
+
+class _SearchPage(TypedDict, total=False):
+    data: List[_Tweet]
+    includes: _Includes
+    meta: _Meta
+
+
+_search_page_decoder = msgspec.json.Decoder(_SearchPage) if msgspec is not None else None
+
+
+def decode_json(content: bytes) -> Dict:
+    """
+    Decode a JSON response body, with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def decode_search_page(content: bytes) -> Dict:
+    """
+    Decode a search API response body into the fields the parser reads. With msgspec installed the other fields
+    are skipped while decoding instead of being built into dictionaries, otherwise the whole body is decoded.
+    """
+    if _search_page_decoder is not None:
+        try:
+            return _search_page_decoder.decode(content)
+        except msgspec.ValidationError as e:
+            # A field of an unexpected type, e.g. a null, the whole body is still valid JSON
+            logger.debug(f"Falling back to a full decode of the search page: {e}")
+    return decode_json(content)
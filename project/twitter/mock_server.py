@@ -0,0 +1,331 @@
+"""
+Local stand-in for the Twitter v2 search/recent and users endpoints, to run the pipeline and throughput tests offline.
+
+    python -m project.twitter.mock_server --port 8000 --latency 0.05 --recordings project/data/recordings
+    TWITTER_API_URL=http://127.0.0.1:8000 python -m project.main search --query earthquake --filename quake
+"""
+import argparse
+import datetime
+import json
+import logging
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from project.twitter.recorder import Replayer
+
+logger = logging.getLogger(__name__)
+
+SEARCH_PATH = "/2/tweets/search/recent"
+USERS_PATH = "/2/users"
+
+LANGS = ["en", "es", "fr", "de", "pt", "ja", "und"]
+SOURCES = ["Twitter for iPhone", "Twitter for Android", "Twitter Web App", "Instagram"]
+PLACES = [
+    {"id": "01a9a39529b27f36", "name": "Manhattan", "full_name": "Manhattan, NY", "country": "United States",
+     "country_code": "US"},
+    {"id": "3db7a6e1a5f20f5b", "name": "Camas", "full_name": "Camas, España", "country": "España",
+     "country_code": "ES"},
+    {"id": "0a0de7bd49ef942d", "name": "London", "full_name": "London, England", "country": "United Kingdom",
+     "country_code": "GB"},
+    {"id": "4b24d36a4a0a7b8e", "name": "Lagos", "full_name": "Lagos, Nigeria", "country": "Nigeria",
+     "country_code": "NG"}
+]
+# Tweet ids are snowflakes like the real ones, the milliseconds since this epoch shifted left by 22 bits, so they
+# grow with created_at and since_id selects the newer tweets
+TWITTER_EPOCH_MS = 1288834974657
+SNOWFLAKE_SHIFT = 22
+
+# Profile locations repeat a lot on real data, a few are missing or don't resolve
+LOCATIONS = ["London, England", "USA", "Lagos, Nigeria", "camas, spain", "United states - Meredith",
+             "Nackenheim (Germany)", "Tokyo, Japan", "somewhere over the rainbow", None]
+
+
+class MockTwitterServer:
+    """
+    HTTP server answering the search/recent and users endpoints of the Twitter v2 API from a background thread.
+
+    Requests recorded by a Recorder are answered with the recorded responses when a ``recordings`` directory is
+    given, the others get synthetic payloads: ``pages`` pages of ``max_results`` tweets per search, and a profile
+    location for every user id. Every response waits ``latency`` seconds plus up to ``jitter`` seconds, carries the
+    ``x-rate-limit-*`` headers of a ``rate_limit`` requests per ``rate_window`` seconds limit per endpoint, and
+    fails with a 503 with probability ``error_rate``.
+    """
+
+    def __init__(
+            self,
+            host: str = "127.0.0.1",
+            port: int = 0,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            rate_limit: int = 450,
+            rate_window: float = 900.0,
+            pages: int = 10,
+            geo_ratio: float = 0.5,
+            error_rate: float = 0.0,
+            recordings: str = None,
+            seed: int = 0,
+            clock: Callable[[], float] = time.time
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.pages = pages
+        self.geo_ratio = geo_ratio
+        self.error_rate = error_rate
+        self.replayer = Replayer(recordings) if recordings is not None else None
+        self.requests = 0
+        self._clock = clock
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._windows = {}
+        self._thread = None
+
+        self._httpd = ThreadingHTTPServer((host, port), _handler(self))
+        self._httpd.daemon_threads = True
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def search_url(self) -> str:
+        return self.url + SEARCH_PATH
+
+    @property
+    def users_url(self) -> str:
+        return self.url + USERS_PATH
+
+    def start(self) -> "MockTwitterServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-twitter-server", daemon=True)
+        self._thread.start()
+        logger.info(f"Mock Twitter API listening on {self.url}")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def serve_forever(self):
+        logger.info(f"Mock Twitter API listening on {self.url}")
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+
+    def _rate_limit(self, path: str) -> (bool, Dict):
+        """
+        Take a request from the rate limit window of an endpoint.
+
+        Returns
+        -------
+        Whether the request is allowed, and the rate limit headers of the response.
+        """
+        now = self._clock()
+        with self._lock:
+            self.requests += 1
+            reset_at, remaining = self._windows.get(path, (0.0, 0))
+            if now >= reset_at:
+                reset_at, remaining = now + self.rate_window, self.rate_limit
+            allowed = remaining > 0
+            if allowed:
+                remaining -= 1
+            self._windows[path] = (reset_at, remaining)
+        return allowed, {
+            "x-rate-limit-limit": str(self.rate_limit),
+            "x-rate-limit-remaining": str(remaining),
+            "x-rate-limit-reset": str(int(reset_at))
+        }
+
+    def handle(self, path: str, params: Dict) -> (int, Dict, Dict):
+        """
+        Answer a request.
+
+        Returns
+        -------
+        The status code, the headers and the JSON body of the response.
+        """
+        allowed, headers = self._rate_limit(path)
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            failed = self.error_rate > 0 and self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+
+        if not allowed:
+            return 429, headers, {"title": "Too Many Requests", "status": 429}
+        if failed:
+            return 503, headers, {"title": "Service Unavailable", "status": 503}
+
+        if self.replayer is not None:
+            recorded = self.replayer.get(path, params)
+            if recorded is not None:
+                return 200, headers, recorded
+
+        if path == SEARCH_PATH:
+            return 200, headers, self.search_page(params)
+        elif path == USERS_PATH:
+            return 200, headers, self.users(params)
+        return 404, headers, {"title": "Not Found", "status": 404}
+
+    def search_page(self, params: Dict) -> Dict:
+        """
+        A synthetic search/recent page. Tweets are newest first, their ids are snowflakes of their created_at and
+        with ``since_id`` only the tweets with a larger id are returned, like the search endpoint.
+        """
+        query = params.get("query", "")
+        page = int(params.get("next_token") or 0)
+        page_size = int(params.get("max_results", 10))
+        start, end = _time_range(params)
+        since_id = int(params["since_id"]) if params.get("since_id") else None
+        if since_id is not None:
+            since = snowflake_time(since_id)
+            start = max(start, since) if params.get("start_time") else since
+        if start >= end:
+            return {"meta": {"result_count": 0}}
+
+        window = zlib.crc32(f"{query}|{params.get('start_time')}|{since_id}".encode()) % 10 ** 6
+        query_bits = zlib.crc32(query.encode()) % 4096
+        rnd = random.Random(window * 1000 + page)
+        step = (end - start) / max(self.pages * page_size, 1)
+
+        data = []
+        for i in range(page_size):
+            position = page * page_size + i
+            created_at = (end - step * (position + 1)).replace(microsecond=0)
+            tweet_id = snowflake(created_at, (query_bits << 10) | (1023 - position % 1024))
+            if since_id is not None and tweet_id <= since_id:
+                continue
+            tweet = {
+                "id": str(tweet_id),
+                "author_id": str(rnd.randrange(10 ** 8, 10 ** 8 + 50_000)),
+                "created_at": created_at.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                "lang": rnd.choice(LANGS),
+                "source": rnd.choice(SOURCES),
+                "text": f"Synthetic tweet {position} about {query}",
+                "public_metrics": {
+                    "retweet_count": rnd.randrange(100),
+                    "reply_count": rnd.randrange(100),
+                    "like_count": rnd.randrange(1000),
+                    "quote_count": rnd.randrange(10)
+                }
+            }
+            if rnd.random() < self.geo_ratio:
+                tweet["geo"] = {
+                    "place_id": rnd.choice(PLACES)["id"],
+                    "coordinates": {"type": "Point", "coordinates": [rnd.uniform(-180, 180), rnd.uniform(-90, 90)]}
+                }
+            data.append(tweet)
+
+        meta = {"result_count": len(data)}
+        if data:
+            meta.update(newest_id=data[0]["id"], oldest_id=data[-1]["id"])
+        if page + 1 < self.pages:
+            meta["next_token"] = str(page + 1)
+        return {"data": data, "includes": {"places": PLACES}, "meta": meta}
+
+    @staticmethod
+    def users(params: Dict) -> Dict:
+        """
+        A synthetic users response with a profile location picked from the user id.
+        """
+        data = []
+        for user_id in params.get("ids", "").split(","):
+            if not user_id:
+                continue
+            user = {"id": user_id, "name": f"User {user_id}", "username": f"user{user_id}"}
+            location = LOCATIONS[zlib.crc32(user_id.encode()) % len(LOCATIONS)]
+            if location is not None:
+                user["location"] = location
+            data.append(user)
+        return {"data": data}
+
+
+def snowflake(created_at: datetime.datetime, sequence: int = 0) -> int:
+    """
+    Get the tweet id of a tweet created at a time, ``sequence`` fills the low 22 bits.
+    """
+    return (int(created_at.timestamp() * 1000) - TWITTER_EPOCH_MS) << SNOWFLAKE_SHIFT | sequence
+
+
+def snowflake_time(tweet_id: int) -> datetime.datetime:
+    """
+    Get the time a tweet id was created at.
+    """
+    milliseconds = (tweet_id >> SNOWFLAKE_SHIFT) + TWITTER_EPOCH_MS
+    return datetime.datetime.fromtimestamp(milliseconds / 1000, datetime.timezone.utc)
+
+
+def _time_range(params: Dict) -> Tuple[datetime.datetime, datetime.datetime]:
+    def parse(value: Optional[str]) -> Optional[datetime.datetime]:
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")) if value else None
+
+    end = parse(params.get("end_time")) or datetime.datetime.now(datetime.timezone.utc)
+    start = parse(params.get("start_time")) or end - datetime.timedelta(days=1)
+    return start, end
+
+
+def _handler(server: MockTwitterServer) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            status, headers, body = server.handle(url.path, dict(parse_qsl(url.query)))
+            content = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return Handler
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Local stand-in for the Twitter v2 API")
+    parser.add_argument('--host', type=str, default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds every response is delayed by")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Maximum random seconds added to the latency")
+    parser.add_argument('--rate-limit', type=int, default=450, help="Requests per window per endpoint")
+    parser.add_argument('--rate-window', type=float, default=900.0, help="Seconds in a rate limit window")
+    parser.add_argument('--pages', type=int, default=10, help="Pages returned per search")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests failing with a 503")
+    parser.add_argument('--recordings', type=str, help="Directory of the responses saved with TWITTER_RECORD_DIR")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    args = parse_args()
+    MockTwitterServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit=args.rate_limit,
+        rate_window=args.rate_window,
+        pages=args.pages,
+        error_rate=args.error_rate,
+        recordings=args.recordings
+    ).serve_forever()
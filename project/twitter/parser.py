@@ -0,0 +1,86 @@
+import logging
+from typing import Dict, Iterable, List
+
+import pandas as pd
+
+from project.twitter.schema import TWEET_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+DF_HEADERS = TWEET_COLUMNS
+
+
+def _places_lookup(json_response: Dict) -> Dict:
+    """
+    Build a place_id -> place dictionary from the includes of a search API response.
+    """
+    includes = json_response.get("includes") or {}
+    return {place["id"]: place for place in includes.get("places", [])}
+
+
+def parse_responses(df_headers: List, json_responses: Iterable[Dict]) -> (int, pd.DataFrame):
+    """
+    Parses one or many JSON search API responses in a single pass into columns, keeping only the tweets that
+    have geo coordinates, and builds a DataFrame directly from those columns.
+
+    Place ids are resolved with a dictionary built once per response and ``created_at`` is converted in a single
+    vectorized ISO-8601 conversion. The string columns are left as objects, converting every page to the schema
+    dtypes costs more than parsing it, the sinks convert the pages they buffer in one go.
+
+    Parameters
+    ----------
+    df_headers
+        The headers to use for the DataFrame, in the order of DF_HEADERS.
+    json_responses
+        The JSON responses from the Twitter v2 API.
+
+    Returns
+    -------
+    The number of tweets parsed and the DataFrame with the tweets.
+    """
+    columns = [[] for _ in DF_HEADERS]
+    (author_id, created_at, geo, lat, long, place_name, place_full_name, place_country, place_country_code,
+     tweet_id, lang, like_count, quote_count, reply_count, retweet_count, source, text) = columns
+
+    for json_response in json_responses:
+        places = None
+
+        for tweet in json_response.get("data") or []:
+            tweet_geo = tweet.get("geo")
+            if tweet_geo is None:
+                continue
+            coordinates = (tweet_geo.get("coordinates") or {}).get("coordinates")
+            if not coordinates:
+                continue
+
+            if places is None:
+                places = _places_lookup(json_response)
+            place_id = tweet_geo.get("place_id")
+            place = places.get(place_id, {})
+            metrics = tweet.get("public_metrics") or {}
+
+            author_id.append(tweet.get("author_id"))
+            created_at.append(tweet.get("created_at"))
+            geo.append(place_id)
+            lat.append(coordinates[0])
+            long.append(coordinates[1])
+            place_name.append(place.get("name"))
+            place_full_name.append(place.get("full_name"))
+            place_country.append(place.get("country"))
+            place_country_code.append(place.get("country_code"))
+            tweet_id.append(tweet.get("id"))
+            lang.append(tweet.get("lang"))
+            like_count.append(metrics.get("like_count"))
+            quote_count.append(metrics.get("quote_count"))
+            reply_count.append(metrics.get("reply_count"))
+            retweet_count.append(metrics.get("retweet_count"))
+            source.append(tweet.get("source"))
+            text.append(tweet.get("text"))
+
+    counter = len(author_id)
+    if counter == 0:
+        return 0, pd.DataFrame(columns=df_headers)
+
+    columns[1] = pd.to_datetime(pd.Series(created_at), utc=True, format="ISO8601")
+    df_tweets = pd.DataFrame(dict(zip(df_headers, columns)), columns=df_headers)
+    return counter, df_tweets
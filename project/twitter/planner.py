@@ -0,0 +1,280 @@
+import datetime
+import json
+import logging
+import math
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.000Z"
+HOUR = datetime.timedelta(hours=1)
+# A dense hour is split into slices of at least this length
+MIN_SLICE = datetime.timedelta(minutes=15)
+# An hour is only estimated once this many seconds of it have been searched
+MIN_COVERAGE_SECONDS = 300
+
+
+@dataclass
+class Slice:
+    """
+    A part of a search window, requested on its own with its share of the max_count of the window.
+    """
+    start: datetime.datetime
+    end: datetime.datetime
+    max_count: int
+
+
+def encode_slices(slices: List[Slice]) -> str:
+    """
+    Encode slices to the JSON saved with the progress of a window.
+    """
+    return json.dumps([[s.start.strftime(TIME_FORMAT), s.end.strftime(TIME_FORMAT), s.max_count] for s in slices])
+
+
+def decode_slices(value: str) -> List[Slice]:
+    """
+    Decode slices saved with encode_slices.
+    """
+    return [Slice(parse_time(start), parse_time(end), max_count) for start, end, max_count in json.loads(value)]
+
+
+def parse_time(value: str) -> datetime.datetime:
+    """
+    Parse a search API time, e.g. the created_at of a tweet or the start_time of a window.
+    """
+    return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z")
+
+
+def _hour_segments(
+        start: datetime.datetime,
+        end: datetime.datetime
+) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+    """
+    Cut a time range at the hour boundaries.
+    """
+    segments = []
+    while start < end:
+        hour_end = min(start.replace(minute=0, second=0, microsecond=0) + HOUR, end)
+        segments.append((start, hour_end))
+        start = hour_end
+    return segments
+
+
+def _water_fill(expected: List[float], hours: List[float], total: float) -> float:
+    """
+    Get the rows per hour every segment is capped at so the capped expected rows of the segments add up to total.
+    """
+    order = sorted(range(len(expected)), key=lambda i: expected[i] / hours[i])
+    remaining, remaining_hours = total, sum(hours)
+    for i in order:
+        level = remaining / remaining_hours
+        if expected[i] / hours[i] > level:
+            return level
+        remaining -= expected[i]
+        remaining_hours -= hours[i]
+    return math.inf
+
+
+def plan_slices(
+        start: datetime.datetime,
+        end: datetime.datetime,
+        max_count: int,
+        max_results: int,
+        densities: Dict[int, float] = None
+) -> List[Slice]:
+    """
+    Split a search window into slices from the number of tweets with geo data per hour of the day seen by earlier
+    runs of the query, newest first like the search API pages.
+
+    A window expected to hold fewer than max_count tweets stays 1 slice. Otherwise max_count is shared over the
+    hours so every hour gets the same number of tweets, or all of its tweets when it has fewer, instead of the
+    newest hours getting them all. A dense hour with more than a page of tweets for its share is split further,
+    down to MIN_SLICE, so its tweets are spread over the hour too, and the adjacent hours that get all of their
+    tweets are merged into 1 slice to save calls. The slices don't depend on each other.
+
+    Parameters
+    ----------
+    start
+        The start of the window.
+    end
+        The end of the window.
+    max_count
+        The max tweets with geo data for the window.
+    max_results
+        The max results per page of the search API.
+    densities
+        The tweets with geo data per hour for the hours of the day (UTC) seen before. The hours not seen get the
+        average of the others. None or empty to keep the window whole.
+
+    Returns
+    -------
+    The slices of the window, newest first.
+    """
+    if not densities:
+        return [Slice(start, end, max_count)]
+    average = sum(densities.values()) / len(densities)
+
+    segments = _hour_segments(start, end)
+    hours = [(segment_end - segment_start) / HOUR for segment_start, segment_end in segments]
+    expected = [densities.get(segment_start.hour, average) * hour for (segment_start, _), hour in zip(segments, hours)]
+    if sum(expected) <= max_count:
+        return [Slice(start, end, max_count)]
+
+    level = _water_fill(expected, hours, max_count)
+    if level == math.inf:
+        return [Slice(start, end, max_count)]
+    # The start, end and share of max_count of every slice, newest first
+    parts = []
+    merge = False
+    for (segment_start, segment_end), hour, rows in reversed(list(zip(segments, hours, expected))):
+        share = level * hour
+        if rows <= share:
+            # A sparse segment needs less than its share to get all of its tweets
+            if merge:
+                parts[-1] = (segment_start, parts[-1][1], parts[-1][2] + rows)
+            else:
+                parts.append((segment_start, segment_end, rows))
+            merge = True
+            continue
+
+        merge = False
+        count = max(1, min(int(share // max_results), int((segment_end - segment_start) / MIN_SLICE)))
+        step = (segment_end - segment_start) / count
+        for part in reversed(range(count)):
+            part_end = segment_end if part == count - 1 else segment_start + step * (part + 1)
+            parts.append((segment_start + step * part, part_end, share / count))
+
+    return [Slice(part_start, part_end, part_count)
+            for (part_start, part_end, _), part_count in zip(parts, _round_shares([p[2] for p in parts], max_count))]
+
+
+def _round_shares(shares: List[float], total: int) -> List[int]:
+    """
+    Round shares down and give what is left of total to the largest remainders, so they add up to total.
+    """
+    counts = [int(share) for share in shares]
+    by_remainder = sorted(range(len(shares)), key=lambda i: counts[i] - shares[i])
+    for i in by_remainder[:max(total - sum(counts), 0)]:
+        counts[i] += 1
+    return counts
+
+
+class WindowPlan:
+    """
+    The slices of a window being fetched.
+
+    The fetch stage requests the slices in order and adds every page to its slice with add_page, which closes the
+    slice once it has no more pages or has fetched its share of max_count in tweets with geo data, so no page past
+    the share is requested. The time spans the pages cover give the tweets with geo data per hour of the day.
+
+    With ``probe`` set a window of 1 slice is split from its first pages when they show it holds more tweets than
+    max_count, so a query without earlier runs is spread over the window too.
+    """
+
+    def __init__(self, slices: List[Slice], max_results: int, probe: bool = False):
+        self.max_results = max_results
+        self.probe = probe and len(slices) == 1
+        self._slices = list(slices)
+        self._geo = [0] * len(self._slices)
+        # The oldest time searched by every slice so far, the pages of a slice are newest first
+        self._cursor = [window_slice.end for window_slice in self._slices]
+        self._hour_geo = [0] * 24
+        self._hour_seconds = [0.0] * 24
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._slices)
+
+    def get(self, index: int) -> Optional[Slice]:
+        """
+        Get a slice, None past the last one.
+        """
+        with self._lock:
+            return self._slices[index] if index < len(self._slices) else None
+
+    def add_page(self, index: int, json_response: Dict, next_token: Optional[str]) -> bool:
+        """
+        Add a fetched page to its slice.
+
+        Parameters
+        ----------
+        index
+            The index of the slice of the page.
+        json_response
+            The search API response.
+        next_token
+            The token of the next page of the slice, None on its last page.
+
+        Returns
+        -------
+        Whether the slice is closed after the page, the fetch moves on to the next slice.
+        """
+        with self._lock:
+            window_slice = self._slices[index]
+            tweets = json_response.get("data") or []
+            created_at = [tweet["created_at"] for tweet in tweets if "created_at" in tweet]
+            if next_token is None:
+                oldest = window_slice.start
+            elif created_at:
+                oldest = min(max(parse_time(min(created_at)), window_slice.start), self._cursor[index])
+            else:
+                oldest = self._cursor[index]
+            self._cover(oldest, self._cursor[index])
+            self._cursor[index] = oldest
+            for tweet in tweets:
+                if "created_at" in tweet and ((tweet.get("geo") or {}).get("coordinates") or {}).get("coordinates"):
+                    self._hour_geo[int(tweet["created_at"][11:13])] += 1
+                    self._geo[index] += 1
+
+            if next_token is None or self._geo[index] >= window_slice.max_count:
+                return True
+            if self.probe and index == 0:
+                return self._split_rest(index)
+            return False
+
+    def _split_rest(self, index: int) -> bool:
+        """
+        Replace the rest of a slice with slices planned from the density of its pages so far, when more tweets
+        than its max_count are expected in it.
+        """
+        window_slice, cursor = self._slices[index], self._cursor[index]
+        searched = (window_slice.end - cursor) / HOUR
+        if searched <= 0 or self._geo[index] == 0:
+            return False
+        density = self._geo[index] / searched
+        remaining = window_slice.max_count - self._geo[index]
+        if density * (cursor - window_slice.start) / HOUR <= remaining:
+            return False
+
+        slices = plan_slices(window_slice.start, cursor, remaining, self.max_results,
+                             {hour: density for hour in range(24)})
+        logger.info(f"Splitting the rest of {window_slice.start:%Y-%m-%d %H:%M} - {cursor:%H:%M} into "
+                    f"{len(slices)} slices from {density:.0f} tweets per hour")
+        self.probe = False
+        self._slices[index + 1:index + 1] = slices
+        self._geo[index + 1:index + 1] = [0] * len(slices)
+        self._cursor[index + 1:index + 1] = [s.end for s in slices]
+        return True
+
+    def _cover(self, start: datetime.datetime, end: datetime.datetime):
+        for segment_start, segment_end in _hour_segments(start, end):
+            self._hour_seconds[segment_start.hour] += (segment_end - segment_start).total_seconds()
+
+    def remaining(self, index: int) -> List[Slice]:
+        """
+        Get the slices left to fetch from a slice on, the slice with what is left of its max_count.
+        """
+        with self._lock:
+            return [Slice(s.start, s.end, s.max_count - geo)
+                    for s, geo in zip(self._slices[index:], self._geo[index:])]
+
+    def densities(self) -> Dict[int, float]:
+        """
+        Get the tweets with geo data per hour seen for the hours of the day searched long enough to estimate them.
+        """
+        with self._lock:
+            return {hour: self._hour_geo[hour] * 3600 / seconds for hour, seconds in enumerate(self._hour_seconds)
+                    if seconds >= MIN_COVERAGE_SECONDS}
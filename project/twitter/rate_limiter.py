@@ -0,0 +1,80 @@
+import logging
+import threading
+import time
+from typing import Callable, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every worker calling the same Twitter v2 endpoint.
+
+    The bucket is refilled from the ``x-rate-limit-remaining`` and ``x-rate-limit-reset`` response headers rather
+    than from a fixed refill rate, so the budget always reflects what the API reports. Until the first response
+    has been seen the budget is unknown and requests are let through.
+    """
+
+    REMAINING_HEADER = "x-rate-limit-remaining"
+    RESET_HEADER = "x-rate-limit-reset"
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._remaining = None
+        self._reset_at = 0.0
+        self._in_flight = 0
+
+    @property
+    def remaining(self) -> Optional[int]:
+        return self._remaining
+
+    @property
+    def reset_at(self) -> float:
+        return self._reset_at
+
+    def acquire(self):
+        """
+        Take a token from the bucket, blocking until the rate limit window resets if the budget is spent.
+        """
+        with self._cond:
+            while True:
+                if self._remaining is None or self._remaining > 0:
+                    if self._remaining is not None:
+                        self._remaining -= 1
+                    self._in_flight += 1
+                    return
+
+                wait = self._reset_at - self._clock()
+                if wait <= 0:
+                    # The window has reset, the budget is unknown until the next response comes back
+                    self._remaining = None
+                    continue
+                logger.info(f"Rate limit budget spent, waiting {wait:.1f}s for reset")
+                self._cond.wait(timeout=wait)
+
+    def release(self, headers: Mapping = None):
+        """
+        Return the in-flight slot taken by acquire() and refill the bucket from the response headers.
+
+        Parameters
+        ----------
+        headers
+            The HTTP response headers, None when the request failed before a response was received.
+        """
+        with self._cond:
+            self._in_flight = max(self._in_flight - 1, 0)
+            if headers is not None:
+                self._update(headers)
+            self._cond.notify_all()
+
+    def _update(self, headers: Mapping):
+        try:
+            remaining = int(headers[self.REMAINING_HEADER])
+            reset_at = float(headers[self.RESET_HEADER])
+        except (KeyError, TypeError, ValueError):
+            return
+
+        # Requests still in flight were sent before this count was taken, so they are not included in it yet
+        self._remaining = max(remaining - self._in_flight, 0)
+        self._reset_at = reset_at
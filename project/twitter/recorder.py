@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+from urllib.parse import urlencode, urlsplit
+
+logger = logging.getLogger(__name__)
+
+RECORD_DIR_ENV = "TWITTER_RECORD_DIR"
+RECORDINGS_FILE = "recordings.ndjson"
+
+# The time range of a search changes with the day it runs, so it isn't part of the key a recording is replayed by
+TIME_PARAMS = {"start_time", "end_time", "since_id"}
+
+
+def request_key(url: str, params: Dict) -> str:
+    """
+    The key a response is recorded and replayed by: the endpoint path and the params, without the time range.
+
+    Parameters
+    ----------
+    url
+        The endpoint URL or path.
+    params
+        The request params, params set to None aren't sent so they're left out.
+    """
+    items = sorted((key, str(value)) for key, value in params.items() if value is not None and key not in TIME_PARAMS)
+    return f"{urlsplit(url).path}?{urlencode(items)}"
+
+
+class Recorder:
+    """
+    Appends the JSON responses of the Twitter v2 API to ``recordings.ndjson`` in a directory, one line per response,
+    so a run can be replayed offline by the MockTwitterServer.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, RECORDINGS_FILE)
+        self.recorded = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional["Recorder"]:
+        """
+        The Recorder of the directory in the ``TWITTER_RECORD_DIR`` environment variable, None when it isn't set.
+        """
+        directory = os.getenv(RECORD_DIR_ENV)
+        return cls(directory) if directory else None
+
+    def record(self, url: str, params: Dict, json_response: Dict):
+        line = json.dumps({
+            "key": request_key(url, params),
+            "url": url,
+            "params": {key: value for key, value in params.items() if value is not None},
+            "response": json_response
+        })
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+            self.recorded += 1
+
+
+class Replayer:
+    """
+    Serves the responses saved by a Recorder. Requests are matched by request_key(), and when the same key was
+    recorded more than once, e.g. the first page of every day of a search, the responses are served in the order
+    they were recorded, starting over once they are used up.
+    """
+
+    def __init__(self, directory: str):
+        self._responses = defaultdict(list)
+        self._positions = defaultdict(int)
+        self._lock = threading.Lock()
+
+        path = os.path.join(directory, RECORDINGS_FILE)
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    recording = json.loads(line)
+                    self._responses[recording["key"]].append(recording["response"])
+        logger.info(f"Loaded {len(self)} recorded responses from {path}")
+
+    def __len__(self) -> int:
+        return sum(len(responses) for responses in self._responses.values())
+
+    def get(self, url: str, params: Dict) -> Optional[Dict]:
+        """
+        Get the next recorded response of a request, None if it was never recorded.
+        """
+        key = request_key(url, params)
+        with self._lock:
+            responses = self._responses.get(key)
+            if not responses:
+                return None
+            position = self._positions[key]
+            self._positions[key] = (position + 1) % len(responses)
+            return responses[position]
@@ -1,19 +1,39 @@
+import datetime
 import logging
-import re
-from typing import Dict, List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
 
-import dateutil.parser
 import pandas as pd
-import time
 
-from project.twitter.api_handler import append_config_params, connect_to_endpoint, create_headers
-from twitter.config.configuration import config
+from project.twitter.api_handler import TwitterClient, append_config_params
+from project.twitter.archive import RawArchive, archive_path
+from project.twitter.author_cache import DEFAULT_AUTHOR_CACHE_DB, DEFAULT_TTL_DAYS, AuthorLocationCache
+from project.twitter.config.configuration import get_config
+from project.twitter.checkpoint import DEFAULT_CHECKPOINT_DB, CheckpointStore, HighWaterMark, WindowState
+from project.twitter.decoding import decode_search_page
 from project.twitter.endpoint_type import EndpointType
+from project.twitter.output_format import OutputFormat
+from project.twitter.parser import DF_HEADERS, parse_responses
+from project.twitter.planner import TIME_FORMAT, WindowPlan, decode_slices, encode_slices, parse_time, plan_slices
+from project.twitter.seen_ids import DEFAULT_SEEN_IDS_DIR, SeenIdIndex, drop_seen, tweet_ids
+from project.twitter.sinks import PARTITION_COLUMN, make_sink
+from project.twitter.storage import read_tweets, write_tweets
 from project.utilities import dates
-from project.utilities.transformers import clean_locations
+from project.utilities.metrics import metrics
+from project.utilities.pipeline import DEFAULT_QUEUE_SIZE, report_utilization, run_pipeline
+from project.utilities.transformers import (DEFAULT_LOCATION_CACHE_SIZE, DEFAULT_PLACE_MAX_KM, add_author_locations,
+                                             add_places, clean_locations, clean_locations_chunk, create_cleaner_pool,
+                                             get_location_cache, set_location_cache_size)
 
 logger = logging.getLogger(__name__)
 
+WORLD_CITIES_FILE = "project/utilities/reference/world_cities.csv"
+# Pages written between two checkpoints of a window, the rows buffered by then are flushed first
+DEFAULT_CHECKPOINT_PAGES = 5
+
 
 def append_to_csv(df_headers: List, json_response: any) -> (int, pd.DataFrame):
     """
@@ -27,90 +47,414 @@ def append_to_csv(df_headers: List, json_response: any) -> (int, pd.DataFrame):
     json_response
         The JSON response from the Twitter v2 API.
     """
-    # A counter variable
-    counter = 0
+    counter, df_tweets = parse_responses(df_headers, [json_response])
+    logger.info(f"{counter} Tweets added from this response")
+    return counter, df_tweets
 
-    tweets = []
-    # Loop through each tweet
-    for tweet in json_response.get("data"):
 
-        # 1. Author ID
-        author_id = tweet.get("author_id")
+def _update_newest(state: WindowState, json_response: Dict):
+    """
+    Move the newest tweet id and created_at of the window state forward with a search API response.
+    """
+    newest_id = json_response["meta"].get("newest_id")
+    if newest_id is not None and (state.newest_id is None or int(newest_id) > int(state.newest_id)):
+        state.newest_id = newest_id
 
-        # 2. Time created
-        created_at = dateutil.parser.parse(tweet.get("created_at"))
+    created_at = [tweet["created_at"] for tweet in json_response.get("data") or [] if "created_at" in tweet]
+    if created_at:
+        newest_created_at = max(created_at)
+        if state.newest_created_at is None or newest_created_at > state.newest_created_at:
+            state.newest_created_at = newest_created_at
 
-        # 3. Geolocation
-        if "geo" in tweet.keys():
-            geo = tweet.get("geo").get("place_id")
-            try:
-                lat = tweet.get("geo").get("coordinates").get("coordinates")[0]
-                long = tweet.get("geo").get("coordinates").get("coordinates")[1]
-            except AttributeError:
-                continue
-
-            place_name = None
-            place_full_name = None
-            place_country = None
-            place_country_code = None
-
-            includes = json_response.get("includes")
-            if "places" in includes.keys():
-                for place in includes.get("places"):
-                    if place["id"] == geo:
-                        place_name = place.get("name")
-                        place_full_name = place.get("full_name")
-                        place_country = place.get("country")
-                        place_country_code = place.get("country_code")
-        else:
-            continue
 
-        # 4. Tweet ID
-        tweet_id = tweet.get("id")
+@dataclass
+class WindowOptions:
+    """
+    The options a day window of a search is fetched with, the same for every window of a query.
 
-        # 5. Language
-        lang = tweet.get("lang")
+    Attributes
+    ----------
+    max_results
+        Set max results per page for the API response.
+    max_count
+        Max tweets for the time window.
+    flush_rows
+        The number of parsed rows to buffer before writing them.
+    output_format
+        The file format to write.
+    resume
+        Continue from the saved progress of the window instead of starting it again.
+    queue_size
+        The number of pages that can wait between the fetch, parse and write stages.
+    checkpoint_pages
+        The number of pages written between two checkpoints. The rows buffered by then are flushed before the
+        checkpoint is saved, so a killed run requests at most this many pages again on resume.
+    archive
+        Also append the raw response bodies to the compressed NDJSON archive of the day, to parse them again later
+        with reparse_archive.
+    adaptive
+        Spread max_count over the window with slices planned from the tweets per hour seen by earlier runs of the
+        query, or from the first pages of the window when there are none, and save what this window sees for the
+        next runs. Incremental windows are never split.
+    """
+    max_results: int = 100
+    max_count: int = 1000
+    flush_rows: int = 10_000
+    output_format: OutputFormat = OutputFormat.CSV
+    resume: bool = False
+    queue_size: int = DEFAULT_QUEUE_SIZE
+    checkpoint_pages: int = DEFAULT_CHECKPOINT_PAGES
+    archive: bool = False
+    adaptive: bool = False
+
+
+def search_window(
+        keyword: str,
+        csv_filename: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        client: TwitterClient,
+        checkpoints: CheckpointStore,
+        options: WindowOptions,
+        since_id: str = None,
+        seen_ids: SeenIdIndex = None,
+        df_headers: List = DF_HEADERS
+) -> int:
+    """
+    Pages through the search API for a single time window and streams the tweets with geo data to 1 CSV file or
+    Parquet partition. Progress is saved to the checkpoint store every time rows are written.
+
+    Fetching, parsing and writing run as a pipeline, so the next page is requested while the last one is parsed and
+    the one before it is written. An adaptive window is split into slices with planner.plan_slices, which are
+    fetched one after the other.
+
+    Parameters
+    ----------
+    keyword
+        The search query for the Twitter v2 API.
+    csv_filename
+        The name of the file to write results to.
+    start
+        The start of the time window.
+    end
+        The end of the time window.
+    client
+        The client shared by every window being fetched.
+    checkpoints
+        The store the window progress is saved to.
+    options
+        The options of the window.
+    since_id
+        Only request tweets newer than this tweet id, in place of the start of the window, and add them to the
+        existing output of the window.
+    seen_ids
+        The ids of the tweets already written for the query, the tweets in it are dropped. None to keep them all.
+    df_headers
+        The headers to use for the DataFrame.
 
-        # 6. Tweet metrics
-        retweet_count = tweet.get("public_metrics").get("retweet_count")
-        reply_count = tweet.get("public_metrics").get("reply_count")
-        like_count = tweet.get("public_metrics").get("like_count")
-        quote_count = tweet.get("public_metrics").get("quote_count")
+    Returns
+    -------
+    The number of tweets scanned for the time window.
+    """
+    max_results, max_count, output_format = options.max_results, options.max_count, options.output_format
+    resume, adaptive = options.resume, options.adaptive
+    date_format = end.strftime("%Y%m%d")
+    with metrics.labels(window=date_format), metrics.timer("window"):
+        checkpoint_key = (keyword, csv_filename, output_format.value, date_format)
+
+        previous = checkpoints.get(*checkpoint_key)
+        if resume and previous is not None and not previous.completed:
+            logger.info(f"Resuming {date_format} from token {previous.next_token} with {previous.rows_written} rows")
+            state = previous
+            append = True
+        elif resume and previous is not None and since_id is None and previous.end_time >= end.strftime(TIME_FORMAT):
+            logger.info(f"Skipping {date_format}, already completed")
+            return 0
+        elif resume and previous is not None and since_id is None:
+            # The window has grown since it was completed, e.g. today's window, only the time after it is added
+            logger.info(f"Extending {date_format} from {previous.end_time} with {previous.rows_written} rows")
+            state = WindowState(
+                start_time=previous.end_time,
+                end_time=end.strftime(TIME_FORMAT),
+                newest_id=previous.newest_id,
+                newest_created_at=previous.newest_created_at,
+                rows_written=previous.rows_written,
+                tweets_scanned=previous.tweets_scanned,
+                base_rows=previous.rows_written
+            )
+            append = True
+        else:
+            state = WindowState(
+                start_time=start.strftime(TIME_FORMAT),
+                end_time=end.strftime(TIME_FORMAT),
+                since_id=since_id
+            )
+            # An incremental window adds the tweets newer than since_id to what earlier runs wrote for the day
+            append = since_id is not None and previous is not None
+            if append:
+                # The new tweets get their own max_count, the rows of the earlier runs don't count against it
+                state.rows_written = state.base_rows = previous.rows_written
+                logger.info(f"Adding tweets newer than {since_id} to {date_format}")
+            elif seen_ids is not None:
+                # The output of the day is overwritten, and the ids written to it with it
+                seen_ids.reset(date_format)
+
+        # The window times of a resumed window are kept since the next_token belongs to them
+        start_date = state.start_time
+        end_date = state.end_time
+        adaptive = adaptive and state.since_id is None
+        if state.slices is not None:
+            slices = decode_slices(state.slices)
+            densities = None
+        else:
+            densities = checkpoints.get_densities(keyword) if adaptive and state.next_token is None else None
+            slices = plan_slices(parse_time(start_date), parse_time(end_date),
+                                 max_count - (state.rows_written - state.base_rows), max_results, densities)
+            if len(slices) > 1:
+                logger.info(f"Planned {len(slices)} slices for {date_format}")
+        plan = WindowPlan(slices, max_results, probe=adaptive and not densities)
+        scanned = 0
+        # Counting tweets with geo data for the time window, on top of the rows it appends to
+        count = state.rows_written - state.base_rows
+        # Set once max_count is reached, the pages fetched ahead of it are dropped. The slices of an adaptive window
+        # hold the shares of max_count instead, so the last slices aren't cut by the pages the first ones went over
+        max_count_reached = threading.Event()
+        if count >= max_count and not adaptive:
+            max_count_reached.set()
+        # A capped window only fetches ahead while the pages in flight can't reach max_count, so no page is
+        # requested, archived and then dropped. The parse stage counts the pages it is done with
+        progress = threading.Condition()
+        in_flight = 0
+        stopped = threading.Event()
+
+        sink = make_sink(output_format, csv_filename, date_format, df_headers, options.flush_rows, append,
+                         state.rows_written)
+        logger.info(f"Writing to {sink.filename}")
+        raw_archive = RawArchive(archive_path(csv_filename, date_format), append) if options.archive else None
+
+        def fetch() -> Iterator[Tuple[Dict, Optional[str], Optional[str]]]:
+            nonlocal in_flight
+            config = get_config()
+            index, next_token = 0, state.next_token
+            while not max_count_reached.is_set():
+                if not adaptive:
+                    with progress:
+                        progress.wait_for(lambda: stopped.is_set() or max_count_reached.is_set()
+                                          or count + in_flight * max_results < max_count)
+                    if stopped.is_set() or max_count_reached.is_set():
+                        return
+                window_slice = plan.get(index)
+                if window_slice is None:
+                    return
+
+                logger.info(f"Token: {next_token}")
+                search_params = {
+                    "query": keyword,
+                    "start_time": window_slice.start.strftime(TIME_FORMAT),
+                    "end_time": window_slice.end.strftime(TIME_FORMAT),
+                    "max_results": max_results
+                }
+                if state.since_id is not None:
+                    del search_params["start_time"]
+                    search_params["since_id"] = state.since_id
+
+                params = append_config_params(search_params, EndpointType.SEARCH, config)
+                json_response = client.get(config.search_url, params, next_token, decode=decode_search_page,
+                                           archive=raw_archive)
+                # Save the token to use for next call, there is none on the final page of the time period
+                next_token = json_response["meta"].get("next_token")
+                logger.info(f"Next Token: {next_token}")
+                if plan.add_page(index, json_response, next_token) if adaptive else next_token is None:
+                    # The slice has no more pages or has its share of max_count
+                    index, next_token = index + 1, None
+                # What is left to fetch after this page, saved once the page is written
+                remaining = encode_slices(plan.remaining(index)) if adaptive else None
+                with progress:
+                    in_flight += 1
+                yield json_response, next_token, remaining
+
+        def parse(page: Tuple[Dict, Optional[str], Optional[str]]) -> Optional[Tuple]:
+            nonlocal in_flight
+            try:
+                return parse_page(page)
+            finally:
+                with progress:
+                    in_flight -= 1
+                    progress.notify_all()
+
+        def parse_page(page: Tuple[Dict, Optional[str], Optional[str]]) -> Optional[Tuple]:
+            nonlocal count
+            json_response, next_token, remaining = page
+            if max_count_reached.is_set():
+                return None
+            result_count = json_response["meta"]["result_count"]
+            tweets_added, tweets_extracted, page_ids = 0, None, None
+            if result_count is not None and result_count > 0:
+                parsed_response = json_response
+                if seen_ids is not None:
+                    # The ids are saved by the write stage once the page is on disk
+                    parsed_response = drop_seen(json_response, seen_ids, date_format, hold=True)
+                    page_ids = tweet_ids(parsed_response)
+                with metrics.timer("parse"):
+                    tweets_added, tweets_extracted = append_to_csv(df_headers, parsed_response)
+                count += tweets_added
+                if count >= max_count and not adaptive:
+                    max_count_reached.set()
+            return json_response, next_token, result_count, tweets_added, tweets_extracted, page_ids, remaining
+
+        pages_since_checkpoint = 0
+        # The ids of the pages written since the last flush, saved with the checkpoint once they are on disk
+        unflushed_ids = []
+
+        def save_checkpoint():
+            nonlocal pages_since_checkpoint
+            pages_since_checkpoint = 0
+            state.rows_written = sink.rows_written
+            checkpoints.save(*checkpoint_key, state)
+            if seen_ids is not None:
+                for ids in unflushed_ids:
+                    seen_ids.commit(date_format, ids)
+                unflushed_ids.clear()
+                seen_ids.save(date_format)
+
+        def write(parsed: Tuple):
+            nonlocal scanned, pages_since_checkpoint
+            json_response, next_token, result_count, tweets_added, tweets_extracted, page_ids, remaining = parsed
+            _update_newest(state, json_response)
+            if page_ids is not None:
+                unflushed_ids.append(page_ids)
+            if result_count is not None and result_count > 0:
+                logger.info(f"Start Date: {start_date}")
+                logger.info(f"End Date: {end_date}")
+                metrics.inc("tweets_scanned", result_count)
+                metrics.inc("tweets_parsed", tweets_added)
+                sink.write(tweets_extracted)
+                scanned += result_count
+                logger.info(f"# of Tweets scanned for {end_date}: {scanned}")
+                written = sink.rows_written + sink.buffered_rows
+                logger.info(f"# of Tweets with Geo data parsed for {end_date}: {written}")
+
+            state.next_token = next_token
+            state.slices = remaining
+            state.tweets_scanned += result_count or 0
+            pages_since_checkpoint += 1
+            if pages_since_checkpoint >= options.checkpoint_pages:
+                sink.flush()
+            if sink.buffered_rows == 0:
+                # Every page up to this one is on disk
+                save_checkpoint()
+
+        started = time.perf_counter()
+        try:
+            with sink:
+                # The next page is fetched while the last one is parsed and the one before it is written
+                stats = run_pipeline(("fetch", fetch()), [("parse", parse), ("write", write)], options.queue_size)
+                state.completed = True
+            report_utilization(stats, time.perf_counter() - started)
+        finally:
+            with progress:
+                stopped.set()
+                progress.notify_all()
+            # Closing the sink has flushed the buffered pages, including when the window failed part way. When that
+            # flush failed too the last checkpoint is kept, it only covers the rows on disk
+            if sink.buffered_rows == 0:
+                save_checkpoint()
+            if seen_ids is not None:
+                seen_ids.release(date_format)
+            if raw_archive is not None:
+                raw_archive.close()
+            if adaptive:
+                checkpoints.update_densities(keyword, plan.densities())
+        return scanned
+
+
+def plan_windows(
+        keyword: str,
+        csv_filename: str,
+        days: int,
+        output_format: OutputFormat,
+        checkpoints: CheckpointStore,
+        incremental: bool = False
+) -> (List[datetime.datetime], List[datetime.datetime], Optional[str]):
+    """
+    Get the day windows to search for a query.
 
-        # 7. source
-        source = tweet.get("source")
+    Parameters
+    ----------
+    keyword
+        The search query.
+    csv_filename
+        The name of the output of the query.
+    days
+        The number of days from today to search tweets for.
+    output_format
+        The file format of the output.
+    checkpoints
+        The store of the high water marks.
+    incremental
+        Only plan the windows from the high water mark of the last run of the query, when it is within the days
+        searched.
 
-        # 8. Tweet text
-        text = tweet.get("text")
+    Returns
+    -------
+    The start and end of every window, and the tweet id the first window starts after for incremental runs.
+    """
+    start_list = dates.get_start_list(days)
+    end_list = dates.get_end_list(days)
 
-        # Assemble all data in a list
-        tweets.append([author_id, created_at, geo, lat, long, place_name, place_full_name, place_country,
-                       place_country_code, tweet_id, lang, like_count, quote_count, reply_count, retweet_count,
-                       source, text])
+    mark = checkpoints.get_high_water_mark(keyword, csv_filename, output_format.value) if incremental else None
+    if mark is not None:
+        since = parse_time(mark.newest_created_at)
+        if since > start_list[0]:
+            logger.info(f"Incremental run from tweet {mark.newest_id} created at {mark.newest_created_at}")
+            start_list, end_list = dates.get_incremental_windows(since)
+            return start_list, end_list, mark.newest_id
+        logger.info(f"High water mark {mark.newest_created_at} is older than {days} days, running in full")
+    return start_list, end_list, None
 
-        # Append the result to the CSV file
-        counter += 1
 
-    try:
-        df_tweets = pd.DataFrame(tweets, columns=df_headers)
-        logger.info(f"{counter} Tweets added from this response")
-    except ValueError as e:
-        logger.error(e)
-        df_tweets = pd.DataFrame(columns=df_headers)
-    return counter, df_tweets
+def save_high_water_mark(
+        keyword: str,
+        csv_filename: str,
+        output_format: OutputFormat,
+        checkpoints: CheckpointStore,
+        end_list: List[datetime.datetime]
+):
+    """
+    Move the high water mark of a query to the newest tweet seen by its windows.
+    """
+    states = [checkpoints.get(keyword, csv_filename, output_format.value, end.strftime("%Y%m%d"))
+              for end in end_list]
+    states = [state for state in states if state is not None and state.newest_id is not None]
+    if states:
+        newest = max(states, key=lambda state: int(state.newest_id))
+        checkpoints.save_high_water_mark(keyword, csv_filename, output_format.value,
+                                         HighWaterMark(newest.newest_id, newest.newest_created_at))
 
 
+@metrics.timed("search")
 def search_tweets(
         keyword: str,
         csv_filename:  str,
         max_results: int = 100,
         max_count: int = 1000,
-        days: int = 7
+        days: int = 7,
+        concurrency: int = 1,
+        flush_rows: int = 10_000,
+        output_format: OutputFormat = OutputFormat.CSV,
+        resume: bool = False,
+        checkpoint_db: str = DEFAULT_CHECKPOINT_DB,
+        checkpoint_pages: int = DEFAULT_CHECKPOINT_PAGES,
+        incremental: bool = False,
+        seen_ids_dir: str = DEFAULT_SEEN_IDS_DIR,
+        archive: bool = False,
+        adaptive: bool = False
 ):
     """
     Loops through every day in the dates lists to get the defined number of tweets per day.
-    Builds a DataFrame with results and writes 1 CSVs file for every day in the dates list.
-    Adds a 2 second delay between API calls to not spam the API.
+    Streams the results of every day in the dates list to 1 CSV file or Parquet partition per day.
+    Day windows are fetched by a pool of ``concurrency`` workers that share one TwitterClient, which paces the API
+    calls from the rate limit response headers and retries transient errors.
 
     Parameters
     ----------
@@ -125,129 +469,184 @@ def search_tweets(
         Max tweets per time period.
     days
         The number of days from today to search tweets for.
+    concurrency
+        The number of day windows to fetch in parallel.
+    flush_rows
+        The number of parsed rows to buffer per day before writing them.
+    output_format
+        The file format to write, CSV files per day or a Parquet dataset partitioned by date.
+    resume
+        Continue every day from where the last run of the same query and file name stopped.
+    checkpoint_db
+        The SQLite file the progress of every day is saved to.
+    checkpoint_pages
+        The number of pages written between two saves of the progress of a day, the rows buffered by then are
+        flushed first.
+    incremental
+        Only request the tweets newer than the high water mark of the last run of the query and add them to the
+        existing days. Falls back to a full run when there is no mark within the days searched.
+    seen_ids_dir
+        The directory of the ids of the tweets written per query, a tweet already written by an overlapping window
+        or an earlier run is dropped before it is parsed. None to keep every tweet.
+    archive
+        Also write the raw response bodies of every day to a compressed NDJSON archive.
+    adaptive
+        Spread max_count over every day with slices planned from the tweets per hour of earlier runs, instead of
+        taking the newest tweets of the day.
     """
-    # Total number of tweets we collected from the loop
-    total_tweets = 0
-
-    # Define DataFrame
-    df_headers = ["author_id", "created_at", "geo", "lat", "long", "place_name", "place_full_name", "place_country",
-                  "place_country_code", "id", "lang", "like_count", "quote_count", "reply_count", "retweet_count",
-                  "source", "tweet"]
-
-    start_list = dates.get_start_list(days)
-    end_list = dates.get_end_list(days)
-
-    for i in range(0, len(start_list)):
-
-        # Inputs
-        count = 0  # Counting tweets per time period
-        flag = True
-        next_token = None
-        df_user_location = pd.DataFrame(columns=df_headers)
-
-        while flag:
-            # Check if max_count reached
-            if count >= max_count:
-                break
-            logger.info(f"Token: {next_token}")
-
-            url = config.search_url
-            start_date = start_list[i].strftime("%Y-%m-%dT%H:%M:%S.000Z")
-            end_date = end_list[i].strftime("%Y-%m-%dT%H:%M:%S.000Z")
-            search_params = {
-                "query": keyword,
-                "start_time": start_date,
-                "end_time": end_date,
-                "max_results": max_results
-            }
-
-            params = append_config_params(search_params, EndpointType.SEARCH, config)
-            json_response = connect_to_endpoint(url, create_headers(), params, next_token)
-            result_count = json_response["meta"]["result_count"]
-
-            if "next_token" in json_response["meta"]:
-                # Save the token to use for next call
-                next_token = json_response["meta"]["next_token"]
-                logger.info(f"Next Token: {next_token}")
-                if result_count is not None and result_count > 0 and next_token is not None:
-                    logger.info(f"Start Date: {start_date}")
-                    logger.info(f"End Date: {end_date}")
-                    tweets_added, tweets_extracted = append_to_csv(df_headers, json_response)
-                    df_user_location = pd.concat([df_user_location, tweets_extracted], ignore_index=True)
-                    count += tweets_added
-                    total_tweets += result_count
-                    logger.info(f"Total # of Tweets scanned: {total_tweets}")
-                    logger.info(f"Total # of Tweets with Geo data parsed: {count}")
-                    time.sleep(2)
-            # If no next token exists
-            else:
-                if result_count is not None and result_count > 0:
-                    logger.info(f"Start Date: {start_date}")
-                    logger.info(f"End Date: {end_date}")
-                    tweets_added, tweets_extracted = append_to_csv(df_headers, json_response)
-                    df_user_location = pd.concat([df_user_location, tweets_extracted], ignore_index=True)
-                    count += tweets_added
-                    total_tweets += result_count
-                    logger.info(f"Total # of Tweets scanned: {total_tweets}")
-                    logger.info(f"Total # of Tweets with Geo data parsed: {count}")
-                    time.sleep(2)
-
-                # Since this is the final request, turn flag to false to move to the next time period.
-                flag = False
-                next_token = None
-            time.sleep(2)
-        date_format = end_list[i].strftime("%Y%m%d")
-        filename = f"project/data/{date_format}_{csv_filename}.csv"
-        logger.info(f"Writing to {filename}")
-        df_user_location.to_csv(filename)
+    options = WindowOptions(max_results=max_results, max_count=max_count, flush_rows=flush_rows,
+                            output_format=output_format, resume=resume, checkpoint_pages=checkpoint_pages,
+                            archive=archive, adaptive=adaptive)
+
+    with CheckpointStore(checkpoint_db) as checkpoints:
+        start_list, end_list, since_id = plan_windows(keyword, csv_filename, days, output_format, checkpoints,
+                                                      incremental)
+        seen_ids = (SeenIdIndex.open(keyword, csv_filename, output_format.value, seen_ids_dir)
+                    if seen_ids_dir is not None else None)
+
+        with TwitterClient(pool_size=max(concurrency, 1)) as client, \
+                ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+            futures = [
+                # Only the window holding the high water mark needs since_id, the later ones are newer than it
+                executor.submit(search_window, keyword, csv_filename, start_list[i], end_list[i], client, checkpoints,
+                                options, since_id=since_id if i == 0 else None, seen_ids=seen_ids)
+                for i in range(0, len(start_list))
+            ]
+            # Total number of tweets we collected from the loop
+            total_tweets = sum(future.result() for future in futures)
+            client.log_stats()
+
+        save_high_water_mark(keyword, csv_filename, output_format, checkpoints, end_list)
     logger.info(f"Total number of results: {total_tweets}")
 
 
-def get_author_locations(tweet_data_file: str) -> Dict:
+def _fetch_users(client: TwitterClient, author_ids: List[str]) -> List[List]:
+    """
+    Get the profile location of up to 100 authors from the users endpoint.
+
+    Returns
+    -------
+    A list of [author_id, location] lists, for the authors returned by the endpoint.
+    """
+    users_params = {
+        "ids": ",".join(author_ids)
+    }
+    config = get_config()
+    params = append_config_params(users_params, EndpointType.USERS, config)
+    json_response = client.get(config.users_url, params)
+    return [[user.get("id"), user.get("location")] for user in json_response.get("data", [])]
+
+
+def get_author_locations(
+        tweet_data_file: str,
+        client: TwitterClient,
+        output_format: OutputFormat = OutputFormat.CSV,
+        filters: List[Tuple] = None,
+        cache: AuthorLocationCache = None,
+        concurrency: int = 1,
+        clean_workers: int = 1
+) -> Dict:
     """
     Hits the twitter users API Endpoint to get location data to build a lookup dictionary. Uses a world cities
-    reference file to validate country/cities.
+    reference file to validate country/cities. When a cache is given only the authors missing from it are requested
+    and the new results are added to it.
+
+    The distinct author ids are requested in batches of 100 by a pool of ``concurrency`` workers and every batch is
+    cleaned as soon as it arrives, while the next batches are still being fetched. With more than 1 clean worker the
+    batches are cleaned by a pool of processes instead of the calling thread.
 
     Parameters
     ----------
     tweet_data_file
         The file with twitter data that contains author_id column to get location data for.
+    client
+        The client used to call the users endpoint.
+    output_format
+        The file format of the twitter data.
+    filters
+        Parquet only: predicates selecting the partitions to read.
+    cache
+        The persistent author location cache.
+    concurrency
+        The number of users requests to keep in flight.
+    clean_workers
+        The number of processes cleaning the locations.
 
     Returns
     -------
     A dictionary to be used as a lookup for author_id -> location data
 
     """
-    df = pd.read_csv(tweet_data_file, dtype={'author_id': object})
-    author_ids = df["author id"].to_list()
-    author_ids = [_id for _id in author_ids if re.match(r'^\d+$', _id) is not None]
-
-    # Inputs for tweets
-    headers = create_headers()
-
-    user_locations = []
-
-    for batch in range((len(author_ids)//100) + 1):
-        batch_start = batch * 100
-        batch_end = batch * 100 + 100
-        batch_end = len(author_ids) if batch_end > len(author_ids) else batch_end
-        logger.info(f"Batch {batch_start} to {batch_end}")
-
-        url = config.users_url
-        users_params = {
-            "ids": author_ids[batch_start:batch_end]
-        }
-        params = append_config_params(users_params, EndpointType.USERS, config)
-        json_response = connect_to_endpoint(url, headers, params, None)
-
-        for user in json_response["data"]:
-            user_locations.append([user.get("id"), user.get("location")])
-
-    df_user_location = pd.DataFrame(user_locations, columns=["author_id", "location"])
-    return clean_locations(df_user_location, "project/utilities/reference/world_cities.csv")
-
-
-def tweets_add_locations(tweet_data_file: str = "project/data/tweet_data.csv"):
+    df = read_tweets(tweet_data_file, output_format, columns=["author_id"], filters=filters)
+    author_ids = df["author_id"].dropna().astype(str).drop_duplicates()
+    author_ids = author_ids[author_ids.str.fullmatch(r"\d+")].to_list()
+
+    cached = {}
+    if cache is not None:
+        cached = cache.get_many(author_ids)
+        author_ids = [_id for _id in author_ids if _id not in cached]
+        logger.info(f"Author location cache: {cache.hits} hits, {cache.misses} misses "
+                    f"({cache.hit_rate:.1%} hit rate)")
+
+    user_location = {}
+    batches = [author_ids[batch_start:batch_start + 100] for batch_start in range(0, len(author_ids), 100)]
+    logger.info(f"Requesting {len(author_ids)} authors in {len(batches)} batches")
+
+    def save_batch(batch, user_locations, batch_location):
+        user_location.update(batch_location)
+        if cache is not None:
+            # Authors without a location, or missing from the response, are cached too so they aren't
+            # requested again
+            entries = {_id: {} for _id in batch}
+            for author_id, location in user_locations:
+                entries[author_id] = {"location": location, **batch_location.get(author_id, {})}
+            cache.put_many(entries)
+
+    cleaner_pool = create_cleaner_pool(WORLD_CITIES_FILE, clean_workers) if clean_workers > 1 and batches else None
+    clean_futures = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+            futures = {executor.submit(_fetch_users, client, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                user_locations = future.result()
+                logger.info(f"Batch of {len(batch)} authors returned {len(user_locations)} users")
+
+                df_user_location = pd.DataFrame(user_locations, columns=["author_id", "location"])
+                if cleaner_pool is not None:
+                    clean_future = cleaner_pool.submit(clean_locations_chunk, df_user_location.dropna())
+                    clean_futures[clean_future] = (batch, user_locations)
+                else:
+                    save_batch(batch, user_locations, clean_locations(df_user_location, WORLD_CITIES_FILE))
+
+        for clean_future in as_completed(clean_futures):
+            save_batch(*clean_futures[clean_future], clean_future.result())
+    finally:
+        if cleaner_pool is not None:
+            cleaner_pool.shutdown(cancel_futures=True)
+
+    if cleaner_pool is None:
+        location_cache = get_location_cache()
+        logger.info(f"Location cache: {location_cache.hits} hits, {location_cache.misses} misses "
+                    f"({location_cache.hit_rate:.1%} hit rate), {location_cache.evictions} evictions")
+
+    for author_id, entry in cached.items():
+        if entry["lat"] is not None:
+            user_location[author_id] = {key: entry[key] for key in ["lat", "lon", "city", "country"]}
+    return user_location
+
+
+@metrics.timed("add_locations")
+def tweets_add_locations(
+        tweet_data_file: str = "project/data/tweet_data.csv",
+        output_format: OutputFormat = OutputFormat.CSV,
+        date: str = None,
+        author_cache_db: str = DEFAULT_AUTHOR_CACHE_DB,
+        cache_ttl_days: float = DEFAULT_TTL_DAYS,
+        concurrency: int = 1,
+        clean_workers: int = 1,
+        location_cache_size: int = DEFAULT_LOCATION_CACHE_SIZE
+):
     """
     Calls the get_author_locations() function to build the lookup dictionary and then updates the provided
     file with location data.
@@ -255,20 +654,62 @@ def tweets_add_locations(tweet_data_file: str = "project/data/tweet_data.csv"):
     Parameters
     ----------
     tweet_data_file
-        The file with twitter data that has author_id column.
+        The file or Parquet dataset with twitter data that has author_id column.
+    output_format
+        The file format of the twitter data.
+    date
+        Parquet only: the %Y%m%d partition to update, all partitions when None.
+    author_cache_db
+        The SQLite file of the author location cache, None to always call the users endpoint.
+    cache_ttl_days
+        The number of days an author location stays in the cache.
+    concurrency
+        The number of users requests to keep in flight.
+    clean_workers
+        The number of processes cleaning the locations.
+    location_cache_size
+        The number of distinct location strings whose resolution is memoized, per cleaning process.
     """
-    df_tweets = pd.read_csv(tweet_data_file, dtype={'author id': object})
+    set_location_cache_size(location_cache_size)
+    filters = [(PARTITION_COLUMN, "=", date)] if date is not None else None
+    df_tweets = read_tweets(tweet_data_file, output_format, filters=filters)
 
-    user_location = get_author_locations(tweet_data_file)
+    cache = AuthorLocationCache(author_cache_db, cache_ttl_days) if author_cache_db is not None else None
+    try:
+        with TwitterClient(pool_size=max(concurrency, 1)) as client:
+            user_location = get_author_locations(tweet_data_file, client, output_format, filters, cache,
+                                                 concurrency, clean_workers)
+            client.log_stats()
+    finally:
+        if cache is not None:
+            cache.close()
+
+    df_tweets = add_author_locations(df_tweets, user_location)
+    write_tweets(df_tweets, tweet_data_file, output_format)
+
+
+def tweets_add_places(
+        tweet_data_file: str = "project/data/tweet_data.csv",
+        output_format: OutputFormat = OutputFormat.CSV,
+        date: str = None,
+        max_km: float = DEFAULT_PLACE_MAX_KM
+):
+    """
+    Fills the place of the tweets with coordinates but without a place from the nearest city of the world cities
+    reference and updates the provided file, without calling the API.
 
-    for index, row in df_tweets.iterrows():
-        try:
-            logger.debug(f"""looking up {row["author id"]}""")
-            df_tweets.loc[index, "lat"] = user_location[row["author_id"]]["lat"]
-            df_tweets.loc[index, "long"] = user_location[row["author_id"]]["long"]
-            df_tweets.loc[index, "city"] = user_location[row["author_id"]]["city"]
-            df_tweets.loc[index, "country"] = user_location[row["author_id"]]["country"]
-        except KeyError:
-            pass
-            logger.warning(f"""{row["author id"]} not found in locations lookup""")
-    df_tweets.to_csv(tweet_data_file)
+    Parameters
+    ----------
+    tweet_data_file
+        The file or Parquet dataset with twitter data.
+    output_format
+        The file format of the twitter data.
+    date
+        Parquet only: the %Y%m%d partition to update, all partitions when None.
+    max_km
+        The max distance from a tweet to the city its place is filled from.
+    """
+    filters = [(PARTITION_COLUMN, "=", date)] if date is not None else None
+    df_tweets = read_tweets(tweet_data_file, output_format, filters=filters)
+    df_tweets = add_places(df_tweets, WORLD_CITIES_FILE, max_km)
+    write_tweets(df_tweets, tweet_data_file, output_format)
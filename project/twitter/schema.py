@@ -0,0 +1,80 @@
+from dataclasses import dataclass, fields
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+
+@dataclass
+class TweetRecord:
+    """
+    One row of the tweets output, in column order. The columns and dtypes of every tweets DataFrame are derived
+    from it.
+    """
+    __slots__ = ("author_id", "created_at", "geo", "lat", "long", "place_name", "place_full_name", "place_country",
+                 "place_country_code", "id", "lang", "like_count", "quote_count", "reply_count", "retweet_count",
+                 "source", "tweet")
+
+    author_id: str
+    created_at: str
+    geo: Optional[str]
+    lat: float
+    long: float
+    place_name: Optional[str]
+    place_full_name: Optional[str]
+    place_country: Optional[str]
+    place_country_code: Optional[str]
+    id: str
+    lang: Optional[str]
+    like_count: Optional[int]
+    quote_count: Optional[int]
+    reply_count: Optional[int]
+    retweet_count: Optional[int]
+    source: Optional[str]
+    tweet: str
+
+
+TWEET_COLUMNS = [field.name for field in fields(TweetRecord)]
+
+# Few distinct values repeated over many tweets, held once per value as categories
+CATEGORY_COLUMNS = ["geo", "place_name", "place_full_name", "place_country", "place_country_code", "lang", "source"]
+# Public metrics, missing for some tweets, held in 4 bytes and a mask instead of int64 or float64
+COUNT_COLUMNS = ["like_count", "quote_count", "reply_count", "retweet_count"]
+COUNT_DTYPE = "UInt32"
+# Twitter ids don't fit in a float and lose their leading characters as ints, so they are always read as strings
+ID_COLUMNS = ["author_id", "id"]
+
+
+def csv_dtypes() -> Dict:
+    """
+    The dtypes to read a tweets CSV file with.
+    """
+    return {
+        **{column: str for column in ID_COLUMNS},
+        **{column: "category" for column in CATEGORY_COLUMNS},
+        **{column: COUNT_DTYPE for column in COUNT_COLUMNS}
+    }
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert the columns of a tweets DataFrame to the schema dtypes, other columns are left as they are.
+    """
+    dtypes = {column: "category" for column in CATEGORY_COLUMNS
+              if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype)}
+    dtypes.update({column: COUNT_DTYPE for column in COUNT_COLUMNS
+                   if column in df.columns and df[column].dtype != COUNT_DTYPE})
+    return df.astype(dtypes) if dtypes else df
+
+
+def storage_frame(df: pd.DataFrame, columns: List[str] = None) -> pd.DataFrame:
+    """
+    Convert the schema dtypes back to the plain types Parquet files have always been written with, strings and
+    int64, so the part files of a dataset keep one type per column whether the frame was parsed or read back with
+    the schema. Parquet dictionary encodes repeated strings on disk either way.
+    """
+    df = df[columns] if columns is not None else df
+    dtypes = {column: df[column].cat.categories.dtype for column in df.columns
+              if isinstance(df[column].dtype, pd.CategoricalDtype)}
+    dtypes.update({column: "Int64" for column in COUNT_COLUMNS
+                   if column in df.columns and df[column].dtype == COUNT_DTYPE})
+    return df.astype(dtypes) if dtypes else df
@@ -0,0 +1,187 @@
+import glob
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict
+
+import numpy as np
+
+from project.utilities.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEEN_IDS_DIR = "project/data/seen_ids"
+# Ids claimed since the last merge are kept in a small sorted array, merged into the day array past this size
+MERGE_ROWS = 65_536
+
+
+def index_path(directory: str, query: str, name: str, output_format: str) -> str:
+    """
+    The directory of the seen id index of a query, output name and output format.
+    """
+    digest = hashlib.sha1(f"{query}\0{name}\0{output_format}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(directory, f"{name}-{output_format}-{digest}")
+
+
+class SeenIdIndex:
+    """
+    The ids of the tweets already written for a query, kept as one sorted int64 array per day window and saved as
+    ``<date>.npy`` files, 8 bytes per tweet.
+
+    Ids are looked up with a binary search over the array of every day, so a tweet returned by two overlapping
+    windows or by two runs is only written once. A day is kept apart from the others because a full run of a day
+    overwrites its output, and with it the ids written by the earlier runs of the day. Without a ``path`` the ids
+    are only kept in memory.
+
+    Ids claimed with ``hold`` are dropped from later pages straight away but only saved once they are committed,
+    so the saved ids of a day never cover tweets that aren't on disk yet.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._days: Dict[str, np.ndarray] = {}
+        self._pending: Dict[str, np.ndarray] = {}
+        self._held: Dict[str, np.ndarray] = {}
+        if path is None:
+            return
+        for file in glob.glob(os.path.join(path, "*.npy")):
+            date = os.path.basename(file)[:-len(".npy")]
+            if date.endswith(".tmp"):
+                continue
+            try:
+                self._days[date] = np.load(file, mmap_mode="r")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable seen ids {file}: {e}")
+        logger.info(f"Loaded {len(self)} seen tweet ids from {path}")
+
+    @classmethod
+    def open(cls, query: str, name: str, output_format: str, directory: str = DEFAULT_SEEN_IDS_DIR) -> "SeenIdIndex":
+        return cls(index_path(directory, query, name, output_format))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(ids) for days in (self._days, self._pending, self._held) for ids in days.values())
+
+    def reset(self, date: str):
+        """
+        Forget the ids of a day, when its output is about to be overwritten.
+        """
+        with self._lock:
+            self._days[date] = np.empty(0, dtype=np.int64)
+            self._pending.pop(date, None)
+            self._held.pop(date, None)
+
+    def _contains(self, ids: np.ndarray) -> np.ndarray:
+        seen = np.zeros(len(ids), dtype=bool)
+        for array in list(self._days.values()) + list(self._pending.values()) + list(self._held.values()):
+            if len(array) == 0:
+                continue
+            positions = np.minimum(np.searchsorted(array, ids), len(array) - 1)
+            seen |= array[positions] == ids
+        return seen
+
+    def claim(self, date: str, ids: np.ndarray, hold: bool = False) -> np.ndarray:
+        """
+        Add the ids that haven't been seen to a day.
+
+        Parameters
+        ----------
+        date
+            The day window the tweets are written to, as YYYYMMDD.
+        ids
+            The tweet ids of a page.
+        hold
+            Keep the new ids out of save until they are committed, for a page that isn't written yet.
+
+        Returns
+        -------
+        A mask of the ids that are new, the first of any id repeated in ``ids``.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        new = np.zeros(len(ids), dtype=bool)
+        _, first = np.unique(ids, return_index=True)
+        new[first] = True
+
+        with self._lock:
+            new &= ~self._contains(ids)
+            if hold:
+                held = np.concatenate([self._held.get(date, np.empty(0, dtype=np.int64)), ids[new]])
+                held.sort()
+                self._held[date] = held
+            else:
+                self._add(date, ids[new])
+        return new
+
+    def commit(self, date: str, ids: np.ndarray):
+        """
+        Let the ids held back by claim be saved, once the tweets they belong to are written.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        with self._lock:
+            held = self._held.get(date)
+            if held is not None:
+                self._held[date] = held[~np.isin(held, ids)]
+            self._add(date, ids)
+
+    def release(self, date: str):
+        """
+        Forget the ids held back for a day that were never written, e.g. when its window failed.
+        """
+        with self._lock:
+            self._held.pop(date, None)
+
+    def _add(self, date: str, ids: np.ndarray):
+        pending = np.concatenate([self._pending.get(date, np.empty(0, dtype=np.int64)), ids])
+        pending.sort()
+        self._pending[date] = pending
+        if len(pending) >= MERGE_ROWS:
+            self._merge(date)
+
+    def _merge(self, date: str):
+        pending = self._pending.pop(date, None)
+        if pending is None:
+            return
+        merged = np.concatenate([self._days.get(date, np.empty(0, dtype=np.int64)), pending])
+        merged.sort()
+        self._days[date] = merged
+
+    def save(self, date: str):
+        """
+        Write the ids of a day, once the tweets they belong to are written. The ids still held back are left out.
+        """
+        with self._lock:
+            self._merge(date)
+            ids = self._days.get(date)
+            if ids is None or self.path is None:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            tmp = os.path.join(self.path, f"{date}.tmp.npy")
+            np.save(tmp, ids)
+            os.replace(tmp, os.path.join(self.path, f"{date}.npy"))
+
+
+def tweet_ids(json_response: Dict) -> np.ndarray:
+    """
+    Get the ids of the tweets of a search API response.
+    """
+    tweets = json_response.get("data") or []
+    return np.fromiter((int(tweet["id"]) for tweet in tweets), dtype=np.int64, count=len(tweets))
+
+
+def drop_seen(json_response: Dict, seen_ids: SeenIdIndex, date: str, hold: bool = False) -> Dict:
+    """
+    Drop the tweets of a search API response that were already written for the query, before they are parsed.
+    With ``hold`` the ids of the tweets kept are only saved once they are committed.
+    """
+    tweets = json_response.get("data") or []
+    if not tweets:
+        return json_response
+    new = seen_ids.claim(date, tweet_ids(json_response), hold)
+    duplicates = len(tweets) - int(new.sum())
+    if duplicates == 0:
+        return json_response
+    metrics.inc("tweets_duplicate", duplicates)
+    logger.info(f"Dropped {duplicates} tweets already written")
+    return {**json_response, "data": [tweet for tweet, keep in zip(tweets, new) if keep]}
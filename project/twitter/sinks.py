@@ -0,0 +1,163 @@
+import glob
+import logging
+import os
+import uuid
+from typing import List
+
+import pandas as pd
+
+from project.twitter.output_format import OutputFormat
+from project.twitter.schema import storage_frame
+from project.utilities.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = "project/data"
+PARTITION_COLUMN = "date"
+
+
+class Sink:
+    """
+    Streams parsed pages to an output instead of holding a whole time window in memory.
+
+    Pages are buffered until ``flush_rows`` rows are pending and then written in one go, so memory stays bounded by
+    the buffer no matter how many tweets a window returns.
+    """
+
+    def __init__(self, columns: List, flush_rows: int = 10_000, rows_written: int = 0):
+        self.columns = columns
+        self.flush_rows = flush_rows
+        self.rows_written = rows_written
+        self._buffer = []
+        self._buffered_rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def buffered_rows(self) -> int:
+        return self._buffered_rows
+
+    def write(self, df: pd.DataFrame):
+        """
+        Add a parsed page to the buffer, flushing it once it holds ``flush_rows`` rows.
+        """
+        if df.empty:
+            return
+        self._buffer.append(df)
+        self._buffered_rows += len(df)
+        if self._buffered_rows >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        with metrics.timer("concat"):
+            df = pd.concat(self._buffer, ignore_index=True)
+        with metrics.timer("write"):
+            self._write(df)
+        metrics.inc("rows_written", len(df))
+        self.rows_written += len(df)
+        self._buffer = []
+        self._buffered_rows = 0
+
+    def close(self):
+        self.flush()
+
+    def _write(self, df: pd.DataFrame):
+        raise NotImplementedError
+
+
+class CsvSink(Sink):
+    """
+    Appends the buffered pages to a CSV file. The index column keeps counting across flushes so the file is the same
+    as a single ``DataFrame.to_csv`` of every page.
+
+    The file is overwritten when the sink is opened unless ``append`` is set, in which case ``rows_written`` rows
+    are expected to be in it already.
+    """
+
+    def __init__(self, filename: str, columns: List, flush_rows: int = 10_000, append: bool = False,
+                 rows_written: int = 0):
+        super().__init__(columns, flush_rows, rows_written if append else 0)
+        self.filename = filename
+
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not append or not os.path.exists(filename):
+            pd.DataFrame(columns=columns).to_csv(filename)
+
+    def _write(self, df: pd.DataFrame):
+        df.index = pd.RangeIndex(self.rows_written, self.rows_written + len(df))
+        df.to_csv(self.filename, mode="a", header=False, columns=self.columns)
+        logger.debug(f"Flushed {len(df)} rows to {self.filename}")
+
+
+class ParquetSink(Sink):
+    """
+    Writes the buffered pages to a Parquet dataset partitioned by date, e.g. ``project/data/tweets/date=20220313/``.
+
+    Every flush writes a new zstd compressed part file so the column types of the DataFrame are kept. Part files
+    already in the partition are removed when the sink is opened, the same way the CSV file is overwritten, unless
+    ``append`` is set.
+    """
+
+    def __init__(self, directory: str, date: str, columns: List, flush_rows: int = 10_000, append: bool = False,
+                 rows_written: int = 0):
+        super().__init__(columns, flush_rows, rows_written if append else 0)
+        self.filename = partition_path(directory, date)
+
+        os.makedirs(self.filename, exist_ok=True)
+        if not append:
+            for part in glob.glob(os.path.join(self.filename, "*.parquet")):
+                os.remove(part)
+
+    def _write(self, df: pd.DataFrame):
+        part = os.path.join(self.filename, f"part-{uuid.uuid4().hex}.parquet")
+        storage_frame(df, self.columns).to_parquet(part, index=False, compression="zstd")
+        logger.debug(f"Flushed {len(df)} rows to {part}")
+
+
+def partition_path(directory: str, date: str) -> str:
+    return os.path.join(directory, f"{PARTITION_COLUMN}={date}")
+
+
+def make_sink(
+        output_format: OutputFormat,
+        name: str,
+        date: str,
+        columns: List,
+        flush_rows: int = 10_000,
+        append: bool = False,
+        rows_written: int = 0
+) -> Sink:
+    """
+    Create the sink for one time window of the given output format.
+
+    Parameters
+    ----------
+    output_format
+        The file format to write.
+    name
+        The name of the output, used as the CSV file suffix or the Parquet dataset directory.
+    date
+        The date of the time window, formatted as %Y%m%d.
+    columns
+        The columns to write.
+    flush_rows
+        The number of rows to buffer before writing them.
+    append
+        Add to the existing output of the window instead of overwriting it.
+    rows_written
+        The number of rows already written to the existing output when appending.
+    """
+    if output_format.value == OutputFormat.CSV.value:
+        return CsvSink(os.path.join(DATA_DIR, f"{date}_{name}.csv"), columns, flush_rows, append, rows_written)
+    elif output_format.value == OutputFormat.PARQUET.value:
+        return ParquetSink(os.path.join(DATA_DIR, name), date, columns, flush_rows, append, rows_written)
+    else:
+        raise NotImplementedError("The Output Format hasn't been implemented")
@@ -0,0 +1,103 @@
+import logging
+import os
+from typing import List, Tuple
+
+import pandas as pd
+
+from project.twitter.output_format import OutputFormat
+from project.twitter.schema import CATEGORY_COLUMNS, apply_schema, csv_dtypes
+from project.twitter.sinks import DATA_DIR, PARTITION_COLUMN, ParquetSink
+
+logger = logging.getLogger(__name__)
+
+
+def tweets_path(output_format: OutputFormat, name: str) -> str:
+    """
+    Get the path of the tweets output with the given name, a CSV file or a Parquet dataset directory.
+    """
+    if output_format.value == OutputFormat.CSV.value:
+        return os.path.join(DATA_DIR, f"{name}.csv")
+    elif output_format.value == OutputFormat.PARQUET.value:
+        return os.path.join(DATA_DIR, name)
+    else:
+        raise NotImplementedError("The Output Format hasn't been implemented")
+
+
+def read_tweets(
+        path: str,
+        output_format: OutputFormat,
+        columns: List[str] = None,
+        filters: List[Tuple] = None
+) -> pd.DataFrame:
+    """
+    Read tweets written by a sink back into a DataFrame.
+
+    Parameters
+    ----------
+    path
+        The CSV file or Parquet dataset directory to read.
+    output_format
+        The file format of the path.
+    columns
+        Only read these columns. Parquet skips the other columns on disk.
+    filters
+        Parquet only: predicates in pyarrow DNF form, e.g. ``[("date", "=", "20220313")]``, so only the matching
+        partitions and row groups are read.
+
+    Returns
+    -------
+    The tweets DataFrame.
+    """
+    if output_format.value == OutputFormat.CSV.value:
+        if filters:
+            raise ValueError("Filters are only supported for the Parquet output format")
+        parse_dates = ["created_at"] if columns is None or "created_at" in columns else None
+        if columns is None:
+            return apply_schema(pd.read_csv(path, index_col=0, dtype=csv_dtypes(), parse_dates=parse_dates))
+        return apply_schema(pd.read_csv(path, usecols=columns, dtype=csv_dtypes(), parse_dates=parse_dates)[columns])
+    elif output_format.value == OutputFormat.PARQUET.value:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+
+        partition_schema = pa.schema([(PARTITION_COLUMN, pa.string())])
+        partitioning = ds.partitioning(partition_schema, flavor="hive")
+        expression = pq.filters_to_expression(filters) if filters else None
+
+        # Partitions enriched by add-locations have extra columns, so the schema is unified over the files read
+        dataset = ds.dataset(path, format="parquet", partitioning=partitioning)
+        schemas = [fragment.physical_schema for fragment in dataset.get_fragments(filter=expression)]
+        schema = pa.unify_schemas(schemas + [partition_schema])
+        dataset = ds.dataset(path, schema=schema, format="parquet", partitioning=partitioning)
+        table = dataset.to_table(columns=columns, filter=expression)
+        # The strings of the category columns are converted once per distinct value
+        categories = [column for column in CATEGORY_COLUMNS if column in table.column_names]
+        return apply_schema(table.to_pandas(categories=categories))
+    else:
+        raise NotImplementedError("The Output Format hasn't been implemented")
+
+
+def write_tweets(df: pd.DataFrame, path: str, output_format: OutputFormat):
+    """
+    Overwrite the tweets at the path with the DataFrame. For Parquet only the partitions found in the ``date``
+    column of the DataFrame are replaced.
+
+    Parameters
+    ----------
+    df
+        The tweets to write.
+    path
+        The CSV file or Parquet dataset directory to write.
+    output_format
+        The file format of the path.
+    """
+    if output_format.value == OutputFormat.CSV.value:
+        df.to_csv(path)
+    elif output_format.value == OutputFormat.PARQUET.value:
+        columns = [column for column in df.columns if column != PARTITION_COLUMN]
+        for date, df_partition in df.groupby(PARTITION_COLUMN, observed=True):
+            logger.info(f"Writing partition {date} to {path}")
+            with ParquetSink(path, date, columns, flush_rows=len(df_partition)) as sink:
+                sink.write(df_partition)
+    else:
+        raise NotImplementedError("The Output Format hasn't been implemented")
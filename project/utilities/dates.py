@@ -55,3 +55,37 @@ def get_end_list(
     end_list.reverse()
 
     return end_list
+
+
+def get_incremental_windows(
+        since: datetime.datetime,
+        now: datetime.datetime = None
+) -> (List[datetime.datetime], List[datetime.datetime]):
+    """
+    Gets the start and end datetime values of the windows covering the time from the given datetime up to a minute
+    ago, split at day boundaries so every window falls in 1 day.
+
+    Parameters
+    ----------
+    since
+        The datetime to start the first window at.
+    now
+        The current datetime, defaults to now in UTC.
+
+    Returns
+    -------
+    A list with the starting datetime values and a list with the ending datetime values
+    """
+    now = datetime.datetime.now(utc) if now is None else now
+    end = now - datetime.timedelta(minutes=1)
+
+    start_list = []
+    end_list = []
+    start = since
+    while start < end:
+        day_end = start.replace(hour=23, minute=59, second=59, microsecond=999999)
+        start_list.append(start)
+        end_list.append(min(day_end, end))
+        start = day_end + datetime.timedelta(microseconds=1)
+
+    return start_list, end_list
@@ -0,0 +1,129 @@
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+from project.utilities.world_cities import WorldCities
+
+
+class Gazetteer:
+    """
+    Index of country and city names to resolve free text locations such as "Camas, Spain" to a country and city.
+
+    Country names are compiled into an Aho-Corasick automaton so all the countries in a location are found in one
+    pass over the string, in time proportional to its length rather than to the number of countries. A country only
+    matches on word boundaries, so "oman" isn't found in "romania". When no country is found and what is left is a
+    known city name, the country of the most populous city with that name is used.
+    """
+
+    def __init__(self, countries: Iterable[str], cities: Dict[str, str] = None):
+        self.cities = cities or {}
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for country in countries:
+            self._add(country.lower().strip())
+        self._build_fail_links()
+
+    @classmethod
+    def from_world_cities(cls, world_cities: WorldCities) -> "Gazetteer":
+        """
+        Build the gazetteer from the countries and cities of a world cities reference.
+        """
+        df_cities = world_cities.df_cities
+        if "population" in df_cities.columns:
+            df_cities = df_cities.sort_values("population", ascending=False, na_position="last", kind="stable")
+        # The first country of every city name is the one with the most populous city by that name
+        df_cities = df_cities.drop_duplicates("city_ascii")
+        cities = dict(zip(df_cities["city_ascii"].str.strip(), df_cities["country"].str.strip()))
+        return cls(world_cities.countries, cities)
+
+    def _add(self, pattern: str):
+        if not pattern:
+            return
+        state = 0
+        for char in pattern:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+        self._output[state].append(pattern)
+
+    def _build_fail_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_countries(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        Find the countries in a lower case string.
+
+        Parameters
+        ----------
+        text
+            The string to search.
+
+        Returns
+        -------
+        The (start, end, country) of the non-overlapping matches on word boundaries, longest match first when
+        matches overlap, in the order they appear in the string.
+        """
+        matches = []
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for country in self._output[state]:
+                start = end - len(country)
+                if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum()):
+                    matches.append((start, end, country))
+
+        # Keep the leftmost, longest matches that don't overlap
+        matches.sort(key=lambda match: (match[0], match[0] - match[1]))
+        selected = []
+        for match in matches:
+            if not selected or match[0] >= selected[-1][1]:
+                selected.append(match)
+        return selected
+
+    def resolve(self, location: str) -> (str, str):
+        """
+        Parse city and country from a location string. The countries found are removed from the location and what
+        is left, without punctuation, is the city.
+
+        Parameters
+        ----------
+        location
+            The location string to parse, already lower case with accents stripped.
+
+        Returns
+        -------
+        The country and the city, empty strings when not found.
+        """
+        matches = self.find_countries(location)
+        country_lookup = ""
+        city_lookup = location
+        if matches:
+            # The country is usually last in a location, e.g. "camas, spain"
+            country_lookup = matches[-1][2]
+            parts = []
+            position = 0
+            for start, end, _ in matches:
+                parts.append(location[position:start])
+                position = end
+            parts.append(location[position:])
+            city_lookup = "".join(parts)
+
+        city_lookup = re.sub(r'[^\w\s]', "", city_lookup).strip()
+        if not country_lookup:
+            country_lookup = self.cities.get(city_lookup, "")
+        return country_lookup, city_lookup
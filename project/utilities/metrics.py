@@ -0,0 +1,228 @@
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_PREFIX = "social_ingest"
+PROFILE_MODES = ["cpu", "memory"]
+
+# Labels added to every timer and counter recorded in the current context, e.g. the day window being fetched.
+# Context variables aren't shared between threads, so every window fetched by a worker thread keeps its own.
+_labels = contextvars.ContextVar("metrics_labels", default=())
+
+
+@dataclass
+class TimerStats:
+    count: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+class Metrics:
+    """
+    Registry of stage timers and counters, keyed by name and labels, safe to share between threads.
+
+    Timers are recorded with the ``timer`` context manager or the ``timed`` decorator, counters with ``inc``. The
+    summary has every timer and counter per label set, e.g. per day window, and the run totals per name, and is
+    written as JSON or in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timers: Dict[Tuple, TimerStats] = {}
+        self._counters: Dict[Tuple, float] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict) -> Tuple:
+        return (name,) + tuple(sorted({**dict(_labels.get()), **labels}.items()))
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            stats = self._timers.setdefault(key, TimerStats())
+            stats.count += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """
+        Time the block and add it to the timer of the name.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name: str, **labels) -> Callable:
+        """
+        Decorator timing every call of the function.
+        """
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @staticmethod
+    @contextmanager
+    def labels(**labels) -> Iterator[None]:
+        """
+        Add labels to the timers and counters recorded inside the block, in this thread.
+        """
+        token = _labels.set(tuple({**dict(_labels.get()), **{k: str(v) for k, v in labels.items()}}.items()))
+        try:
+            yield
+        finally:
+            _labels.reset(token)
+
+    def reset(self):
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+
+    def summary(self) -> Dict:
+        """
+        The timers and counters per label set, and their totals over all label sets.
+        """
+        with self._lock:
+            timers = {key: TimerStats(stats.count, stats.seconds, stats.max_seconds)
+                      for key, stats in self._timers.items()}
+            counters = dict(self._counters)
+
+        total_timers: Dict[str, TimerStats] = {}
+        for (name, *_), stats in timers.items():
+            total = total_timers.setdefault(name, TimerStats())
+            total.count += stats.count
+            total.seconds += stats.seconds
+            total.max_seconds = max(total.max_seconds, stats.max_seconds)
+        total_counters: Dict[str, float] = {}
+        for (name, *_), value in counters.items():
+            total_counters[name] = total_counters.get(name, 0) + value
+
+        return {
+            "run": {
+                "timers": {name: vars(stats) for name, stats in sorted(total_timers.items())},
+                "counters": dict(sorted(total_counters.items()))
+            },
+            "timers": [{"name": name, "labels": dict(labels), **vars(stats)}
+                       for (name, *labels), stats in sorted(timers.items())],
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, *labels), value in sorted(counters.items())]
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        The timers and counters in the Prometheus text exposition format.
+        """
+        summary = self.summary()
+
+        def series(name: str, labels: Dict, value: float) -> str:
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+            return f"{PROMETHEUS_PREFIX}_{name}{{{label_text}}} {value}" if label_text else \
+                f"{PROMETHEUS_PREFIX}_{name} {value}"
+
+        lines = [
+            f"# HELP {PROMETHEUS_PREFIX}_stage_seconds_total Time spent in a stage.",
+            f"# TYPE {PROMETHEUS_PREFIX}_stage_seconds_total counter"
+        ]
+        lines += [series("stage_seconds_total", {"stage": timer["name"], **timer["labels"]}, timer["seconds"])
+                  for timer in summary["timers"]]
+        lines += [
+            f"# HELP {PROMETHEUS_PREFIX}_stage_calls_total Number of times a stage ran.",
+            f"# TYPE {PROMETHEUS_PREFIX}_stage_calls_total counter"
+        ]
+        lines += [series("stage_calls_total", {"stage": timer["name"], **timer["labels"]}, timer["count"])
+                  for timer in summary["timers"]]
+        for name in sorted({counter["name"] for counter in summary["counters"]}):
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name}_total counter")
+            lines += [series(f"{name}_total", counter["labels"], counter["value"])
+                      for counter in summary["counters"] if counter["name"] == name]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """
+        Write the summary to a file, in the Prometheus text format for ``.prom`` files and as JSON otherwise.
+        """
+        with open(path, "w") as f:
+            if path.endswith(".prom"):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.summary(), f, indent=2)
+        logger.info(f"Metrics written to {path}")
+
+    def log_summary(self):
+        run = self.summary()["run"]
+        for name, stats in run["timers"].items():
+            logger.info(f"{name}: {stats['seconds']:.3f}s in {stats['count']} calls")
+        for name, value in run["counters"].items():
+            logger.info(f"{name}: {value}")
+
+
+# The registry the pipeline records to
+metrics = Metrics()
+
+
+@contextmanager
+def profiled(mode: str = None, output: str = None, top: int = 25) -> Iterator[None]:
+    """
+    Profile the block with cProfile or tracemalloc, and log the top entries.
+
+    Parameters
+    ----------
+    mode
+        ``cpu`` for cProfile, ``memory`` for tracemalloc, None to not profile.
+    output
+        cpu only: the file to save the pstats to, e.g. to open it with snakeviz.
+    top
+        The number of functions or lines to log.
+    """
+    if mode is None:
+        yield
+        return
+
+    if mode == "cpu":
+        import cProfile
+        import io
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if output is not None:
+                profiler.dump_stats(output)
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(top)
+            logger.info(f"cProfile top {top} by cumulative time:\n{stream.getvalue()}")
+    elif mode == "memory":
+        import tracemalloc
+
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            lines = "\n".join(str(stat) for stat in snapshot.statistics("lineno")[:top])
+            logger.info(f"tracemalloc peak {peak / 2 ** 20:.1f} MiB, top {top} allocations:\n{lines}")
+    else:
+        raise NotImplementedError(f"The profile mode {mode} hasn't been implemented")
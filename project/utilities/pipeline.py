@@ -0,0 +1,201 @@
+import contextvars
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, List, Tuple
+
+from project.utilities.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 4
+# How often a thread blocked on a queue checks whether the pipeline was stopped
+POLL_SECONDS = 0.1
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+@dataclass
+class StageStats:
+    """
+    Where the time of a pipeline stage went: running, waiting for an item from the stage before it, or waiting for
+    room in the queue of the stage after it.
+    """
+    name: str
+    items: int = 0
+    busy: float = 0.0
+    idle: float = 0.0
+    blocked: float = 0.0
+
+
+class _Stopped(Exception):
+    pass
+
+
+def _put(q: queue.Queue, item: Any, stop: threading.Event):
+    while True:
+        if stop.is_set():
+            raise _Stopped()
+        try:
+            q.put(item, timeout=POLL_SECONDS)
+            return
+        except queue.Full:
+            if stop.is_set():
+                raise _Stopped()
+
+
+def _get(q: queue.Queue, stop: threading.Event) -> Any:
+    while True:
+        try:
+            return q.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            if stop.is_set():
+                raise _Stopped()
+
+
+def _run_source(items: Iterator, out: queue.Queue, stats: StageStats, stop: threading.Event):
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                break
+            finally:
+                stats.busy += time.perf_counter() - started
+            stats.items += 1
+
+            started = time.perf_counter()
+            _put(out, item, stop)
+            stats.blocked += time.perf_counter() - started
+        _put(out, _DONE, stop)
+    except _Stopped:
+        pass
+    except BaseException as e:
+        try:
+            _put(out, _Failure(e), stop)
+        except _Stopped:
+            pass
+
+
+def _run_stage(func: Callable, inp: queue.Queue, out: queue.Queue, stats: StageStats, stop: threading.Event):
+    try:
+        while True:
+            started = time.perf_counter()
+            item = _get(inp, stop)
+            stats.idle += time.perf_counter() - started
+            if item is _DONE or isinstance(item, _Failure):
+                _put(out, item, stop)
+                return
+
+            started = time.perf_counter()
+            try:
+                result = func(item)
+            finally:
+                stats.busy += time.perf_counter() - started
+            stats.items += 1
+            if result is None:
+                continue
+
+            started = time.perf_counter()
+            _put(out, result, stop)
+            stats.blocked += time.perf_counter() - started
+    except _Stopped:
+        pass
+    except BaseException as e:
+        try:
+            _put(out, _Failure(e), stop)
+        except _Stopped:
+            pass
+
+
+def run_pipeline(
+        source: Tuple[str, Iterator],
+        stages: List[Tuple[str, Callable]],
+        queue_size: int = DEFAULT_QUEUE_SIZE
+) -> List[StageStats]:
+    """
+    Run the stages of a pipeline at the same time, connected by bounded queues, so e.g. the next page is fetched
+    while the last one is parsed and the one before it is written.
+
+    The source and every stage but the last run in their own thread, the last stage runs in the calling thread.
+    Items keep their order. A stage returning None drops the item. The first exception raised by any stage stops
+    the pipeline and is raised here, after the items before it have gone through the later stages.
+
+    Parameters
+    ----------
+    source
+        The name of the first stage and the iterator of the items it produces.
+    stages
+        The names and functions of the stages the items go through, in order.
+    queue_size
+        The number of items that can wait between two stages, a stage blocks when the queue after it is full.
+
+    Returns
+    -------
+    The time spent by every stage.
+    """
+    stop = threading.Event()
+    stats = [StageStats(source[0])] + [StageStats(name) for name, _ in stages]
+    queues = [queue.Queue(maxsize=max(queue_size, 1)) for _ in stages]
+
+    # Threads don't inherit context variables, copy them so the metrics labels of the caller apply to every stage
+    threads = [threading.Thread(target=contextvars.copy_context().run,
+                                args=(_run_source, source[1], queues[0], stats[0], stop),
+                                name=f"pipeline-{source[0]}", daemon=True)]
+    for i, (name, func) in enumerate(stages[:-1]):
+        threads.append(threading.Thread(target=contextvars.copy_context().run,
+                                        args=(_run_stage, func, queues[i], queues[i + 1], stats[i + 1], stop),
+                                        name=f"pipeline-{name}", daemon=True))
+    for thread in threads:
+        thread.start()
+
+    last, last_stats = stages[-1][1], stats[-1]
+    completed = False
+    try:
+        while True:
+            started = time.perf_counter()
+            item = queues[-1].get()
+            last_stats.idle += time.perf_counter() - started
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                raise item.error
+
+            started = time.perf_counter()
+            try:
+                last(item)
+            finally:
+                last_stats.busy += time.perf_counter() - started
+            last_stats.items += 1
+        completed = True
+    finally:
+        stop.set()
+        # A source stopped part way can be waiting on a slow call, e.g. a rate limit wait, it stops on its own
+        # when the call returns
+        for thread in threads if completed else threads[1:]:
+            thread.join()
+    return stats
+
+
+def report_utilization(stats: List[StageStats], seconds: float, **labels):
+    """
+    Log how busy every stage of a pipeline run was, and add the times to the stage timers of the metrics.
+    """
+    for stage in stats:
+        metrics.observe(f"pipeline_{stage.name}_busy", stage.busy, **labels)
+        metrics.observe(f"pipeline_{stage.name}_idle", stage.idle, **labels)
+        metrics.observe(f"pipeline_{stage.name}_blocked", stage.blocked, **labels)
+    breakdown = ", ".join(
+        f"{stage.name} {stage.busy / seconds:.0%} busy {stage.idle / seconds:.0%} idle "
+        f"{stage.blocked / seconds:.0%} blocked"
+        for stage in stats
+    ) if seconds > 0 else "no time spent"
+    logger.info(f"Pipeline utilization over {seconds:.2f}s: {breakdown}")
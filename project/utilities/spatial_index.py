@@ -0,0 +1,201 @@
+import logging
+import math
+from typing import Dict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_CELL_KM = 100.0
+# Rings of cells searched around a point before it is looked up in the coarser grid
+DEFAULT_MAX_RINGS = 2
+# The cells of the coarser grid are this many times larger, coarser grids are added while their cells are at most
+# MAX_CELL_KM
+COARSE_FACTOR = 8
+MAX_CELL_KM = 1000.0
+# Points looked up together, bounds the memory of the point/city pairs compared at once
+CHUNK_POINTS = 65_536
+
+_ring_offsets: Dict[int, np.ndarray] = {}
+
+
+def unit_vectors(lat, lng) -> np.ndarray:
+    """
+    Get the points on the unit sphere of coordinates in degrees, one (x, y, z) row per point.
+    """
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lng = np.radians(np.asarray(lng, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)])
+
+
+def chord_to_km(chord: np.ndarray) -> np.ndarray:
+    """
+    Convert straight line distances between points of the unit sphere to great circle distances in km.
+    """
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1.0))
+
+
+def km_to_chord(km: float) -> float:
+    """
+    Convert a great circle distance in km to the straight line distance between points of the unit sphere.
+    """
+    return 2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+def ring_offsets(ring: int) -> np.ndarray:
+    """
+    Get the (x, y, z) offsets of the cells at a ring distance of a cell, the cells on the surface of the cube of
+    ``2 * ring + 1`` cells around it.
+    """
+    if ring not in _ring_offsets:
+        steps = np.arange(-ring, ring + 1)
+        offsets = np.stack(np.meshgrid(steps, steps, steps, indexing="ij"), axis=-1).reshape(-1, 3)
+        _ring_offsets[ring] = offsets[np.abs(offsets).max(axis=1) == ring]
+    return _ring_offsets[ring]
+
+
+class CityIndex:
+    """
+    Nearest city lookup for whole arrays of coordinates.
+
+    The cities are placed on the unit sphere and bucketed in a 3D grid of cubes of about ``cell_km``, so cells are
+    the same size everywhere, poles included, and the straight line distances to the cities order them like the
+    great circle distances. The occupied cells are sorted, the cities of a cell are one slice of the sorted arrays.
+
+    A lookup searches the rings of cells around all the points at once, ring after ring, until the nearest city
+    found for a point is closer than any city outside the rings searched can be. The points left after
+    ``max_rings``, far out at sea, are looked up the same way in a grid of cells COARSE_FACTOR times larger, and the
+    coarsest grid searches until it finds them.
+    """
+
+    def __init__(self, lat, lng, cell_km: float = DEFAULT_CELL_KM, max_rings: int = DEFAULT_MAX_RINGS):
+        self.cell_km = cell_km
+        self.cell = km_to_chord(cell_km)
+        # Cells per axis of the cube around the sphere
+        self.size = math.ceil(2 / self.cell) + 1
+
+        xyz = unit_vectors(lat, lng)
+        rows = np.flatnonzero(np.isfinite(xyz).all(axis=1))
+        keys = self._keys(self._cells(xyz[rows]))
+        order = np.argsort(keys, kind="stable")
+        self._rows = rows[order]
+        self._xyz = xyz[self._rows]
+        # The cities of the cell self._cell_keys[i] are self._starts[i]:self._starts[i + 1] of the sorted arrays
+        self._cell_keys, starts = np.unique(keys[order], return_index=True)
+        self._starts = np.append(starts, len(self._rows))
+
+        coarse_km = cell_km * COARSE_FACTOR
+        self._coarse = CityIndex(lat, lng, coarse_km, max_rings) if coarse_km <= MAX_CELL_KM and len(rows) else None
+        # The coarsest grid searches until its rings hold the whole sphere
+        self.max_rings = max_rings if self._coarse is not None else self.size
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _cells(self, xyz: np.ndarray) -> np.ndarray:
+        return np.floor((xyz + 1) / self.cell).astype(np.int64)
+
+    def _keys(self, cells: np.ndarray) -> np.ndarray:
+        return (cells[:, 0] * self.size + cells[:, 1]) * self.size + cells[:, 2]
+
+    def nearest(self, lat, lng, max_km: float = None) -> (np.ndarray, np.ndarray):
+        """
+        Find the nearest city of every point.
+
+        Parameters
+        ----------
+        lat
+            The latitudes of the points, in degrees.
+        lng
+            The longitudes of the points, in degrees.
+        max_km
+            Only find cities within this distance of the points.
+
+        Returns
+        -------
+        The rows of the nearest cities in the arrays the index was built from, -1 for the points without coordinates
+        or without a city within max_km, and the distances to them in km, NaN where there is no city.
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        rows = np.full(len(lat), -1, dtype=np.int64)
+        km = np.full(len(lat), np.nan)
+        if len(self._rows) == 0:
+            return rows, km
+
+        points = np.flatnonzero(np.isfinite(lat) & np.isfinite(lng) & (np.abs(lat) <= 90))
+        max_chord = km_to_chord(max_km) if max_km is not None else np.inf
+        for start in range(0, len(points), CHUNK_POINTS):
+            chunk = points[start:start + CHUNK_POINTS]
+            chunk_rows, chord = self._nearest_chunk(unit_vectors(lat[chunk], lng[chunk]), max_chord)
+            found = chord <= max_chord
+            rows[chunk[found]] = chunk_rows[found]
+            km[chunk[found]] = chord_to_km(chord[found])
+        return rows, km
+
+    def _nearest_chunk(self, xyz: np.ndarray, max_chord: float) -> (np.ndarray, np.ndarray):
+        """
+        Find the nearest cities of points on the unit sphere.
+
+        Returns
+        -------
+        The rows of the nearest cities and the straight line distances to them, inf where none was found within
+        max_chord.
+        """
+        best = np.full(len(xyz), -1, dtype=np.int64)
+        best_chord = np.full(len(xyz), np.inf)
+        cells = self._cells(xyz)
+        pending = np.arange(len(xyz))
+
+        for ring in range(self.max_rings + 1):
+            if len(pending) == 0:
+                break
+            self._search_ring(ring, pending, xyz, cells, best, best_chord)
+            # A city outside the rings is more than ring cells away along one of the axes
+            bound = ring * self.cell
+            done = (best_chord[pending] <= bound) | (bound > max_chord)
+            pending = pending[~done]
+
+        rows = np.full(len(xyz), -1, dtype=np.int64)
+        found = best >= 0
+        rows[found] = self._rows[best[found]]
+        if len(pending):
+            rows[pending], best_chord[pending] = self._coarse._nearest_chunk(xyz[pending], max_chord)
+        return rows, best_chord
+
+    def _search_ring(self, ring: int, points: np.ndarray, xyz: np.ndarray, cells: np.ndarray, best: np.ndarray,
+                     best_chord: np.ndarray):
+        """
+        Compare every point with the cities of the cells of a ring around it, and keep the cities nearer than the
+        best found so far.
+        """
+        offsets = ring_offsets(ring)
+        ring_cells = (cells[points, None, :] + offsets[None, :, :]).reshape(-1, 3)
+        pair_points = np.repeat(points, len(offsets))
+        inside = ((ring_cells >= 0) & (ring_cells < self.size)).all(axis=1)
+        ring_cells, pair_points = ring_cells[inside], pair_points[inside]
+
+        keys = self._keys(ring_cells)
+        positions = np.minimum(np.searchsorted(self._cell_keys, keys), len(self._cell_keys) - 1)
+        occupied = self._cell_keys[positions] == keys
+        positions, pair_points = positions[occupied], pair_points[occupied]
+        if len(positions) == 0:
+            return
+
+        # One pair per point and city of the cells around it
+        starts = self._starts[positions]
+        counts = self._starts[positions + 1] - starts
+        group_starts = np.cumsum(counts) - counts
+        cities = np.repeat(starts - group_starts, counts) + np.arange(counts.sum())
+        pair_points = np.repeat(pair_points, counts)
+        chord = np.sqrt(((xyz[pair_points] - self._xyz[cities]) ** 2).sum(axis=1))
+
+        # The nearest pair of every point, the first city on ties
+        order = np.lexsort((cities, chord, pair_points))
+        first = order[np.flatnonzero(np.diff(pair_points[order], prepend=-1) != 0)]
+        points, nearest, nearest_chord = pair_points[first], cities[first], chord[first]
+        better = nearest_chord < best_chord[points]
+        best[points[better]] = nearest[better]
+        best_chord[points[better]] = nearest_chord[better]
@@ -1,72 +1,290 @@
 import logging
-import re
-from typing import List, Dict
+import multiprocessing
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 import unicodedata
 
+from project.twitter.schema import apply_schema
+from project.utilities.gazetteer import Gazetteer
+from project.utilities.lru_cache import LRUCache
+from project.utilities.metrics import metrics
 from project.utilities.world_cities import WorldCities
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_LOCATION_CACHE_SIZE = 100_000
+# The max distance from a tweet to the city its place is filled from
+DEFAULT_PLACE_MAX_KM = 50.0
 
-def _get_country_city(countries: List, location: str) -> (str, str):
+_gazetteers = weakref.WeakKeyDictionary()
+_gazetteers_lock = threading.Lock()
+
+# The reference used by clean_locations_chunk() in the workers of a cleaner pool
+_worker_world_cities = None
+
+
+def _get_gazetteer(world_cities: WorldCities) -> Gazetteer:
+    """
+    Get the Gazetteer of a WorldCities reference, built once per reference.
+    """
+    with _gazetteers_lock:
+        if world_cities not in _gazetteers:
+            _gazetteers[world_cities] = Gazetteer.from_world_cities(world_cities)
+        return _gazetteers[world_cities]
+
+
+def normalize_location(location: str) -> str:
     """
-    Parse city and country from location field by checking if a reference country is in the location provided
-    and pulling it out.
+    Lower case a location string and strip its accents so it can be looked up in the Gazetteer.
 
     Parameters
     ----------
-    countries
-        List of countries to loop through
     location
-        The location string to parse
+        The location string to normalize.
     """
-    city_lookup = strip_accents(location.lower().strip())
-    country_lookup = ""
+    return strip_accents(location.lower().strip())
 
-    for country in countries:
-        country_clean = country.lower().strip()
-        if country_clean in city_lookup:
-            city_lookup = city_lookup.replace(country_clean, "")
-            country_lookup = country_clean
 
-    return country_lookup, re.sub(r'[^\w\s]', "", city_lookup).strip()
+# Profile locations repeat a lot across batches ("London, England", "USA"), so the resolution of every raw location
+# string is kept in a bounded LRU cache. The WorldCities reference is part of the key, so a changed reference file
+# never reuses entries.
+_location_cache = LRUCache(DEFAULT_LOCATION_CACHE_SIZE)
 
 
-def clean_locations(user_locations: pd.DataFrame, world_cities_file: str) -> Dict:
+def get_location_cache() -> LRUCache:
+    """
+    Get the location cache of this process, e.g. to log its hits and misses.
     """
-    Loop through locations to extract and clean the country and city fields as well as lat long values using
+    return _location_cache
+
+
+def set_location_cache_size(maxsize: Optional[int]):
+    """
+    Replace the location cache with an empty one of the given size, the least recently used locations are evicted
+    once it is full. The cache is kept when it already has that size.
+
+    Parameters
+    ----------
+    maxsize
+        The number of distinct locations to keep, 0 disables the cache and None makes it unbounded.
+    """
+    global _location_cache
+    if _location_cache.maxsize != maxsize:
+        _location_cache = LRUCache(maxsize)
+
+
+def clean_locations(user_locations: pd.DataFrame, world_cities_file: str, workers: int = 1) -> Dict:
+    """
+    Resolve the locations to extract and clean the country and city fields as well as lat long values using
     a world_cities file as a reference table.
 
+    With more than 1 worker the locations are split into chunks that are cleaned by a pool of processes, with the
+    same results as the serial path.
+
     Parameters
     ----------
     user_locations
         The user locations DataFrame to get location data for.
     world_cities_file
         The filepath to the reference table to use for country, city, and lat/long values.
+    workers
+        The number of processes to clean the locations with.
     """
     df_locations = user_locations.dropna()
+    if workers <= 1 or len(df_locations) < 2:
+        return _clean_locations(df_locations, WorldCities.load(world_cities_file))
+
+    # A few chunks per worker keeps the workers busy when some chunks resolve faster than others
+    chunk_size = max(-(-len(df_locations) // (workers * 4)), 1)
+    chunks = [df_locations.iloc[start:start + chunk_size] for start in range(0, len(df_locations), chunk_size)]
+
+    user_location = {}
+    with create_cleaner_pool(world_cities_file, workers) as pool:
+        for chunk_location in pool.map(clean_locations_chunk, chunks):
+            user_location.update(chunk_location)
+    return user_location
+
+
+def create_cleaner_pool(world_cities_file: str, workers: int) -> ProcessPoolExecutor:
+    """
+    Create a pool of processes to run clean_locations_chunk() with.
+
+    The world cities on disk cache is built before the pool starts, so every worker memory-maps the same cache files
+    and shares their pages instead of parsing the CSV. Workers are started from a fork server, which is safe when the
+    parent has threads running, falling back to spawn where fork servers aren't available. Every worker has a location
+    cache of the size of the one of this process.
+
+    Parameters
+    ----------
+    world_cities_file
+        The filepath to the reference table to use for country, city, and lat/long values.
+    workers
+        The number of processes.
+    """
+    WorldCities.load(world_cities_file)
+    location_cache_size = _location_cache.maxsize
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+    else:
+        context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_cleaner_worker,
+                               initargs=(world_cities_file, location_cache_size))
+
+
+def _init_cleaner_worker(world_cities_file: str, location_cache_size: int):
+    global _worker_world_cities
+    _worker_world_cities = WorldCities.load(world_cities_file)
+    set_location_cache_size(location_cache_size)
+
+
+def clean_locations_chunk(user_locations: pd.DataFrame) -> Dict:
+    """
+    Clean a chunk of user locations in a worker of the pool made by create_cleaner_pool().
+
+    Parameters
+    ----------
+    user_locations
+        The user locations DataFrame, without missing values.
+    """
+    return _clean_locations(user_locations, _worker_world_cities)
 
-    wc = WorldCities(world_cities_file)
+
+def _clean_locations(df_locations: pd.DataFrame, wc: WorldCities) -> Dict:
+    locations = df_locations["location"].tolist()
+    resolved = _resolve_locations(locations, wc)
 
     user_location = {}
-    for index, row in df_locations.iterrows():
-        country_lookup, city_lookup = _get_country_city(wc.countries, row["location"])
-        country_cities_lookup = wc.country_city_ref
-        try:
-            lookup_value = country_lookup.strip() + city_lookup.strip()
-            user_location[row["author_id"]] = {
-                "lat": country_cities_lookup[lookup_value]["lat"],
-                "lon": country_cities_lookup[lookup_value]["lon"],
+    for author_id, location in zip(df_locations["author_id"], locations):
+        country_lookup, city_lookup, author_lat, author_lon, author_found = resolved[location]
+        if author_found:
+            user_location[author_id] = {
+                "lat": author_lat,
+                "lon": author_lon,
                 "city": city_lookup,
                 "country": country_lookup
             }
-        except KeyError:
+        else:
             logger.warning(f"{country_lookup} and {city_lookup} not found")
     return user_location
 
 
+@metrics.timed("resolve_locations")
+def _resolve_locations(locations: List[str], wc: WorldCities) -> Dict[str, Tuple]:
+    """
+    Resolve the distinct locations to their (country, city, lat, lon, found), taking the ones already resolved from
+    the location cache and resolving the others in one batch.
+    """
+    resolved = {}
+    missing = []
+    for location in dict.fromkeys(locations):
+        entry = _location_cache.get((wc, location))
+        if entry is None:
+            missing.append(location)
+        else:
+            resolved[location] = entry
+
+    if missing:
+        gazetteer = _get_gazetteer(wc)
+        countries, cities = zip(*(gazetteer.resolve(normalize_location(location)) for location in missing))
+        keys = [country.strip() + city.strip() for country, city in zip(countries, cities)]
+        lat, lon, found = wc.country_city_ref.lookup(keys)
+        metrics.inc("locations_resolved", len(missing))
+        for entry in zip(missing, countries, cities, lat.tolist(), lon.tolist(), found.tolist()):
+            resolved[entry[0]] = entry[1:]
+            _location_cache.put((wc, entry[0]), entry[1:])
+    return resolved
+
+
+@metrics.timed("enrich")
+def add_author_locations(df_tweets: pd.DataFrame, user_location: Dict) -> pd.DataFrame:
+    """
+    Add the author locations to the tweets with a single left merge on the author id. The lat, long, city and
+    country of the tweets whose author was found are replaced, the other tweets are left as they are.
+
+    Parameters
+    ----------
+    df_tweets
+        The tweets DataFrame, with an ``author_id`` (or legacy ``author id``) column.
+    user_location
+        The author_id -> {"lat", "lon", "city", "country"} lookup built by clean_locations.
+
+    Returns
+    -------
+    The tweets DataFrame with the location columns updated.
+    """
+    author_column = "author_id" if "author_id" in df_tweets.columns else "author id"
+
+    df_locations = pd.DataFrame.from_dict(user_location, orient="index", columns=["lat", "lon", "city", "country"])
+    # The lookup uses lon while the tweets use long
+    df_locations = df_locations.rename(columns={"lon": "long"})
+
+    merged = df_tweets[[author_column]].merge(df_locations, how="left", left_on=author_column, right_index=True,
+                                              indicator=True)
+    found = (merged["_merge"] == "both").to_numpy()
+    logger.info(f"{found.sum()} of {len(found)} tweets matched an author location")
+
+    df_tweets = df_tweets.copy()
+    for column in ["lat", "long", "city", "country"]:
+        values = merged[column].to_numpy()
+        if column in df_tweets.columns:
+            df_tweets[column] = df_tweets[column].where(~found, values)
+        else:
+            df_tweets[column] = pd.Series(values, index=df_tweets.index).where(found)
+    return df_tweets
+
+
+@metrics.timed("reverse_geocode")
+def add_places(df_tweets: pd.DataFrame, world_cities_file: str, max_km: float = DEFAULT_PLACE_MAX_KM) -> pd.DataFrame:
+    """
+    Fill the place_name, place_country and place_country_code of the tweets with coordinates but without a place
+    from the nearest city of the world cities reference, without calling the API. The cities are looked up for
+    the whole columns at once in the spatial index of the reference.
+
+    The parser keeps the [longitude, latitude] order of the GeoJSON ``geo.coordinates``, so the lat column of the
+    parsed tweets holds the longitude and the long column the latitude. The tweets add_author_locations replaced the
+    coordinates of, the ones with a city, are left as they are.
+
+    Parameters
+    ----------
+    df_tweets
+        The tweets DataFrame.
+    world_cities_file
+        The filepath to the reference table of the cities.
+    max_km
+        The max distance from a tweet to the city its place is filled from, None for the nearest city at any
+        distance.
+
+    Returns
+    -------
+    The tweets DataFrame with the places filled.
+    """
+    missing = df_tweets["place_name"].isna() & df_tweets["lat"].notna() & df_tweets["long"].notna()
+    if "city" in df_tweets.columns:
+        missing &= df_tweets["city"].isna()
+    positions = np.flatnonzero(missing.to_numpy())
+
+    wc = WorldCities.load(world_cities_file)
+    rows, _ = wc.city_index.nearest(df_tweets["long"].to_numpy(dtype=np.float64)[positions],
+                                    df_tweets["lat"].to_numpy(dtype=np.float64)[positions], max_km)
+    found = rows >= 0
+    positions, rows = positions[found], rows[found]
+    logger.info(f"{len(positions)} of {len(missing)} tweets got a place from the nearest city, "
+                f"{int(missing.sum()) - len(positions)} have no city within {max_km} km")
+
+    df_tweets = df_tweets.copy()
+    for column, names in zip(["place_name", "place_country", "place_country_code"], wc.names(rows)):
+        values = df_tweets[column].to_numpy(dtype=object, copy=True)
+        values[positions] = names
+        df_tweets[column] = values
+    return apply_schema(df_tweets)
+
+
 def strip_accents(string_value: str) -> str:
     """
     Replace accented characters e.g. é with e
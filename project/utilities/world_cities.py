@@ -1,24 +1,256 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional
+
+import numpy as np
 import pandas as pd
 
+from project.utilities.spatial_index import CityIndex
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 2
+COLUMNS = ["country", "city_ascii", "lat", "lng", "population"]
+# The names of the cities as written in the reference, for the places filled from coordinates
+NAME_COLUMNS = ["city", "iso2"]
+
+
+class CountryCityRef(Mapping):
+    """
+    Read only ``country + city_ascii -> {"lat", "lon"}`` lookup backed by a sorted key array.
+
+    Keys are found with a binary search over the (possibly memory-mapped) key array, so no dictionary has to be
+    built when the reference is loaded from the cache.
+    """
+
+    def __init__(self, keys: np.ndarray, rows: np.ndarray, lat: np.ndarray, lng: np.ndarray):
+        self._keys = keys
+        self._rows = rows
+        self._lat = lat
+        self._lng = lng
+
+    def _position(self, key) -> int:
+        if not isinstance(key, str):
+            raise KeyError(key)
+        position = int(np.searchsorted(self._keys, key))
+        if position == len(self._keys) or self._keys[position] != key:
+            raise KeyError(key)
+        return position
+
+    def __getitem__(self, key) -> Dict:
+        row = self._rows[self._position(key)]
+        return {"lat": self._lat[row].item(), "lon": self._lng[row].item()}
+
+    def __contains__(self, key) -> bool:
+        try:
+            self._position(key)
+        except KeyError:
+            return False
+        return True
+
+    def lookup(self, keys) -> (np.ndarray, np.ndarray, np.ndarray):
+        """
+        Look up many keys with one vectorized binary search.
+
+        Parameters
+        ----------
+        keys
+            The country + city keys to look up.
+
+        Returns
+        -------
+        The lat and lon arrays, NaN where the key isn't found, and the boolean array of the keys found.
+        """
+        keys = np.asarray(keys, dtype=str)
+        if len(self._keys) == 0 or len(keys) == 0:
+            missing = np.full(len(keys), np.nan)
+            return missing, missing.copy(), np.zeros(len(keys), dtype=bool)
+        positions = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+        found = self._keys[positions] == keys
+        rows = self._rows[positions]
+        lat = np.where(found, self._lat[rows], np.nan)
+        lon = np.where(found, self._lng[rows], np.nan)
+        return lat, lon, found
+
+    def __iter__(self) -> Iterator[str]:
+        return (str(key) for key in self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
 
 class WorldCities:
+    """
+    The world cities reference table, with the set of countries and the country + city -> lat/lon lookup.
+
+    When a ``cache_dir`` is given the cleaned columns and the key index are saved there as ``.npy`` files the first
+    time the CSV is read, and memory-mapped on the next loads instead of parsing the CSV. The cache is rebuilt when
+    the size, mtime or contents of the reference file change.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, file_path, cache_dir: str = None):
+        self.file_path = file_path
+        arrays = self._load_cache(cache_dir) if cache_dir is not None else None
+        if arrays is None:
+            arrays = self._read_csv()
+            if cache_dir is not None:
+                self._save_cache(cache_dir, arrays)
+
+        self._arrays = arrays
+        self._df_cities = None
+        self._city_index = None
+        self._city_index_lock = threading.Lock()
+        self.countries = set(np.unique(arrays["country"]).tolist())
+        self.country_city_ref = CountryCityRef(arrays["keys"], arrays["rows"], arrays["lat"], arrays["lng"])
+
+    @classmethod
+    def load(cls, file_path, cache_dir: Optional[str] = "") -> "WorldCities":
+        """
+        Get the WorldCities for a reference file, reusing the instance already loaded in this process while the file
+        hasn't changed.
+
+        Parameters
+        ----------
+        file_path
+            The reference CSV file.
+        cache_dir
+            The directory of the on disk cache, defaults to a ``.cache`` directory next to the reference file.
+            None disables the on disk cache.
+        """
+        if cache_dir == "":
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), ".cache")
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size, cache_dir)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(file_path, cache_dir)
+            return cls._instances[key]
+
+    @property
+    def df_cities(self) -> pd.DataFrame:
+        if self._df_cities is None:
+            self._df_cities = pd.DataFrame({column: np.asarray(self._arrays[column]) for column in COLUMNS})
+        return self._df_cities
+
+    @property
+    def city_index(self) -> CityIndex:
+        """
+        The spatial index of the coordinates of the cities, built on first use.
+        """
+        with self._city_index_lock:
+            if self._city_index is None:
+                self._city_index = CityIndex(self._arrays["lat"], self._arrays["lng"])
+            return self._city_index
+
+    def names(self, rows: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
+        """
+        Get the city, country and ISO 3166 alpha-2 country code of rows of the reference, e.g. the rows found by
+        city_index, as written in the reference file.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        return (np.asarray(self._arrays["city"])[rows], np.asarray(self._arrays["country_name"])[rows],
+                np.asarray(self._arrays["iso2"])[rows])
+
+    def _read_csv(self) -> Dict[str, np.ndarray]:
+        # Read as written, the code of Namibia is NA
+        df_cities = pd.read_csv(self.file_path, usecols=lambda column: column in COLUMNS + NAME_COLUMNS,
+                                converters={"iso2": str})
+        if "population" not in df_cities.columns:
+            df_cities["population"] = np.nan
+        df_cities = df_cities.dropna(subset=["country", "city_ascii"])
+        names = {
+            "city": df_cities["city"].fillna(df_cities["city_ascii"]) if "city" in df_cities.columns
+            else df_cities["city_ascii"],
+            "country_name": df_cities["country"],
+            "iso2": df_cities["iso2"] if "iso2" in df_cities.columns else pd.Series("", index=df_cities.index)
+        }
+        names = {name: values.to_numpy(dtype=str) for name, values in names.items()}
+        df_cities["country"] = df_cities["country"].str.lower()
+        df_cities["city_ascii"] = df_cities["city_ascii"].str.lower()
+
+        # Later rows win for duplicate keys, as they did when the lookup was built as a dictionary row by row
+        keys = df_cities["country"] + df_cities["city_ascii"]
+        unique = ~keys.duplicated(keep="last").to_numpy()
+        keys = keys.to_numpy(dtype=str)[unique]
+        rows = np.flatnonzero(unique)
+        order = np.argsort(keys, kind="stable")
+
+        return {
+            "country": df_cities["country"].to_numpy(dtype=str),
+            "city_ascii": df_cities["city_ascii"].to_numpy(dtype=str),
+            "lat": df_cities["lat"].to_numpy(dtype=np.float64),
+            "lng": df_cities["lng"].to_numpy(dtype=np.float64),
+            "population": pd.to_numeric(df_cities["population"], errors="coerce").to_numpy(dtype=np.float64),
+            "keys": keys[order],
+            "rows": rows[order].astype(np.int64),
+            **names
+        }
+
+    def _cache_path(self, cache_dir: str) -> str:
+        return os.path.join(cache_dir, os.path.basename(self.file_path))
+
+    def _file_hash(self) -> str:
+        sha = hashlib.sha256()
+        with open(self.file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        return sha.hexdigest()
+
+    def _load_cache(self, cache_dir: str) -> Optional[Dict[str, np.ndarray]]:
+        path = self._cache_path(cache_dir)
+        try:
+            with open(os.path.join(path, "meta.json"), "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        stat = os.stat(self.file_path)
+        if meta.get("version") != CACHE_VERSION or meta.get("size") != stat.st_size:
+            return None
+        if meta.get("mtime_ns") != stat.st_mtime_ns:
+            # Touched but maybe not changed, compare the contents before rebuilding
+            if meta.get("sha256") != self._file_hash():
+                return None
+            meta["mtime_ns"] = stat.st_mtime_ns
+            self._write_meta(path, meta)
+
+        try:
+            arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in meta["arrays"]}
+        except (OSError, ValueError):
+            return None
+        logger.info(f"Loaded world cities from cache {path}")
+        return arrays
+
+    def _save_cache(self, cache_dir: str, arrays: Dict[str, np.ndarray]):
+        path = self._cache_path(cache_dir)
+        try:
+            os.makedirs(path, exist_ok=True)
+            for name, array in arrays.items():
+                tmp = os.path.join(path, f"{name}.tmp.npy")
+                np.save(tmp, array)
+                os.replace(tmp, os.path.join(path, f"{name}.npy"))
+            stat = os.stat(self.file_path)
+            # The meta file is written last, so a cache missing any array is never read
+            self._write_meta(path, {
+                "version": CACHE_VERSION,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": self._file_hash(),
+                "arrays": list(arrays)
+            })
+        except OSError as e:
+            logger.warning(f"Could not write world cities cache to {path}: {e}")
 
-    def __init__(self, file_path):
-        self.df_cities = pd.read_csv(file_path)
-        self._clean_country_city()
-        self._build_country_city_ref()
-        self.countries = set(self.df_cities["country"].to_list())
-        self.country_city_ref = self._build_country_city_ref()
-
-    def _clean_country_city(self):
-        self.df_cities['country'] = self.df_cities['country'].str.lower()
-        self.df_cities['city_ascii'] = self.df_cities['city_ascii'].str.lower()
-
-    def _build_country_city_ref(self):
-        cities_lookup = {}
-        for index, row in self.df_cities.iterrows():
-            cities_lookup[row["country"] + row["city_ascii"]] = {
-                "lat": row["lat"],
-                "lon": row["lng"]
-            }
-        return cities_lookup
+    @staticmethod
+    def _write_meta(path: str, meta: Dict):
+        tmp = os.path.join(path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(path, "meta.json"))
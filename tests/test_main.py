@@ -0,0 +1,19 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_help_does_not_import_heavy_modules(tmp_path):
+    # Run from another directory, as a cron job would
+    code = ("import runpy, sys; sys.argv = ['main.py', 'search', '--help']\n"
+            "try:\n    runpy.run_path(sys.argv_path, run_name='__main__')\nexcept SystemExit:\n    pass\n"
+            "heavy = ['pandas', 'requests', 'yaml', 'project.twitter.runner']\n"
+            "print('imported:' + ','.join(m for m in heavy if m in sys.modules))")
+    code = code.replace("sys.argv_path", repr(os.path.join(ROOT, "project", "main.py")))
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, capture_output=True, text=True,
+                            env={**os.environ, "PYTHONPATH": ROOT}, check=True)
+
+    assert "--query" in result.stdout
+    assert result.stdout.strip().splitlines()[-1] == "imported:"
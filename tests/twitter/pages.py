@@ -0,0 +1,60 @@
+"""
+Synthetic search API response pages shared by the tests and the benchmarks.
+"""
+import random
+from typing import Dict, List
+
+LANGS = ["en", "es", "fr", "de", "pt", "ja", "ar", "und"]
+SOURCES = ["Twitter for iPhone", "Twitter for Android", "Twitter Web App", "Instagram"]
+COUNTRIES = [("United States", "US"), ("United Kingdom", "GB"), ("Spain", "ES"), ("Nigeria", "NG"), ("Japan", "JP")]
+
+
+def tweet_page(n_tweets: int, n_places: int = 50, geo_ratio: float = 0.5, seed: int = 0) -> Dict:
+    """
+    Build a synthetic search API response page with ``n_tweets`` tweets, of which ``geo_ratio`` carry geo data
+    pointing at one of ``n_places`` places in the includes.
+    """
+    rnd = random.Random(seed)
+    places = []
+    for i in range(n_places):
+        country, country_code = COUNTRIES[i % len(COUNTRIES)]
+        places.append({
+            "id": f"place{i:06d}",
+            "name": f"City {i}",
+            "full_name": f"City {i}, {country}",
+            "country": country,
+            "country_code": country_code
+        })
+
+    data = []
+    for i in range(n_tweets):
+        tweet = {
+            "id": str(1500000000000000000 + seed * 10_000_000 + i),
+            "author_id": str(rnd.randrange(10**8, 10**9)),
+            "created_at": f"2022-03-13T{rnd.randrange(24):02d}:{rnd.randrange(60):02d}:{rnd.randrange(60):02d}.000Z",
+            "lang": rnd.choice(LANGS),
+            "source": rnd.choice(SOURCES),
+            "text": f"Synthetic tweet number {i} about an earthquake",
+            "public_metrics": {
+                "retweet_count": rnd.randrange(100),
+                "reply_count": rnd.randrange(100),
+                "like_count": rnd.randrange(1000),
+                "quote_count": rnd.randrange(10)
+            }
+        }
+        if rnd.random() < geo_ratio:
+            tweet["geo"] = {
+                "place_id": places[rnd.randrange(n_places)]["id"],
+                "coordinates": {"type": "Point", "coordinates": [rnd.uniform(-180, 180), rnd.uniform(-90, 90)]}
+            }
+        data.append(tweet)
+
+    return {
+        "data": data,
+        "includes": {"places": places},
+        "meta": {"result_count": n_tweets, "newest_id": data[-1]["id"], "oldest_id": data[0]["id"]}
+    }
+
+
+def tweet_pages(n_pages: int, page_size: int = 100, **kwargs) -> List[Dict]:
+    return [tweet_page(page_size, seed=page, **kwargs) for page in range(n_pages)]
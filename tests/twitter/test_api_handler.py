@@ -0,0 +1,95 @@
+import json
+import time
+
+import pytest
+import requests
+
+from project.twitter.api_handler import TwitterApiError, TwitterClient
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self._payload = payload or {}
+        self.headers = headers or {}
+        self.text = json.dumps(self._payload)
+        self.content = self.text.encode()
+
+    def json(self):
+        return self._payload
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.headers = {}
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append(params)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def close(self):
+        pass
+
+
+def make_client(responses, **kwargs):
+    sleeps = []
+    client = TwitterClient(headers={"Authorization": "Bearer test"}, session=FakeSession(responses),
+                           sleep=sleeps.append, **kwargs)
+    return client, sleeps
+
+
+def test_get_returns_json_and_counts_stats():
+    client, sleeps = make_client([FakeResponse(200, {"data": []})])
+
+    assert client.get("https://api/search", {"query": "a"}, "token") == {"data": []}
+    assert client.session.calls == [{"query": "a", "next_token": "token"}]
+    assert client.session.headers == {"Authorization": "Bearer test"}
+
+    stats = client.stats["https://api/search"]
+    assert stats.requests == 1
+    assert stats.retries == 0
+    assert stats.bytes == len(str({"data": []}))
+    assert sleeps == []
+
+
+def test_get_retries_transient_errors():
+    client, sleeps = make_client([FakeResponse(503), requests.ConnectionError("reset"), FakeResponse(200, {"a": 1})])
+
+    assert client.get("https://api/search", {}) == {"a": 1}
+    assert client.stats["https://api/search"].retries == 2
+    assert len(sleeps) == 2
+
+
+def test_get_raises_on_non_retryable_error():
+    client, _ = make_client([FakeResponse(400, {"error": "bad"})])
+
+    with pytest.raises(TwitterApiError) as e:
+        client.get("https://api/search", {})
+    assert e.value.status_code == 400
+    assert client.stats["https://api/search"].errors == 1
+
+
+def test_get_gives_up_after_max_retries():
+    client, sleeps = make_client([FakeResponse(500)] * 3, max_retries=2)
+
+    with pytest.raises(TwitterApiError):
+        client.get("https://api/search", {})
+    assert len(sleeps) == 2
+
+
+def test_get_waits_for_reset_on_429():
+    reset = str(time.time() + 0.3)
+    client, sleeps = make_client([
+        FakeResponse(429, headers={"x-rate-limit-remaining": "0", "x-rate-limit-reset": reset}),
+        FakeResponse(200, {"a": 1})
+    ])
+
+    started = time.monotonic()
+    assert client.get("https://api/search", {}) == {"a": 1}
+    assert time.monotonic() - started >= 0.25
+    assert sleeps == []
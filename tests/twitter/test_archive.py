@@ -0,0 +1,145 @@
+import json
+import threading
+
+import pandas as pd
+import pytest
+
+from project.twitter import archive as archive_module
+from project.twitter import decoding
+from project.twitter.archive import RawArchive, archive_files, iter_archive, reparse_archive
+from project.twitter.checkpoint import CheckpointStore
+from project.twitter.decoding import decode_search_page
+from project.twitter.parser import DF_HEADERS, parse_responses
+from project.twitter.seen_ids import SeenIdIndex
+from project.twitter.sinks import CsvSink
+from tests.twitter.pages import tweet_page
+from tests.twitter.test_runner import FakeClient, _search_window
+
+
+@pytest.mark.parametrize("extension", ["gz", "zst"])
+def test_archive_appends_pages(tmp_path, extension):
+    if extension == "zst":
+        pytest.importorskip("zstandard")
+    path = str(tmp_path / f"20220313.ndjson.{extension}")
+    pages = [tweet_page(5, seed=seed) for seed in range(3)]
+
+    with RawArchive(path) as archive:
+        archive.write(json.dumps(pages[0], indent=2).encode())
+        archive.write(json.dumps(pages[1]).encode())
+    with RawArchive(path, append=True) as archive:
+        archive.write(json.dumps(pages[2]).encode())
+
+    assert list(iter_archive(path, json.loads)) == pages
+
+
+def test_decode_search_page_keeps_parsed_fields(monkeypatch):
+    page = tweet_page(20, seed=1)
+    page["includes"]["users"] = [{"id": "1", "name": "someone"}]
+    content = json.dumps(page).encode()
+
+    decoded = decode_search_page(content)
+    monkeypatch.setattr(decoding, "_search_page_decoder", None)
+    full = decode_search_page(content)
+
+    assert "users" in full["includes"]
+    pd.testing.assert_frame_equal(parse_responses(DF_HEADERS, [decoded])[1], parse_responses(DF_HEADERS, [full])[1])
+    assert decoded["meta"] == page["meta"]
+
+
+@pytest.mark.parametrize("installed", [True, False])
+def test_decode_json_without_orjson(monkeypatch, installed):
+    if installed:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(decoding, "orjson", None)
+    page = tweet_page(5)
+
+    assert decoding.decode_json(json.dumps(page).encode()) == page
+
+
+def test_decode_search_page_falls_back_on_unexpected_types():
+    pytest.importorskip("msgspec")
+    page = tweet_page(5)
+    page["data"][0]["lang"] = None
+
+    assert decode_search_page(json.dumps(page).encode()) == page
+
+
+def test_archive_without_zstandard(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_module, "zstandard", None)
+    path = tmp_path / "20220313.ndjson.zst"
+    path.write_bytes(b"")
+
+    assert archive_module.archive_extension() == "gz"
+    with pytest.raises(ImportError):
+        RawArchive(str(path))
+    with pytest.raises(ImportError):
+        list(iter_archive(str(path)))
+
+
+def test_reparse_archive_matches_search(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(archive_module, "zstandard", None)
+
+    _search_window(FakeClient(), CheckpointStore("checkpoints.sqlite"), archive=True)
+    searched = pd.read_csv("project/data/20220313_tweets.csv")
+    assert archive_files("tweets") == ["project/data/raw/tweets/20220313.ndjson.gz"]
+
+    assert reparse_archive("tweets") == len(searched)
+    pd.testing.assert_frame_equal(pd.read_csv("project/data/20220313_tweets.csv"), searched)
+
+
+def test_reparse_archive_keeps_rows_missing_from_the_archive(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(archive_module, "zstandard", None)
+    checkpoints = CheckpointStore("checkpoints.sqlite")
+    seen_ids = SeenIdIndex.open("quake", "tweets", "csv", "seen_ids")
+
+    _search_window(FakeClient(), checkpoints, archive=True, seen_ids=seen_ids)
+    searched = pd.read_csv("project/data/20220313_tweets.csv")
+    # Rows added to the day by a run without an archive
+    state = checkpoints.get("quake", "tweets", "csv", "20220313")
+    state.rows_written += 10
+    checkpoints.save("quake", "tweets", "csv", "20220313", state)
+
+    with pytest.raises(ValueError):
+        reparse_archive("tweets", checkpoint_db="checkpoints.sqlite", seen_ids_dir="seen_ids")
+    pd.testing.assert_frame_equal(pd.read_csv("project/data/20220313_tweets.csv"), searched)
+
+    assert reparse_archive("tweets", checkpoint_db="checkpoints.sqlite", seen_ids_dir="seen_ids",
+                           force=True) == len(searched)
+    assert checkpoints.get("quake", "tweets", "csv", "20220313").rows_written == len(searched)
+    reloaded = SeenIdIndex.open("quake", "tweets", "csv", "seen_ids")
+    assert len(reloaded) == len(seen_ids)
+
+
+def test_archive_write_after_a_failed_window_is_dropped(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(archive_module, "zstandard", None)
+    released = threading.Event()
+    errors = []
+
+    class SlowClient(FakeClient):
+        def get(self, url, params, next_token=None, **kwargs):
+            if int(next_token or 0) >= 2:
+                # Still waiting on the API when the write stage fails
+                released.wait(5)
+            try:
+                return super().get(url, params, next_token, **kwargs)
+            except Exception as e:
+                errors.append(e)
+                raise
+
+    def failing_write(self, df):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(CsvSink, "_write", failing_write)
+    with pytest.raises(OSError):
+        _search_window(SlowClient(pages=6), CheckpointStore("checkpoints.sqlite"), archive=True)
+    fetch_threads = [thread for thread in threading.enumerate() if thread.name == "pipeline-fetch"]
+    released.set()
+    for thread in fetch_threads:
+        thread.join(5)
+
+    assert errors == []
+    assert len(list(iter_archive("project/data/raw/tweets/20220313.ndjson.gz"))) == 2
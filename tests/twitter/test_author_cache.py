@@ -0,0 +1,27 @@
+from project.twitter.author_cache import AuthorLocationCache
+
+
+def test_author_cache_round_trip(tmp_path):
+    with AuthorLocationCache(str(tmp_path / "authors.sqlite")) as cache:
+        cache.put_many({
+            "1": {"location": "camas, spain", "lat": 37.402, "lon": -6.0332, "city": "camas", "country": "spain"},
+            "2": {"location": None}
+        })
+
+        entries = cache.get_many(["1", "2", "3", "1"])
+
+    assert entries == {
+        "1": {"location": "camas, spain", "lat": 37.402, "lon": -6.0332, "city": "camas", "country": "spain"},
+        "2": {"location": None, "lat": None, "lon": None, "city": None, "country": None}
+    }
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert cache.hit_rate == 2 / 3
+
+
+def test_author_cache_expires_entries(tmp_path):
+    with AuthorLocationCache(str(tmp_path / "authors.sqlite")) as cache:
+        cache.put_many({"1": {"location": "camas, spain"}})
+
+    with AuthorLocationCache(str(tmp_path / "authors.sqlite"), ttl_days=0) as cache:
+        assert cache.get_many(["1"]) == {}
+        assert cache.misses == 1
@@ -0,0 +1,64 @@
+import os
+
+import pandas as pd
+import pytest
+
+from project.twitter.batch import QuerySpec, Schedule, _WindowTask, load_queries, order_windows, run_batch
+from project.twitter.config.configuration import set_config
+from project.twitter.mock_server import MockTwitterServer
+
+
+def test_load_queries_applies_defaults(tmp_path):
+    queries_file = tmp_path / "queries.yaml"
+    queries_file.write_text("defaults:\n  days: 2\n  max_count: 50\nqueries:\n"
+                            "  - query: quake\n    filename: quake\n    priority: 5\n"
+                            "  - query: flood\n    filename: flood\n    days: 1\n")
+
+    specs = load_queries(str(queries_file))
+
+    assert specs == [QuerySpec("quake", "quake", max_count=50, days=2, priority=5),
+                     QuerySpec("flood", "flood", max_count=50, days=1)]
+
+
+def test_load_queries_rejects_shared_filenames(tmp_path):
+    queries_file = tmp_path / "queries.yaml"
+    queries_file.write_text("queries:\n  - query: quake\n    filename: tweets\n"
+                            "  - query: flood\n    filename: tweets\n")
+
+    with pytest.raises(ValueError):
+        load_queries(str(queries_file))
+
+
+def test_order_windows():
+    low, high = QuerySpec("low", "low"), QuerySpec("high", "high", priority=1)
+    tasks = [_WindowTask(spec, query_index, i, None, None)
+             for query_index, spec in enumerate([low, high]) for i in range(2)]
+
+    fair = order_windows(tasks, Schedule.FAIR)
+    priority = order_windows(tasks, Schedule.PRIORITY)
+
+    assert [(task.spec.query, task.window_index) for task in fair] == [("low", 0), ("high", 0), ("low", 1),
+                                                                       ("high", 1)]
+    assert [(task.spec.query, task.window_index) for task in priority] == [("high", 0), ("high", 1), ("low", 0),
+                                                                           ("low", 1)]
+
+
+def test_run_batch_writes_every_query(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    specs = [QuerySpec("quake", "quake", max_count=40, days=2, max_results=20),
+             QuerySpec("flood", "flood", max_count=40, days=1, max_results=20, priority=1)]
+
+    with MockTwitterServer(pages=3) as server:
+        monkeypatch.setenv("TWITTER_API_URL", server.url)
+        set_config(None)
+        try:
+            scanned = run_batch(specs, concurrency=2, schedule=Schedule.PRIORITY, checkpoint_db="checkpoints.sqlite")
+        finally:
+            set_config(None)
+
+    assert set(scanned) == {"quake", "flood"}
+    assert all(count > 0 for count in scanned.values())
+    files = [f for f in os.listdir("project/data") if f.endswith(".csv")]
+    assert len([f for f in files if f.endswith("_quake.csv")]) == 3
+    assert len([f for f in files if f.endswith("_flood.csv")]) == 2
+    assert all(len(pd.read_csv(os.path.join("project/data", f))) > 0 for f in files)
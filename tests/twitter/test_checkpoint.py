@@ -0,0 +1,29 @@
+from project.twitter.checkpoint import CheckpointStore, WindowState
+
+
+def test_checkpoint_round_trip(tmp_path):
+    with CheckpointStore(str(tmp_path / "checkpoints.sqlite")) as store:
+        assert store.get("quake", "tweets", "csv", "20220313") is None
+
+        state = WindowState("2022-03-13T00:00:00.000Z", "2022-03-13T23:59:59.000Z", next_token="abc",
+                            newest_created_at="2022-03-13T22:00:00+00:00", rows_written=10, tweets_scanned=100)
+        store.save("quake", "tweets", "csv", "20220313", state)
+        assert store.get("quake", "tweets", "csv", "20220313") == state
+        assert store.get("quake", "tweets", "parquet", "20220313") is None
+
+        state.completed = True
+        store.save("quake", "tweets", "csv", "20220313", state)
+
+    with CheckpointStore(str(tmp_path / "checkpoints.sqlite")) as store:
+        assert store.get("quake", "tweets", "csv", "20220313").completed
+
+
+def test_update_densities_blends_runs(tmp_path):
+    with CheckpointStore(str(tmp_path / "checkpoints.sqlite")) as store:
+        assert store.get_densities("quake") == {}
+
+        store.update_densities("quake", {0: 10.0, 1: 20.0})
+        store.update_densities("quake", {1: 40.0, 2: 5.0})
+
+        assert store.get_densities("quake") == {0: 10.0, 1: 30.0, 2: 5.0}
+        assert store.get_densities("flood") == {}
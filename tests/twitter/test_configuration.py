@@ -0,0 +1,33 @@
+from project.twitter.config.configuration import Configuration, get_config, set_config
+
+
+def test_loads_package_file_from_any_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("TWITTER_API_URL", raising=False)
+
+    config = Configuration()
+
+    assert config.search_url == "https://api.twitter.com/2/tweets/search/recent"
+    assert "user.fields" in config.users_params
+
+
+def test_environment_overrides(tmp_path, monkeypatch):
+    config_file = tmp_path / "configuration.yaml"
+    config_file.write_text("endpoints:\n  search:\n    url: https://a/2/search\n  users:\n    url: https://a/2/users\n")
+    monkeypatch.setenv("TWITTER_CONFIG_FILE", str(config_file))
+    monkeypatch.setenv("TWITTER_API_URL", "http://127.0.0.1:8000/")
+    monkeypatch.setenv("TWITTER_USERS_URL", "http://users")
+
+    config = Configuration()
+
+    assert config.search_url == "http://127.0.0.1:8000/2/search"
+    assert config.users_url == "http://users"
+    assert config.search_params == {}
+
+
+def test_get_config_loads_once(monkeypatch):
+    set_config(None)
+    try:
+        assert get_config() is get_config()
+    finally:
+        set_config(None)
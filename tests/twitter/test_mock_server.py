@@ -0,0 +1,66 @@
+import pytest
+
+from project.twitter.api_handler import TwitterApiError, TwitterClient
+from project.twitter.mock_server import MockTwitterServer
+from project.twitter.parser import DF_HEADERS, parse_responses
+from project.twitter.recorder import Recorder
+
+
+def test_search_pages_parse():
+    with MockTwitterServer(pages=3) as server, TwitterClient(headers={}) as client:
+        params = {"query": "quake", "start_time": "2022-03-13T00:00:00.000Z", "end_time": "2022-03-14T00:00:00.000Z",
+                  "max_results": 20}
+        pages = [client.get(server.search_url, params)]
+        while "next_token" in pages[-1]["meta"]:
+            pages.append(client.get(server.search_url, params, pages[-1]["meta"]["next_token"]))
+
+        assert len(pages) == 3
+        ids = [int(tweet["id"]) for page in pages for tweet in page["data"]]
+        assert ids == sorted(set(ids), reverse=True)
+        count, df = parse_responses(DF_HEADERS, pages)
+        assert 0 < count < 60
+        assert df["created_at"].between("2022-03-13", "2022-03-14").all()
+        assert client.rate_limiter(server.search_url).remaining == 447
+
+
+def test_users_and_rate_limit():
+    with MockTwitterServer(rate_limit=2) as server, TwitterClient(headers={}, max_retries=0) as client:
+        users = client.get(server.users_url, {"ids": "1,2,3"})["data"]
+        assert [user["id"] for user in users] == ["1", "2", "3"]
+
+        client.get(server.users_url, {"ids": "1"})
+        assert client.rate_limiter(server.users_url).remaining == 0
+
+        # A client that hasn't seen the rate limit headers yet gets a 429
+        with TwitterClient(headers={}, max_retries=0) as other_client:
+            with pytest.raises(TwitterApiError) as e:
+                other_client.get(server.users_url, {"ids": "1"})
+        assert e.value.status_code == 429
+
+
+def test_replays_recordings(tmp_path):
+    recorded = {"data": [{"id": "42", "location": "Lagos, Nigeria"}]}
+    Recorder(str(tmp_path)).record("https://api.twitter.com/2/users", {"ids": "42"}, recorded)
+
+    with MockTwitterServer(recordings=str(tmp_path)) as server, TwitterClient(headers={}) as client:
+        assert client.get(server.users_url, {"ids": "42"}) == recorded
+        assert client.get(server.users_url, {"ids": "43"})["data"][0]["id"] == "43"
+
+
+def test_search_since_id_only_returns_newer_tweets():
+    with MockTwitterServer(pages=2) as server, TwitterClient(headers={}) as client:
+        params = {"query": "quake", "start_time": "2022-03-13T00:00:00.000Z", "end_time": "2022-03-13T12:00:00.000Z",
+                  "max_results": 20}
+        first = client.get(server.search_url, params)
+        newest_id = first["meta"]["newest_id"]
+
+        # A later incremental run of the same query asks for the tweets after the newest one it has
+        later = {"query": "quake", "end_time": "2022-03-14T00:00:00.000Z", "max_results": 20, "since_id": newest_id}
+        page = client.get(server.search_url, later)
+        ids = [int(tweet["id"]) for tweet in page["data"]]
+        assert ids and min(ids) > int(newest_id)
+        assert all(tweet["created_at"] >= "2022-03-13T12:00:00" for tweet in page["data"])
+
+        # A window that ends before the since_id tweet has nothing newer
+        up_to_date = {**params, "since_id": page["meta"]["newest_id"]}
+        assert client.get(server.search_url, up_to_date)["meta"]["result_count"] == 0
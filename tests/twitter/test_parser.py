@@ -0,0 +1,53 @@
+import pandas as pd
+
+from project.twitter.parser import DF_HEADERS, parse_responses
+
+RESPONSE = {
+    "data": [
+        {"id": "1", "author_id": "10", "created_at": "2022-03-13T10:00:00.000Z", "lang": "en", "source": "web",
+         "text": "with place", "geo": {"place_id": "p1", "coordinates": {"coordinates": [1.5, 2.5]}},
+         "public_metrics": {"retweet_count": 1, "reply_count": 2, "like_count": 3, "quote_count": 4}},
+        {"id": "2", "author_id": "20", "created_at": "2022-03-13T11:00:00.000Z", "lang": "es", "source": "web",
+         "text": "no geo", "public_metrics": {"retweet_count": 0, "reply_count": 0, "like_count": 0,
+                                              "quote_count": 0}},
+        {"id": "3", "author_id": "30", "created_at": "2022-03-13T12:00:00.000Z", "lang": "fr", "source": "web",
+         "text": "place only", "geo": {"place_id": "p2"},
+         "public_metrics": {"retweet_count": 0, "reply_count": 0, "like_count": 0, "quote_count": 0}},
+        {"id": "4", "author_id": "40", "created_at": "2022-03-13T13:00:00.000Z", "lang": "de", "source": "app",
+         "text": "unknown place", "geo": {"place_id": "p9", "coordinates": {"coordinates": [-3.0, 4.0]}},
+         "public_metrics": {"retweet_count": 5, "reply_count": 6, "like_count": 7, "quote_count": 8}}
+    ],
+    "includes": {"places": [
+        {"id": "p1", "name": "Camas", "full_name": "Camas, Spain", "country": "Spain", "country_code": "ES"},
+        {"id": "p2", "name": "Tralee", "full_name": "Tralee, Ireland", "country": "Ireland", "country_code": "IE"}
+    ]},
+    "meta": {"result_count": 4}
+}
+
+
+def test_parse_responses():
+    counter, df = parse_responses(DF_HEADERS, [RESPONSE])
+
+    assert counter == 2
+    assert list(df.columns) == DF_HEADERS
+    assert df["id"].to_list() == ["1", "4"]
+    assert df["created_at"].to_list() == [pd.Timestamp("2022-03-13T10:00:00Z"), pd.Timestamp("2022-03-13T13:00:00Z")]
+    assert df.iloc[0][["geo", "lat", "long", "place_name", "place_full_name", "place_country",
+                       "place_country_code"]].to_list() == ["p1", 1.5, 2.5, "Camas", "Camas, Spain", "Spain", "ES"]
+    assert df.iloc[1][["place_name", "place_country"]].isna().all()
+    assert df.iloc[1][["like_count", "quote_count", "reply_count", "retweet_count"]].to_list() == [7, 8, 6, 5]
+
+
+def test_parse_many_responses():
+    counter, df = parse_responses(DF_HEADERS, [RESPONSE, RESPONSE])
+
+    assert counter == 4
+    assert df["id"].to_list() == ["1", "4", "1", "4"]
+
+
+def test_parse_responses_without_geo_tweets():
+    counter, df = parse_responses(DF_HEADERS, [{"data": RESPONSE["data"][1:3], "meta": {"result_count": 2}}])
+
+    assert counter == 0
+    assert df.empty
+    assert list(df.columns) == DF_HEADERS
@@ -0,0 +1,73 @@
+import datetime
+
+from pytz import utc
+
+from project.twitter.planner import Slice, WindowPlan, decode_slices, encode_slices, plan_slices
+
+START = datetime.datetime(2022, 3, 13, tzinfo=utc)
+END = START + datetime.timedelta(days=1)
+
+
+def _tweet(minute: int, geo: bool = True) -> dict:
+    tweet = {"id": str(minute), "created_at": (START + datetime.timedelta(minutes=minute)).strftime(
+        "%Y-%m-%dT%H:%M:%S.000Z")}
+    if geo:
+        tweet["geo"] = {"coordinates": {"coordinates": [1.0, 2.0]}}
+    return tweet
+
+
+def test_plan_slices_keeps_sparse_windows_whole():
+    assert plan_slices(START, END, 1000, 100) == [Slice(START, END, 1000)]
+    assert plan_slices(START, END, 1000, 100, {hour: 10.0 for hour in range(24)}) == [Slice(START, END, 1000)]
+
+
+def test_plan_slices_spreads_dense_windows():
+    # Quiet nights, a busy afternoon
+    densities = {hour: 2.0 if hour < 8 else 1000.0 if 12 <= hour < 18 else 50.0 for hour in range(24)}
+
+    slices = plan_slices(START, END, 2000, 100, densities)
+
+    assert sum(s.max_count for s in slices) == 2000
+    assert slices[0].end == END
+    assert slices[-1].start == START
+    assert all(newer.start == older.end for newer, older in zip(slices, slices[1:]))
+    # The hours with fewer tweets than the busy hours' share get all of them, adjacent ones in 1 slice
+    assert slices[0] == Slice(START + datetime.timedelta(hours=18), END, 300)
+    assert slices[-1] == Slice(START, START + datetime.timedelta(hours=12), 216)
+    # The busy hours get the same share, in 15 minute slices once a share is over a page
+    busy = [s for s in slices if 12 <= s.start.hour < 18]
+    assert len(busy) == 6 * 2
+    assert {s.end - s.start for s in busy} == {datetime.timedelta(minutes=30)}
+    assert max(s.max_count for s in busy) - min(s.max_count for s in busy) <= 1
+
+
+def test_slices_round_trip():
+    slices = [Slice(START + datetime.timedelta(hours=1), END, 10), Slice(START, START + datetime.timedelta(hours=1), 5)]
+    assert decode_slices(encode_slices(slices)) == slices
+
+
+def test_window_plan_closes_slices_at_their_share():
+    plan = WindowPlan([Slice(START + datetime.timedelta(hours=12), END, 3), Slice(START, START + datetime.timedelta(
+        hours=12), 3)], max_results=10)
+
+    assert not plan.add_page(0, {"data": [_tweet(1439), _tweet(1438, geo=False)]}, "1")
+    assert plan.remaining(0)[0].max_count == 2
+    assert plan.add_page(0, {"data": [_tweet(1437), _tweet(1436)]}, "2")
+    assert plan.add_page(1, {"data": [_tweet(10)]}, None)
+    assert plan.get(2) is None
+
+
+def test_window_plan_probe_splits_dense_windows():
+    plan = WindowPlan([Slice(START, END, 100)], max_results=10, probe=True)
+
+    # 10 tweets with geo data over the last 10 minutes is 60 an hour, far over 100 for the day
+    assert plan.add_page(0, {"data": [_tweet(minute) for minute in range(1439, 1429, -1)]}, "1")
+
+    assert len(plan) > 1
+    rest = plan.remaining(1)
+    assert rest[0].end == START + datetime.timedelta(minutes=1430)
+    assert rest[-1].start == START
+    assert sum(s.max_count for s in rest) == 90
+    densities = plan.densities()
+    assert list(densities) == [23]
+    assert round(densities[23]) == 60
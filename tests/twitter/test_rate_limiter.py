@@ -0,0 +1,46 @@
+import threading
+import time
+
+from project.twitter.rate_limiter import RateLimiter
+
+
+def test_unknown_budget_lets_requests_through():
+    limiter = RateLimiter()
+    limiter.acquire()
+    limiter.acquire()
+    assert limiter.remaining is None
+
+
+def test_release_refills_from_headers():
+    limiter = RateLimiter()
+    limiter.acquire()
+    limiter.acquire()
+    limiter.release({"x-rate-limit-remaining": "10", "x-rate-limit-reset": str(time.time() + 900)})
+    # 1 request is still in flight and isn't counted in the remaining header yet
+    assert limiter.remaining == 9
+    limiter.release({"x-rate-limit-remaining": "9", "x-rate-limit-reset": str(time.time() + 900)})
+    assert limiter.remaining == 9
+
+
+def test_release_without_headers_keeps_budget():
+    limiter = RateLimiter()
+    limiter.acquire()
+    limiter.release({"x-rate-limit-remaining": "5", "x-rate-limit-reset": "0"})
+    limiter.acquire()
+    limiter.release(None)
+    assert limiter.remaining == 4
+
+
+def test_acquire_waits_for_reset():
+    limiter = RateLimiter()
+    limiter.acquire()
+    limiter.release({"x-rate-limit-remaining": "0", "x-rate-limit-reset": str(time.time() + 0.3)})
+
+    started = time.monotonic()
+    thread = threading.Thread(target=limiter.acquire)
+    thread.start()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert time.monotonic() - started >= 0.25
+    assert limiter.remaining is None
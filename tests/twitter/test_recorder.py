@@ -0,0 +1,25 @@
+from project.twitter.recorder import Recorder, Replayer, request_key
+
+
+def test_request_key_ignores_time_range_and_unsent_params():
+    params = {"query": "quake", "start_time": "2022-03-13T00:00:00.000Z", "max_results": 100, "next_token": None}
+
+    assert request_key("https://api.twitter.com/2/tweets/search/recent", params) == \
+        "/2/tweets/search/recent?max_results=100&query=quake"
+
+
+def test_replayer_serves_recordings_in_order(tmp_path):
+    recorder = Recorder(str(tmp_path))
+    url = "https://api.twitter.com/2/tweets/search/recent"
+    recorder.record(url, {"query": "quake", "start_time": "a"}, {"meta": {"result_count": 1}})
+    recorder.record(url, {"query": "quake", "start_time": "b"}, {"meta": {"result_count": 2}})
+    recorder.record(url, {"query": "quake", "next_token": "t"}, {"meta": {"result_count": 3}})
+
+    replayer = Replayer(str(tmp_path))
+
+    assert recorder.recorded == len(replayer) == 3
+    assert replayer.get("/2/tweets/search/recent", {"query": "quake"}) == {"meta": {"result_count": 1}}
+    assert replayer.get("/2/tweets/search/recent", {"query": "quake"}) == {"meta": {"result_count": 2}}
+    assert replayer.get("/2/tweets/search/recent", {"query": "quake"}) == {"meta": {"result_count": 1}}
+    assert replayer.get(url, {"query": "quake", "next_token": "t"}) == {"meta": {"result_count": 3}}
+    assert replayer.get(url, {"query": "other"}) is None
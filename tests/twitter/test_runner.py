@@ -0,0 +1,370 @@
+import dataclasses
+import datetime
+import json
+
+import pandas as pd
+import pytest
+from pytz import utc
+
+from project.twitter import runner
+from project.twitter.author_cache import AuthorLocationCache
+from project.twitter.checkpoint import CheckpointStore, HighWaterMark
+from project.twitter.output_format import OutputFormat
+from project.twitter.parser import DF_HEADERS
+from project.twitter.seen_ids import SeenIdIndex
+from project.twitter.sinks import CsvSink
+from tests.twitter.pages import tweet_page
+
+START = datetime.datetime(2022, 3, 13, tzinfo=utc)
+END = datetime.datetime(2022, 3, 13, 23, 59, 59, tzinfo=utc)
+
+
+class FakeClient:
+    """
+    Serves ``pages`` synthetic search pages per window and can fail on a given page.
+    """
+
+    def __init__(self, pages: int = 4, fail_on: int = None):
+        self.pages = pages
+        self.fail_on = fail_on
+        self.requested = []
+
+    def get(self, url, params, next_token=None, decode=None, archive=None):
+        page = int(next_token or 0)
+        if page == self.fail_on:
+            self.fail_on = None
+            raise ConnectionError("connection lost")
+        self.requested.append(page)
+        response = tweet_page(50, seed=page)
+        if page < self.pages - 1:
+            response["meta"]["next_token"] = str(page + 1)
+        if archive is not None:
+            archive.write(json.dumps(response).encode())
+        return response
+
+
+def _search_window(client, checkpoints, resume=False, **kwargs):
+    option_names = {field.name for field in dataclasses.fields(runner.WindowOptions)}
+    options = dict(max_results=50, max_count=10_000, flush_rows=1, output_format=OutputFormat.CSV, resume=resume)
+    options.update({k: v for k, v in kwargs.items() if k in option_names})
+    args = dict(keyword="quake", csv_filename="tweets", start=START, end=END, client=client, checkpoints=checkpoints,
+                options=runner.WindowOptions(**options))
+    args.update({k: v for k, v in kwargs.items() if k not in option_names})
+    return runner.search_window(**args)
+
+
+def test_search_window_resumes_from_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    checkpoints = CheckpointStore("checkpoints.sqlite")
+
+    _search_window(FakeClient(), checkpoints)
+    expected = pd.read_csv("project/data/20220313_tweets.csv")
+
+    client = FakeClient(fail_on=2)
+    with pytest.raises(ConnectionError):
+        _search_window(client, checkpoints)
+    state = checkpoints.get("quake", "tweets", "csv", "20220313")
+    assert state.next_token == "2"
+    assert not state.completed
+
+    _search_window(client, checkpoints, resume=True)
+    assert client.requested == [0, 1, 2, 3]
+    pd.testing.assert_frame_equal(pd.read_csv("project/data/20220313_tweets.csv"), expected)
+
+    state = checkpoints.get("quake", "tweets", "csv", "20220313")
+    assert state.completed
+    assert state.rows_written == len(expected)
+    assert state.tweets_scanned == 200
+
+    # A completed window isn't requested again
+    client = FakeClient()
+    assert _search_window(client, checkpoints, resume=True) == 0
+    assert client.requested == []
+
+
+def test_search_window_checkpoints_every_pages(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    checkpoints = CheckpointStore("checkpoints.sqlite")
+    saved = []
+    save = checkpoints.save
+
+    def record(*key, state):
+        saved.append(dataclasses.replace(state))
+        save(*key, state)
+
+    monkeypatch.setattr(checkpoints, "save", lambda *args: record(*args[:-1], state=args[-1]))
+
+    # The buffer never fills up, the rows are flushed for the checkpoints instead
+    _search_window(FakeClient(pages=6), checkpoints, flush_rows=10_000, checkpoint_pages=2)
+    rows = len(pd.read_csv("project/data/20220313_tweets.csv"))
+    assert [(state.next_token, state.completed) for state in saved] == [("2", False), ("4", False), (None, False),
+                                                                        (None, True)]
+    assert 0 < saved[0].rows_written < saved[1].rows_written < rows == saved[-1].rows_written
+
+
+def test_search_window_fetches_no_pages_past_max_count(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    geo = [runner.append_to_csv(DF_HEADERS, tweet_page(50, seed=page))[0] for page in range(10)]
+    max_count = geo[0] + geo[1] + 1
+
+    client = FakeClient(pages=10)
+    _search_window(client, CheckpointStore("checkpoints.sqlite"), max_count=max_count, queue_size=4)
+    # The pages a sequential run requests, the third one reaches max_count
+    assert client.requested == [0, 1, 2]
+
+
+def test_search_window_resume_extends_a_grown_window(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    checkpoints = CheckpointStore("checkpoints.sqlite")
+    tweets = [(i + 1, (START + datetime.timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M:%S.000Z")) for i in range(24)]
+    midday = START + datetime.timedelta(hours=12)
+
+    # Today's window completed at midday, the next run of the day ends later
+    _search_window(TimelineClient(tweets), checkpoints, max_results=10, end=midday, resume=True)
+    client = TimelineClient(tweets)
+    _search_window(client, checkpoints, max_results=10, resume=True)
+
+    assert client.requests and all(params["start_time"] == midday.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+                                   for params in client.requests)
+    df = pd.read_csv("project/data/20220313_tweets.csv", dtype={"id": str})
+    assert sorted(df["id"].astype(int).to_list()) == list(range(1, 25))
+    state = checkpoints.get("quake", "tweets", "csv", "20220313")
+    assert state.completed
+    assert state.rows_written == 24
+
+    # Once it covers the window it is skipped again
+    client = TimelineClient(tweets)
+    assert _search_window(client, checkpoints, max_results=10, resume=True) == 0
+    assert client.requests == []
+
+
+def test_search_window_drops_seen_tweets(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    checkpoints = CheckpointStore("checkpoints.sqlite")
+    seen_ids = SeenIdIndex.open("quake", "tweets", "csv", "seen_ids")
+
+    _search_window(FakeClient(), checkpoints, seen_ids=seen_ids)
+    first = pd.read_csv("project/data/20220313_tweets.csv")
+    # The next day window is served the same tweets, which are all written already
+    _search_window(FakeClient(), checkpoints, seen_ids=seen_ids, end=END + datetime.timedelta(days=1))
+    assert len(first) > 0
+    assert len(pd.read_csv("project/data/20220314_tweets.csv")) == 0
+
+    # A rerun of the first day overwrites it, so its tweets are written again
+    _search_window(FakeClient(), checkpoints, seen_ids=SeenIdIndex.open("quake", "tweets", "csv", "seen_ids"))
+    pd.testing.assert_frame_equal(pd.read_csv("project/data/20220313_tweets.csv"), first)
+
+
+def test_search_window_saves_seen_ids_of_written_pages_only(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    checkpoints = CheckpointStore("checkpoints.sqlite")
+    _search_window(FakeClient(pages=6), checkpoints)
+    expected = pd.read_csv("project/data/20220313_tweets.csv")
+
+    # The second write fails while the pages after it are already parsed, and their ids claimed
+    write = CsvSink._write
+    failing = {"after": 1}
+
+    def failing_write(self, df):
+        if failing["after"] == 0:
+            raise OSError("disk full")
+        failing["after"] -= 1
+        write(self, df)
+
+    monkeypatch.setattr(CsvSink, "_write", failing_write)
+    with pytest.raises(OSError):
+        _search_window(FakeClient(pages=6), checkpoints,
+                       seen_ids=SeenIdIndex.open("quake", "tweets", "csv", "seen_ids"))
+    assert checkpoints.get("quake", "tweets", "csv", "20220313").next_token == "1"
+
+    monkeypatch.setattr(CsvSink, "_write", write)
+    _search_window(FakeClient(pages=6), checkpoints, seen_ids=SeenIdIndex.open("quake", "tweets", "csv", "seen_ids"),
+                   resume=True)
+    pd.testing.assert_frame_equal(pd.read_csv("project/data/20220313_tweets.csv"), expected)
+
+
+class TimelineClient:
+    """
+    Serves a fixed timeline of geo tagged tweets, honouring start_time, end_time and since_id like the search API.
+    """
+
+    def __init__(self, tweets):
+        self.tweets = tweets
+        self.requests = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def log_stats(self):
+        pass
+
+    def get(self, url, params, next_token=None, **kwargs):
+        self.requests.append(params)
+        since_id = int(params.get("since_id", 0))
+        start_time = params.get("start_time", "")
+        data = [
+            {"id": str(tweet_id), "author_id": "1", "created_at": created_at, "text": "quake",
+             "geo": {"coordinates": {"coordinates": [1.0, 2.0]}}, "public_metrics": {}}
+            for tweet_id, created_at in self.tweets
+            if tweet_id > since_id and start_time <= created_at < params["end_time"]
+        ]
+        data.reverse()
+        page = int(next_token or 0)
+        page_size = int(params.get("max_results", 100))
+        data = data[page * page_size:(page + 1) * page_size]
+        meta = {"result_count": len(data)}
+        if data:
+            meta["newest_id"] = data[0]["id"]
+        if len(data) == page_size:
+            meta["next_token"] = str(page + 1)
+        return {"data": data, "meta": meta}
+
+
+def test_plan_windows_from_high_water_mark(tmp_path):
+    checkpoints = CheckpointStore(str(tmp_path / "checkpoints.sqlite"))
+    since = datetime.datetime.now(utc).replace(microsecond=0) - datetime.timedelta(hours=2)
+    # The created_at of a tweet, with the trailing Z of the search API
+    checkpoints.save_high_water_mark("quake", "tweets", "csv",
+                                     HighWaterMark("100", since.strftime("%Y-%m-%dT%H:%M:%S.000Z")))
+
+    start_list, _, since_id = runner.plan_windows("quake", "tweets", 7, OutputFormat.CSV, checkpoints, True)
+    assert since_id == "100"
+    assert start_list[0] == since
+
+
+def test_search_tweets_incremental(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    now = datetime.datetime.now(utc)
+    timestamp = lambda delta: (now - delta).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    tweets = [(100, timestamp(datetime.timedelta(minutes=5))), (101, timestamp(datetime.timedelta(minutes=4)))]
+
+    client = TimelineClient(tweets)
+    monkeypatch.setattr(runner, "TwitterClient", lambda **kwargs: client)
+    runner.search_tweets("quake", "tweets", days=1, checkpoint_db="checkpoints.sqlite", incremental=True)
+    assert all("since_id" not in params for params in client.requests)
+
+    with CheckpointStore("checkpoints.sqlite") as checkpoints:
+        assert checkpoints.get_high_water_mark("quake", "tweets", "csv").newest_id == "101"
+
+    tweets.append((102, timestamp(datetime.timedelta(minutes=3))))
+    client.requests = []
+    runner.search_tweets("quake", "tweets", days=1, checkpoint_db="checkpoints.sqlite", incremental=True)
+    assert [params.get("since_id") for params in client.requests] == ["101"]
+
+    df = pd.read_csv(f"project/data/{now.strftime('%Y%m%d')}_tweets.csv", index_col=0, dtype={"id": str})
+    assert sorted(df["id"].to_list()) == ["100", "101", "102"]
+    assert df.index.to_list() == [0, 1, 2]
+    with CheckpointStore("checkpoints.sqlite") as checkpoints:
+        assert checkpoints.get_high_water_mark("quake", "tweets", "csv").newest_id == "102"
+
+
+def test_search_window_incremental_has_its_own_max_count(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    checkpoints = CheckpointStore("checkpoints.sqlite")
+    tweets = [(i, (START + datetime.timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M:%S.000Z")) for i in range(4)]
+
+    _search_window(TimelineClient(tweets), checkpoints, max_results=1, max_count=2)
+    assert checkpoints.get("quake", "tweets", "csv", "20220313").rows_written == 2
+
+    # The day already holds max_count rows, the newer tweets are added on top of them
+    tweets.append((4, (START + datetime.timedelta(hours=4)).strftime("%Y-%m-%dT%H:%M:%S.000Z")))
+    client = TimelineClient(tweets)
+    _search_window(client, checkpoints, max_results=1, max_count=2, since_id="3")
+    assert client.requests and all(params["since_id"] == "3" for params in client.requests)
+    df = pd.read_csv("project/data/20220313_tweets.csv", dtype={"id": str})
+    assert sorted(df["id"].to_list()) == ["2", "3", "4"]
+    state = checkpoints.get("quake", "tweets", "csv", "20220313")
+    assert (state.rows_written, state.base_rows) == (3, 2)
+
+
+def test_search_window_adaptive_spreads_max_count(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    checkpoints = CheckpointStore("checkpoints.sqlite")
+    # A tweet every minute of the day
+    tweets = [(i, (START + datetime.timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%S.000Z")) for i in range(1440)]
+
+    _search_window(TimelineClient(tweets), checkpoints, max_results=10, max_count=240)
+    newest_first = pd.read_csv("project/data/20220313_tweets.csv", parse_dates=["created_at"])
+    assert newest_first["created_at"].dt.hour.min() == 20
+
+    _search_window(TimelineClient(tweets), checkpoints, max_results=10, max_count=240, adaptive=True)
+    probed = pd.read_csv("project/data/20220313_tweets.csv", parse_dates=["created_at"])
+    # The first page probes the density, then every hour gets its share, plus the rest of the page that reached it
+    assert 240 <= len(probed) < 240 + 24
+    assert probed["created_at"].dt.hour.nunique() == 24
+    densities = checkpoints.get_densities("quake")
+    assert len(densities) == 24
+    assert all(50 < density < 70 for density in densities.values())
+
+    # The next run plans the slices from the densities up front, one page per hour
+    client = TimelineClient(tweets)
+    _search_window(client, checkpoints, max_results=10, max_count=240, adaptive=True)
+    planned = pd.read_csv("project/data/20220313_tweets.csv", parse_dates=["created_at"])
+    assert planned["created_at"].dt.hour.value_counts().to_dict() == {hour: 10 for hour in range(24)}
+    assert len(client.requests) == 24
+
+
+def test_search_window_adaptive_resumes_slices(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    checkpoints = CheckpointStore("checkpoints.sqlite")
+    checkpoints.update_densities("quake", {hour: 60.0 for hour in range(24)})
+    tweets = [(i, (START + datetime.timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%S.000Z")) for i in range(1440)]
+
+    class FailingClient(TimelineClient):
+        def get(self, url, params, next_token=None, **kwargs):
+            if len(self.requests) == 5:
+                raise ConnectionError("connection lost")
+            return super().get(url, params, next_token, **kwargs)
+
+    with pytest.raises(ConnectionError):
+        _search_window(FailingClient(tweets), checkpoints, max_results=10, max_count=240, adaptive=True, queue_size=1)
+    state = checkpoints.get("quake", "tweets", "csv", "20220313")
+    assert not state.completed
+    assert 0 < state.rows_written < 240
+
+    client = TimelineClient(tweets)
+    _search_window(client, checkpoints, max_results=10, max_count=240, adaptive=True, resume=True)
+    df = pd.read_csv("project/data/20220313_tweets.csv", parse_dates=["created_at"])
+    assert df["created_at"].dt.hour.value_counts().to_dict() == {hour: 10 for hour in range(24)}
+    assert len(client.requests) == 24 - state.rows_written // 10
+
+
+class UsersClient:
+    """
+    Serves the users endpoint, every author lives in Camas, Spain apart from the ones in ``missing``.
+    """
+
+    def __init__(self, missing=()):
+        self.missing = set(missing)
+        self.requested = []
+
+    def get(self, url, params, next_token=None, **kwargs):
+        ids = params["ids"].split(",")
+        self.requested.append(ids)
+        return {"data": [{"id": _id, "location": "Camas, Spain"} for _id in ids if _id not in self.missing]}
+
+
+@pytest.mark.parametrize("clean_workers", [1, 2])
+def test_get_author_locations(tmp_path, monkeypatch, clean_workers):
+    monkeypatch.setattr(runner, "WORLD_CITIES_FILE", "tests/utilities/mock/sample_world_cities.csv")
+    tweet_data_file = str(tmp_path / "tweets.csv")
+    author_ids = [str(1000 + i) for i in range(200)]
+    pd.DataFrame({"author_id": author_ids + author_ids[:50] + ["not-an-id"]}).to_csv(tweet_data_file)
+
+    client = UsersClient(missing=["1000"])
+    with AuthorLocationCache(str(tmp_path / "authors.sqlite")) as cache:
+        user_location = runner.get_author_locations(tweet_data_file, client, cache=cache, concurrency=2,
+                                                     clean_workers=clean_workers)
+
+        assert sorted(len(ids) for ids in client.requested) == [100, 100]
+        assert sorted(sum(client.requested, [])) == author_ids
+        assert len(user_location) == 199
+        assert user_location["1001"] == {"lat": 37.402, "lon": -6.0332, "city": "camas", "country": "spain"}
+
+        client = UsersClient()
+        assert runner.get_author_locations(tweet_data_file, client, cache=cache) == user_location
+        assert client.requested == []
+        assert cache.hit_rate == 0.5
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from project.twitter.output_format import OutputFormat
+from project.twitter.parser import DF_HEADERS, parse_responses
+from project.twitter.schema import CATEGORY_COLUMNS, COUNT_COLUMNS, COUNT_DTYPE, TweetRecord, apply_schema
+from project.twitter.sinks import CsvSink, ParquetSink
+from project.twitter.storage import read_tweets
+from tests.twitter.pages import tweet_pages
+
+
+def test_record_defines_columns():
+    record = TweetRecord(*range(len(DF_HEADERS)))
+
+    assert not hasattr(record, "__dict__")
+    assert list(vars(TweetRecord)["__dataclass_fields__"]) == DF_HEADERS
+
+
+def test_apply_schema_shrinks_frame():
+    df = parse_responses(DF_HEADERS, tweet_pages(20, 100, geo_ratio=1.0))[1]
+
+    result = apply_schema(df)
+
+    assert all(isinstance(result[column].dtype, pd.CategoricalDtype) for column in CATEGORY_COLUMNS)
+    assert (result[COUNT_COLUMNS].dtypes == COUNT_DTYPE).all()
+    assert result.memory_usage(deep=True).sum() < df.memory_usage(deep=True).sum() / 1.5
+    pd.testing.assert_frame_equal(result.astype(df.dtypes.to_dict()), df)
+
+
+@pytest.mark.parametrize("output_format", [OutputFormat.CSV, OutputFormat.PARQUET])
+def test_read_tweets_uses_schema(tmp_path, output_format):
+    df = parse_responses(DF_HEADERS, tweet_pages(3, 50, geo_ratio=1.0))[1]
+    if output_format.value == OutputFormat.CSV.value:
+        path = str(tmp_path / "tweets.csv")
+        sink = CsvSink(path, DF_HEADERS)
+    else:
+        path = str(tmp_path)
+        sink = ParquetSink(path, "20220313", DF_HEADERS)
+    with sink:
+        sink.write(df)
+
+    result = read_tweets(path, output_format)
+
+    assert isinstance(result["lang"].dtype, pd.CategoricalDtype)
+    assert result["like_count"].dtype == COUNT_DTYPE
+    assert result["id"].to_list() == df["id"].to_list()
+    assert result["source"].astype(str).to_list() == df["source"].to_list()
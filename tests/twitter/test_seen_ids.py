@@ -0,0 +1,42 @@
+import numpy as np
+
+from project.twitter import seen_ids as seen_ids_module
+from project.twitter.seen_ids import SeenIdIndex
+
+
+def test_claim_drops_seen_and_repeated_ids(tmp_path):
+    index = SeenIdIndex(str(tmp_path))
+
+    assert index.claim("20220313", np.array([3, 1, 3, 2])).tolist() == [True, True, False, True]
+    assert index.claim("20220314", np.array([2, 4])).tolist() == [False, True]
+    assert len(index) == 4
+
+
+def test_saved_days_are_reloaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(seen_ids_module, "MERGE_ROWS", 2)
+    index = SeenIdIndex(str(tmp_path))
+    index.claim("20220313", np.array([5, 1, 9]))
+    index.claim("20220314", np.array([7]))
+    index.save("20220313")
+
+    reloaded = SeenIdIndex(str(tmp_path))
+    assert np.load(tmp_path / "20220313.npy").tolist() == [1, 5, 9]
+    assert reloaded.claim("20220314", np.array([1, 7])).tolist() == [False, True]
+
+    reloaded.reset("20220313")
+    assert reloaded.claim("20220313", np.array([1, 5])).tolist() == [True, True]
+
+
+def test_held_ids_are_only_saved_once_committed(tmp_path):
+    index = SeenIdIndex(str(tmp_path))
+    assert index.claim("20220313", np.array([1, 2]), hold=True).tolist() == [True, True]
+    assert index.claim("20220313", np.array([3, 4]), hold=True).tolist() == [True, True]
+    # Held ids are dropped from later pages straight away
+    assert index.claim("20220313", np.array([2, 5])).tolist() == [False, True]
+
+    index.commit("20220313", np.array([1, 2]))
+    index.save("20220313")
+    assert np.load(tmp_path / "20220313.npy").tolist() == [1, 2, 5]
+
+    index.release("20220313")
+    assert index.claim("20220313", np.array([3, 4])).tolist() == [True, True]
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from project.twitter.sinks import CsvSink
+
+COLUMNS = ["author_id", "id", "tweet"]
+
+
+def _page(start: int, rows: int) -> pd.DataFrame:
+    return pd.DataFrame([[str(i), str(i * 10), f"tweet {i}"] for i in range(start, start + rows)], columns=COLUMNS)
+
+
+def test_csv_sink_matches_single_write(tmp_path):
+    pages = [_page(0, 3), _page(3, 0), _page(3, 4), _page(7, 2)]
+    expected_file = tmp_path / "expected.csv"
+    pd.concat(pages, ignore_index=True).to_csv(expected_file)
+
+    filename = tmp_path / "data" / "streamed.csv"
+    with CsvSink(str(filename), COLUMNS, flush_rows=4) as sink:
+        for page in pages:
+            sink.write(page)
+
+    assert sink.rows_written == 9
+    assert filename.read_text() == expected_file.read_text()
+
+
+def test_csv_sink_buffers_until_flush_rows(tmp_path):
+    filename = tmp_path / "streamed.csv"
+    sink = CsvSink(str(filename), COLUMNS, flush_rows=5)
+
+    sink.write(_page(0, 3))
+    assert sink.rows_written == 0
+    sink.write(_page(3, 3))
+    assert sink.rows_written == 6
+
+    sink.close()
+    assert len(pd.read_csv(filename, index_col=0)) == 6
+
+
+def test_csv_sink_writes_header_for_empty_window(tmp_path):
+    filename = tmp_path / "empty.csv"
+    with CsvSink(str(filename), COLUMNS):
+        pass
+
+    assert filename.read_text() == ",author_id,id,tweet\n"
@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+from project.twitter.output_format import OutputFormat
+from project.twitter.parser import DF_HEADERS, parse_responses
+from project.twitter.sinks import CsvSink, ParquetSink
+from project.twitter.storage import read_tweets, write_tweets
+from tests.twitter.test_parser import RESPONSE
+
+pytest.importorskip("pyarrow")
+
+
+def _tweets() -> pd.DataFrame:
+    return parse_responses(DF_HEADERS, [RESPONSE])[1]
+
+
+def test_parquet_round_trip_keeps_types(tmp_path):
+    df = _tweets()
+    with ParquetSink(str(tmp_path), "20220313", DF_HEADERS) as sink:
+        sink.write(df)
+
+    result = read_tweets(str(tmp_path), OutputFormat.PARQUET)
+
+    assert result["author_id"].to_list() == ["10", "40"]
+    assert result["created_at"].to_list() == df["created_at"].to_list()
+    assert result["date"].to_list() == ["20220313", "20220313"]
+
+
+def test_parquet_prunes_partitions_and_columns(tmp_path):
+    for date in ["20220312", "20220313"]:
+        with ParquetSink(str(tmp_path), date, DF_HEADERS) as sink:
+            sink.write(_tweets())
+
+    result = read_tweets(str(tmp_path), OutputFormat.PARQUET, columns=["author_id"],
+                         filters=[("date", "=", "20220313")])
+
+    assert list(result.columns) == ["author_id"]
+    assert len(result) == 2
+
+
+def test_parquet_write_tweets_replaces_partitions(tmp_path):
+    for date in ["20220312", "20220313"]:
+        with ParquetSink(str(tmp_path), date, DF_HEADERS) as sink:
+            sink.write(_tweets())
+
+    df = read_tweets(str(tmp_path), OutputFormat.PARQUET, filters=[("date", "=", "20220313")])
+    df["city"] = "camas"
+    write_tweets(df, str(tmp_path), OutputFormat.PARQUET)
+
+    result = read_tweets(str(tmp_path), OutputFormat.PARQUET)
+    assert len(result) == 4
+    assert result.loc[result["date"] == "20220313", "city"].to_list() == ["camas", "camas"]
+    assert result.loc[result["date"] == "20220312", "city"].isna().all()
+
+
+def test_csv_read_tweets_keeps_ids_and_dates(tmp_path):
+    filename = str(tmp_path / "tweets.csv")
+    with CsvSink(filename, DF_HEADERS) as sink:
+        sink.write(_tweets())
+
+    result = read_tweets(filename, OutputFormat.CSV)
+    assert result["author_id"].to_list() == ["10", "40"]
+    assert result["created_at"].to_list() == _tweets()["created_at"].to_list()
+    assert read_tweets(filename, OutputFormat.CSV, columns=["author_id"])["author_id"].to_list() == ["10", "40"]
@@ -1,6 +1,6 @@
 import datetime
 
-from project.utilities.dates import get_end_list, get_start_list
+from project.utilities.dates import get_end_list, get_incremental_windows, get_start_list
 
 def test_get_start_list():
     result_start_dates = get_start_list(3, datetime.datetime(2022, 3, 13))
@@ -17,3 +17,24 @@ def test_get_end_list():
         datetime.datetime(2022, 3, 12, 23, 59, 59, 999999),
         datetime.datetime(2022, 3, 11, 23, 59, 59, 999999)
     ]
+
+def test_get_incremental_windows():
+    start_list, end_list = get_incremental_windows(
+        datetime.datetime(2022, 3, 11, 18, 30),
+        datetime.datetime(2022, 3, 13, 9, 0)
+    )
+    assert start_list == [
+        datetime.datetime(2022, 3, 11, 18, 30),
+        datetime.datetime(2022, 3, 12),
+        datetime.datetime(2022, 3, 13)
+    ]
+    assert end_list == [
+        datetime.datetime(2022, 3, 11, 23, 59, 59, 999999),
+        datetime.datetime(2022, 3, 12, 23, 59, 59, 999999),
+        datetime.datetime(2022, 3, 13, 8, 59)
+    ]
+
+def test_get_incremental_windows_up_to_date():
+    assert get_incremental_windows(datetime.datetime(2022, 3, 13, 8, 59), datetime.datetime(2022, 3, 13, 9, 0)) == (
+        [], []
+    )
@@ -0,0 +1,28 @@
+from utilities.gazetteer import Gazetteer
+from utilities.world_cities import WorldCities
+
+
+def test_find_countries():
+    gazetteer = Gazetteer(["Niger", "Nigeria", "Oman", "United States", "States"])
+
+    assert gazetteer.find_countries("lagos, nigeria") == [(7, 14, "nigeria")]
+    assert gazetteer.find_countries("romania") == []
+    assert gazetteer.find_countries("united states of america") == [(0, 13, "united states")]
+    assert gazetteer.find_countries("niger/oman") == [(0, 5, "niger"), (6, 10, "oman")]
+
+
+def test_resolve():
+    gazetteer = Gazetteer(["Spain", "United States", "Germany"], {"camas": "spain"})
+
+    assert gazetteer.resolve("camas, spain") == ("spain", "camas")
+    assert gazetteer.resolve("united states - meredith") == ("united states", "meredith")
+    assert gazetteer.resolve("nackenheim (germany)") == ("germany", "nackenheim")
+    assert gazetteer.resolve("camas") == ("spain", "camas")
+    assert gazetteer.resolve("somewhere") == ("", "somewhere")
+
+
+def test_from_world_cities():
+    gazetteer = Gazetteer.from_world_cities(WorldCities("tests/utilities/mock/sample_world_cities.csv"))
+
+    assert gazetteer.resolve("camas, spain") == ("spain", "camas")
+    assert gazetteer.resolve("tralee") == ("ireland", "tralee")
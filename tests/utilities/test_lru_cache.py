@@ -0,0 +1,24 @@
+from utilities.lru_cache import LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert (cache.hits, cache.misses, cache.evictions, len(cache)) == (3, 1, 1, 2)
+    assert cache.hit_rate == 0.75
+
+
+def test_lru_cache_disabled():
+    cache = LRUCache(0)
+    cache.put("a", 1)
+
+    assert cache.get("a", "missing") == "missing"
+    assert len(cache) == 0
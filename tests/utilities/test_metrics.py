@@ -0,0 +1,45 @@
+import json
+import threading
+
+from utilities.metrics import Metrics
+
+
+def test_timers_and_counters_per_window_and_run(tmp_path):
+    metrics = Metrics()
+
+    def window(date):
+        with metrics.labels(window=date):
+            with metrics.timer("parse"):
+                metrics.inc("tweets_parsed", 10)
+            metrics.inc("tweets_parsed", 5)
+
+    threads = [threading.Thread(target=window, args=(date,)) for date in ["20220312", "20220313"]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics.timed("enrich")(lambda: None)()
+
+    summary = metrics.summary()
+
+    assert summary["run"]["counters"] == {"tweets_parsed": 30}
+    assert summary["run"]["timers"]["parse"]["count"] == 2
+    assert summary["run"]["timers"]["enrich"]["count"] == 1
+    assert [(c["labels"], c["value"]) for c in summary["counters"]] == \
+        [({"window": "20220312"}, 15), ({"window": "20220313"}, 15)]
+
+    metrics.write(str(tmp_path / "metrics.json"))
+    with open(tmp_path / "metrics.json") as f:
+        assert json.load(f) == json.loads(json.dumps(summary))
+
+
+def test_prometheus_text():
+    metrics = Metrics()
+    metrics.observe("http_wait", 0.5, window="20220313")
+    metrics.inc("http_requests")
+
+    text = metrics.to_prometheus()
+
+    assert 'social_ingest_stage_seconds_total{stage="http_wait",window="20220313"} 0.5' in text
+    assert 'social_ingest_stage_calls_total{stage="http_wait",window="20220313"} 1' in text
+    assert "social_ingest_http_requests_total 1" in text
@@ -0,0 +1,63 @@
+import threading
+import time
+
+import pytest
+
+from project.utilities.pipeline import run_pipeline
+
+
+def test_stages_overlap_and_keep_order():
+    written = []
+
+    def pages():
+        for page in range(6):
+            time.sleep(0.02)
+            yield page
+
+    def parse(page):
+        time.sleep(0.02)
+        return None if page == 3 else page * 10
+
+    def write(row):
+        time.sleep(0.02)
+        written.append(row)
+
+    started = time.perf_counter()
+    stats = run_pipeline(("fetch", pages()), [("parse", parse), ("write", write)], queue_size=2)
+
+    assert written == [0, 10, 20, 40, 50]
+    # Run one after another the stages would take 0.34s
+    assert time.perf_counter() - started < 0.3
+    assert [(stage.name, stage.items) for stage in stats] == [("fetch", 6), ("parse", 6), ("write", 5)]
+    assert all(stage.busy > 0 for stage in stats)
+
+
+def test_failure_is_raised_after_earlier_items():
+    written = []
+
+    def pages():
+        yield 1
+        yield 2
+        raise ConnectionError("connection lost")
+
+    with pytest.raises(ConnectionError):
+        run_pipeline(("fetch", pages()), [("parse", lambda page: page), ("write", written.append)])
+    assert written == [1, 2]
+
+
+def test_failing_last_stage_stops_the_other_stages():
+    fetched = []
+
+    def pages():
+        for page in range(1000):
+            fetched.append(page)
+            yield page
+
+    def write(page):
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        run_pipeline(("fetch", pages()), [("parse", lambda page: page), ("write", write)], queue_size=1)
+    time.sleep(0.3)
+    assert len(fetched) < 10
+    assert [thread.name for thread in threading.enumerate() if thread.name.startswith("pipeline-")] == []
@@ -0,0 +1,38 @@
+import numpy as np
+
+from utilities.spatial_index import CityIndex, unit_vectors, chord_to_km
+
+
+def brute_force(city_lat, city_lng, lat, lng):
+    chord = np.linalg.norm(unit_vectors(lat, lng)[:, None, :] - unit_vectors(city_lat, city_lng)[None, :, :], axis=2)
+    return chord.argmin(axis=1), chord_to_km(chord.min(axis=1))
+
+
+def test_nearest_matches_brute_force():
+    rng = np.random.default_rng(0)
+    city_lat, city_lng = np.clip(rng.normal(30, 25, 2000), -90, 90), rng.uniform(-180, 180, 2000)
+    lat = np.concatenate([rng.uniform(-90, 90, 1000), [90.0, -90.0, 0.0]])
+    lng = np.concatenate([rng.uniform(-180, 180, 1000), [0.0, 45.0, 180.0]])
+
+    rows, km = CityIndex(city_lat, city_lng, cell_km=50).nearest(lat, lng)
+    expected_rows, expected_km = brute_force(city_lat, city_lng, lat, lng)
+
+    assert (rows == expected_rows).all()
+    assert np.allclose(km, expected_km)
+
+
+def test_nearest_max_km_and_missing_coordinates():
+    index = CityIndex([37.4020, 52.2675], [-6.0332, -9.6962])
+
+    rows, km = index.nearest([37.41, 52.0, 0.0, np.nan, 95.0], [-6.03, -9.5, 0.0, 1.0, 0.0], max_km=50)
+
+    assert rows.tolist() == [0, 1, -1, -1, -1]
+    assert km[0] < 2
+    assert np.isnan(km[2:]).all()
+
+
+def test_nearest_without_cities():
+    rows, km = CityIndex([], []).nearest([1.0], [2.0])
+
+    assert rows.tolist() == [-1]
+    assert np.isnan(km).all()
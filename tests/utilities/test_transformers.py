@@ -1,6 +1,7 @@
 import pandas as pd
 
-from utilities.transformers import clean_locations, strip_accents
+from utilities.transformers import (DEFAULT_LOCATION_CACHE_SIZE, add_author_locations, add_places, clean_locations,
+                                    get_location_cache, set_location_cache_size, strip_accents)
 
 
 def test_clean_locations():
@@ -16,9 +17,85 @@ def test_clean_locations():
                      "3": {"lat": 49.9153, "lon": 8.3389, "city": "nackenheim", "country": "germany"}}
     assert  result_dict == expected_dict
 
+
+def test_clean_locations_workers():
+    df_locations = pd.DataFrame([[str(i), location] for i, location in enumerate(
+        ["camas, spain", "United states - Meredith", "Nackenheim (Germany)", None, "Tralee, Ireland", "nowhere"] * 3)],
+                                columns=["author_id", "location"])
+    world_cities_file = "tests/utilities/mock/sample_world_cities.csv"
+
+    result_dict = clean_locations(df_locations, world_cities_file, workers=2)
+
+    assert result_dict == clean_locations(df_locations, world_cities_file)
+    assert len(result_dict) == 12
+
+def test_clean_locations_cache():
+    df_locations = pd.DataFrame([["1", "camas, spain"], ["2", "camas, spain"], ["3", "Tralee, Ireland"]],
+                                columns=["author_id", "location"])
+    world_cities_file = "tests/utilities/mock/sample_world_cities.csv"
+    set_location_cache_size(1)
+    try:
+        clean_locations(df_locations, world_cities_file)
+        cache = get_location_cache()
+        assert (cache.hits, cache.misses, cache.evictions) == (0, 2, 1)
+
+        # Tralee was resolved last, so it is still cached after camas was evicted
+        result_dict = clean_locations(df_locations.iloc[[2]], world_cities_file)
+        assert (cache.hits, cache.misses) == (1, 2)
+    finally:
+        set_location_cache_size(DEFAULT_LOCATION_CACHE_SIZE)
+
+    assert result_dict == {"3": {"lat": 52.2675, "lon": -9.6962, "city": "tralee", "country": "ireland"}}
+
+
 def test_strip_accents():
     accents_list = ["También", "hôtel", "Löwe"]
 
     result = [strip_accents(w) for w in accents_list]
 
     assert result == ["Tambien", "hotel", "Lowe"]
+
+
+def test_add_author_locations():
+    df_tweets = pd.DataFrame([["1", 1.0, 2.0],
+                              ["2", 3.0, 4.0],
+                              ["1", 5.0, 6.0]],
+                             columns=["author_id", "lat", "long"])
+    user_location = {"1": {"lat": 37.4020, "lon": -6.0332, "city": "camas", "country": "spain"}}
+
+    result = add_author_locations(df_tweets, user_location)
+
+    assert result["lat"].to_list() == [37.4020, 3.0, 37.4020]
+    assert result["long"].to_list() == [-6.0332, 4.0, -6.0332]
+    assert result["city"].to_list()[::2] == ["camas", "camas"]
+    assert pd.isna(result["city"][1])
+    assert result["country"].to_list()[::2] == ["spain", "spain"]
+    assert df_tweets["lat"].to_list() == [1.0, 3.0, 5.0]
+
+def test_add_places():
+    # lat holds the longitude and long the latitude, in the GeoJSON order of the parsed coordinates
+    df_tweets = pd.DataFrame([["1", -6.03, 37.41, None, None, None, None],
+                              ["2", 16.70, -20.40, None, None, None, None],
+                              ["3", 0.0, 0.0, None, None, None, None],
+                              ["4", -9.69, 52.26, "Dublin", "Ireland", "IE", None],
+                              ["5", None, None, None, None, None, None],
+                              ["6", -6.03, 37.41, None, None, None, "camas"]],
+                             columns=["id", "lat", "long", "place_name", "place_country", "place_country_code", "city"])
+
+    result = add_places(df_tweets, "tests/utilities/mock/sample_world_cities.csv")
+
+    assert result["place_name"][[0, 1, 3]].to_list() == ["Camas", "Otjiwarongo", "Dublin"]
+    assert result["place_country"].to_list()[:2] == ["Spain", "Namibia"]
+    assert result["place_country_code"].to_list()[:2] == ["ES", "NA"]
+    assert result["place_name"][[2, 4, 5]].isna().all()
+    assert isinstance(result["place_name"].dtype, pd.CategoricalDtype)
+    assert df_tweets["place_name"].isna().sum() == 5
+
+
+def test_add_author_locations_legacy_author_column():
+    df_tweets = pd.DataFrame([["1"], ["2"]], columns=["author id"])
+
+    result = add_author_locations(df_tweets, {"2": {"lat": 1.0, "lon": 2.0, "city": "camas", "country": "spain"}})
+
+    assert result["long"].to_list()[1] == 2.0
+    assert pd.isna(result["long"][0])
@@ -1,3 +1,7 @@
+import shutil
+
+import numpy as np
+
 from utilities.world_cities import WorldCities
 
 
@@ -15,3 +19,39 @@ def test_build_lookup():
                                                  "francefenain": {"lat": 50.3658,"lon": 3.3006},
                                                  "new zealandwarkworth": {"lat": -36.4000,"lon": 174.6667},
                                                  "germanynackenheim": {"lat": 49.9153,"lon": 8.3389}}
+
+
+def test_build_lookup_from_cache(tmp_path):
+    reference = tmp_path / "world_cities.csv"
+    shutil.copy("tests/utilities/mock/sample_world_cities.csv", reference)
+    expected = WorldCities(str(reference))
+
+    WorldCities(str(reference), cache_dir=str(tmp_path / "cache"))
+    assert (tmp_path / "cache" / "world_cities.csv" / "meta.json").exists()
+    cached = WorldCities(str(reference), cache_dir=str(tmp_path / "cache"))
+
+    assert isinstance(cached.country_city_ref._keys, np.memmap)
+    assert cached.countries == expected.countries
+    assert cached.country_city_ref == expected.country_city_ref
+    assert "spaincamas" in cached.country_city_ref
+    assert "spaintralee" not in cached.country_city_ref
+
+
+def test_cache_invalidated_when_reference_changes(tmp_path):
+    reference = tmp_path / "world_cities.csv"
+    shutil.copy("tests/utilities/mock/sample_world_cities.csv", reference)
+    WorldCities(str(reference), cache_dir=str(tmp_path / "cache"))
+
+    with open(reference, "a") as f:
+        f.write('\n"Lagos","Lagos","6.4500","3.4000","Nigeria","NG","NGA","Lagos","minor","15388000","1566593751"\n')
+    cached = WorldCities(str(reference), cache_dir=str(tmp_path / "cache"))
+
+    assert "nigeria" in cached.countries
+    assert cached.country_city_ref["nigerialagos"] == {"lat": 6.45, "lon": 3.4}
+
+
+def test_load_reuses_instance(tmp_path):
+    reference = tmp_path / "world_cities.csv"
+    shutil.copy("tests/utilities/mock/sample_world_cities.csv", reference)
+
+    assert WorldCities.load(str(reference), cache_dir=None) is WorldCities.load(str(reference), cache_dir=None)